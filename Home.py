@@ -1,27 +1,29 @@
 import streamlit as st
-import bcrypt
-from database import SessionLocal, Usuario
+from database import SessionLocal, iniciar_medicao
+from migracoes import aplicar_migracoes
+from seguranca import autenticar, garantir_admin_inicial
 
 VERSION = "1.0"
 
 st.set_page_config(page_title="Início de Sessão - Sistema Ágape", page_icon="🔐", layout="centered")
 
+# --- PREPARAÇÃO DO BANCO (uma vez por processo, não a cada recarga) ---
+@st.cache_resource
+def preparar_banco():
+    aplicadas = aplicar_migracoes()
+    # Criação do primeiro utilizador (admin) quando a tabela está vazia
+    garantir_admin_inicial()
+    return aplicadas
+
+preparar_banco()
+iniciar_medicao(__file__)
+
 if "autenticado" not in st.session_state:
     st.session_state.autenticado = False
 
 db = SessionLocal()
 
 try:
-    # --- CRIAÇÃO DO PRIMEIRO UTILIZADOR (ADMIN) ---
-    if not db.query(Usuario).first():
-        senha_plana = "123".encode('utf-8')
-        senha_hash = bcrypt.hashpw(senha_plana, bcrypt.gensalt()).decode('utf-8')
-        
-        # Criamos o usuário mestre já com a tag is_admin=True
-        admin = Usuario(nome="Administrador", email="admin@agape.com", senha=senha_hash, is_admin=True)
-        db.add(admin)
-        db.commit()
-
     if not st.session_state.autenticado:
         st.title("🔐 Acesso Restrito")
         st.write("Bem-vindo ao Sistema Ágape. Por favor, inicie sessão para continuar.")
@@ -32,9 +34,9 @@ try:
             btn_login = st.form_submit_button("Entrar", type="primary")
             
             if btn_login:
-                usuario = db.query(Usuario).filter(Usuario.email == email_digitado).first()
+                usuario = autenticar(db, email_digitado, senha_digitada)
                 
-                if usuario and bcrypt.checkpw(senha_digitada.encode('utf-8'), usuario.senha.encode('utf-8')):
+                if usuario:
                     st.session_state.autenticado = True
                     st.session_state.nome_usuario = usuario.nome
                     st.session_state.email_usuario = usuario.email
@@ -60,6 +62,7 @@ try:
             st.page_link("pages/1_Cadastro_de_Alunos.py", label="Cadastro de Alunos", icon="📝")
             st.page_link("pages/2_Cadastro_de_Projetos.py", label="Projetos e Turmas", icon="⚽")
             st.page_link("pages/3_Matriculas.py", label="Matrículas", icon="✅")
+            st.page_link("pages/8_Importar_Alunos.py", label="Importar Alunos (Planilha)", icon="📥")
             
         with col2:
             st.page_link("pages/4_Pesquisa.py", label="Pesquisa Geral", icon="🔍")
@@ -0,0 +1,32 @@
+import streamlit as st
+import consultas
+
+# --- SELETOR DE ALUNO COM BUSCA NO SERVIDOR ---
+# Substitui o selectbox com todos os alunos: o banco devolve apenas os primeiros
+# resultados do termo digitado e só eles vão para o navegador. A busca roda quando o
+# termo é confirmado (Enter ou sair do campo): o st.text_input não avisa a cada tecla.
+
+LIMITE_PADRAO = 20
+
+
+def seletor_aluno(db, chave, rotulo="Buscar Aluno:", apenas_ativos=False, mostrar_status=False, limite=LIMITE_PADRAO):
+    termo = st.text_input(rotulo, key=f"{chave}_termo", placeholder="Digite parte do nome ou do CPF e pressione Enter")
+
+    # Pede um a mais para saber se a lista foi cortada
+    resultados = consultas.buscar_alunos(db, termo, limite=limite + 1, apenas_ativos=apenas_ativos)
+    ha_mais = len(resultados) > limite
+    resultados = resultados[:limite]
+
+    if not resultados:
+        st.info("Nenhum aluno encontrado para esta busca.")
+        return None
+
+    opcoes = {}
+    for a_id, nome, cpf, ativo in resultados:
+        rotulo_aluno = f"{nome} (CPF: {cpf if cpf else 'N/A'})"
+        opcoes[a_id] = f"{'🟢' if ativo else '🔴'} {rotulo_aluno}" if mostrar_status else rotulo_aluno
+
+    aluno_id = st.selectbox("Selecione o aluno:", options=list(opcoes.keys()), format_func=lambda x: opcoes[x], key=f"{chave}_sel")
+    if ha_mais:
+        st.caption(f"Mostrando os {limite} primeiros resultados. Continue digitando para refinar a busca.")
+    return aluno_id
@@ -0,0 +1,117 @@
+import copy
+import functools
+import threading
+from collections import OrderedDict
+from sqlalchemy import select
+from database import VersaoDados, ler_config
+
+# ==========================================
+# CACHE DE CONSULTAS (compartilhado entre as sessões do processo)
+# ==========================================
+# Cada consulta em cache declara as tabelas que lê. A chave inclui a versão atual de
+# cada uma delas (tabela versoes_dados), que é incrementada na mesma transação de
+# qualquer escrita (ver database.py). Depois de um commit a chave muda e o resultado
+# antigo simplesmente deixa de ser usado: não há expiração por tempo nem dado velho,
+# mesmo com vários processos do servidor gravando no mesmo banco.
+
+MAX_ENTRADAS = int(ler_config("CACHE_CONSULTAS_MAX", 512))
+
+
+class CacheConsultas:
+    def __init__(self, max_entradas):
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.falhas = 0
+        self.ignoradas = 0
+
+    def obter(self, chave):
+        with self._lock:
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return True, self._entradas[chave]
+            self.falhas += 1
+            return False, None
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._entradas[chave] = valor
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def registrar_ignorada(self):
+        with self._lock:
+            self.ignoradas += 1
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.acertos = self.falhas = self.ignoradas = 0
+
+    def resumo(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "ignoradas": self.ignoradas,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            }
+
+
+cache = CacheConsultas(MAX_ENTRADAS)
+
+
+def versoes_atuais(db):
+    # Lidas uma vez por transação da sessão (as páginas abrem uma sessão por execução)
+    if "versoes_dados" not in db.info:
+        db.info["versoes_dados"] = dict(db.execute(select(VersaoDados.tabela, VersaoDados.versao)).all())
+    return db.info["versoes_dados"]
+
+
+def _congelar(valor):
+    # Listas e dicionários dos argumentos viram tuplas para poderem fazer parte da chave
+    if isinstance(valor, (list, tuple, set)):
+        return tuple(_congelar(v) for v in valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _congelar(v)) for k, v in valor.items()))
+    return valor
+
+
+def em_cache(*tabelas):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def consultar(db, *args, **kwargs):
+            if db.info.get("dados_alterados"):
+                # Transação com escrita ainda não confirmada: o resultado não pode ser compartilhado
+                cache.registrar_ignorada()
+                return funcao(db, *args, **kwargs)
+
+            versoes = versoes_atuais(db)
+            chave = (
+                funcao.__qualname__,
+                _congelar(args),
+                _congelar(kwargs),
+                tuple(versoes.get(t) for t in tabelas),
+            )
+            encontrado, valor = cache.obter(chave)
+            if not encontrado:
+                valor = funcao(db, *args, **kwargs)
+                cache.guardar(chave, valor)
+            # Cópia: quem chama pode alterar o DataFrame/dicionário sem afetar as outras sessões
+            return copy.deepcopy(valor)
+        return consultar
+    return decorador
+
+
+def status_cache():
+    return cache.resumo()
+
+
+def limpar_cache():
+    cache.limpar()
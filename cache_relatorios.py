@@ -0,0 +1,88 @@
+import os
+import hashlib
+import tempfile
+import threading
+from database import ler_config
+
+# ==========================================
+# CACHE EM DISCO DOS RELATÓRIOS GERADOS
+# ==========================================
+# Cada arquivo é guardado com o nome da sua chave (tipo + ano + impressão digital dos
+# dados). Se nada mudou desde a última geração, o mesmo arquivo é devolvido na hora,
+# inclusive para outra pessoa da equipe. O tamanho total é limitado: ao passar do
+# limite, saem primeiro os arquivos usados há mais tempo (a data de modificação é
+# atualizada a cada uso). Os documentos são gravados direto nesta pasta e a página
+# abre o arquivo para o download: nenhum deles é guardado inteiro na memória da sessão.
+
+PASTA = ler_config("RELATORIOS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "agape_relatorios"))
+LIMITE_BYTES = int(float(ler_config("RELATORIOS_CACHE_MB", 200)) * 1024 * 1024)
+
+_lock = threading.Lock()
+
+
+def montar_chave(tipo, ano, *partes):
+    digest = hashlib.sha256(repr(partes).encode("utf-8")).hexdigest()[:32]
+    return f"{tipo}_{ano}_{digest}"
+
+
+def _caminho(chave):
+    return os.path.join(PASTA, chave)
+
+
+def obter(chave):
+    # Caminho do arquivo pronto para a chave (ou None); quem chama o abre para o download
+    caminho = _caminho(chave)
+    try:
+        os.utime(caminho)  # marca como usado agora (LRU)
+        return caminho
+    except FileNotFoundError:
+        return None
+
+
+def novo_arquivo():
+    # Arquivo temporário na própria pasta do cache, onde o documento é gravado aos poucos
+    os.makedirs(PASTA, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=PASTA, prefix=".parcial_")
+    os.close(descritor)
+    return temporario
+
+
+def guardar(chave, temporario):
+    # Renomeia o arquivo já gravado (de novo_arquivo): quem lê nunca vê um arquivo pela metade
+    caminho = _caminho(chave)
+    os.replace(temporario, caminho)
+    _liberar_espaco(manter=caminho)
+    return caminho
+
+
+def _arquivos():
+    with os.scandir(PASTA) as entradas:
+        return [
+            (e.stat().st_mtime, e.stat().st_size, e.path)
+            for e in entradas
+            if e.is_file() and not e.name.startswith(".parcial_")
+        ]
+
+
+def _liberar_espaco(manter=None):
+    # O arquivo recém-guardado fica mesmo que sozinho passe do limite: a página ainda vai baixá-lo
+    with _lock:
+        arquivos = sorted(_arquivos())
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in arquivos:
+            if total <= LIMITE_BYTES:
+                break
+            if caminho == manter:
+                continue
+            try:
+                os.remove(caminho)
+                total -= tamanho
+            except FileNotFoundError:
+                pass
+
+
+def status_cache():
+    if not os.path.isdir(PASTA):
+        return {"arquivos": 0, "bytes": 0, "limite_bytes": LIMITE_BYTES}
+    arquivos = _arquivos()
+    return {"arquivos": len(arquivos), "bytes": sum(t for _, t, _ in arquivos), "limite_bytes": LIMITE_BYTES}
@@ -0,0 +1,1023 @@
+import json
+from contextlib import contextmanager
+from typing import TypedDict
+import pandas as pd
+from datetime import date, datetime
+from sqlalchemy import func, extract, cast, type_coerce, case, and_, or_, exists, insert, literal, select, update, text, tuple_, JSON
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from database import Aluno, AlunoVulnerabilidade, Projeto, Turma, Matricula, EstatisticaAno, normalizar_busca, apenas_digitos
+from cache_consultas import em_cache
+
+# Camada de dados do sistema: as páginas leem e gravam por estas funções (que não
+# dependem do Streamlit), então as consultas quentes são otimizadas e medidas num só
+# lugar (ver ferramentas/benchmark_consultas.py). Cada função recebe a sessão do banco.
+
+# ==========================================
+# TIPOS DOS RESULTADOS
+# ==========================================
+
+class DadosProjeto(TypedDict):
+    id: int
+    nome: str
+    descricao: str | None
+    local: str | None
+
+
+class DadosTurma(TypedDict):
+    nome_turma: str
+    horario: str
+    vagas_totais: int
+    ano_letivo: int
+    nome_professor: str
+    cpf_professor: str | None
+    remuneracao_professor: float | None
+
+
+class TurmaDoProjeto(TypedDict):
+    id: int
+    nome_turma: str
+    horario: str
+    vagas_totais: int
+    ano_letivo: int
+    nome_professor: str
+
+
+class PaginaKeyset(TypedDict):
+    linhas: list[dict[str, object]]
+    primeira: tuple | None  # chave de ordenação da primeira linha (cursor para voltar)
+    ultima: tuple | None    # chave da última linha (cursor para avançar)
+    ha_anterior: bool
+    ha_proxima: bool
+
+
+class ResultadoVirada(TypedDict):
+    turmas_copiadas: list[str]      # "Projeto - Turma" abertas no ano seguinte
+    turmas_ja_abertas: list[str]    # já existiam no ano seguinte (não são copiadas de novo)
+    rematriculas: int
+    sem_vaga: list[str]             # "Aluno (Projeto - Turma)": a turma do ano seguinte lotou
+    inativacoes: int
+
+
+class ResumoAno(TypedDict):
+    ano_letivo: int | None
+    fechado_em: datetime | None
+    alunos_ativos: int
+    alunos_matriculados: int
+    turmas: int
+    matriculas: int
+    vagas_totais: int
+    df_turmas: pd.DataFrame
+
+
+@contextmanager
+def _transacao(db):
+    # Confirma ao final do bloco; qualquer erro desfaz a transação inteira antes de subir
+    try:
+        yield
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+# ==========================================
+# AGREGAÇÕES DE MATRÍCULAS E OCUPAÇÃO
+# ==========================================
+# As contagens são feitas pelo próprio banco (GROUP BY) e só as linhas já
+# agregadas (uma por turma) chegam ao Python. As leituras marcadas com @em_cache
+# são compartilhadas entre as sessões até a próxima escrita nas tabelas citadas.
+
+COLUNAS_OCUPACAO = ["ano_letivo", "projeto_id", "projeto", "turma_id", "turma", "vagas_totais", "matriculados"]
+
+
+@em_cache("turmas")
+def anos_letivos(db: Session) -> list[int]:
+    # Anos que possuem pelo menos uma turma, do mais recente para o mais antigo
+    linhas = db.query(Turma.ano_letivo).distinct().order_by(Turma.ano_letivo.desc()).all()
+    return [ano for (ano,) in linhas]
+
+
+@em_cache("turmas", "projetos", "matriculas")
+def ocupacao_por_turma(db: Session, ano_letivo: int | None = None, anos_excluidos: tuple[int, ...] = ()) -> pd.DataFrame:
+    # Uma única consulta: turmas + projeto + contagem de matrículas por turma
+    consulta = (
+        db.query(
+            Turma.ano_letivo,
+            Projeto.id,
+            Projeto.nome,
+            Turma.id,
+            Turma.nome_turma,
+            Turma.vagas_totais,
+            func.count(Matricula.id),
+        )
+        .join(Projeto, Projeto.id == Turma.projeto_id)
+        .outerjoin(Matricula, Matricula.turma_id == Turma.id)
+        .group_by(Turma.ano_letivo, Projeto.id, Projeto.nome, Turma.id, Turma.nome_turma, Turma.vagas_totais)
+        .order_by(Turma.ano_letivo.desc(), Projeto.nome, Turma.nome_turma)
+    )
+    if ano_letivo is not None:
+        consulta = consulta.filter(Turma.ano_letivo == ano_letivo)
+    if anos_excluidos:
+        consulta = consulta.filter(Turma.ano_letivo.notin_(anos_excluidos))
+
+    df = pd.DataFrame(consulta.all(), columns=COLUNAS_OCUPACAO)
+    df["vagas_livres"] = df["vagas_totais"] - df["matriculados"]
+    return df
+
+
+@em_cache("alunos")
+def contar_alunos(db: Session, apenas_ativos: bool = False) -> int:
+    consulta = db.query(func.count(Aluno.id))
+    if apenas_ativos:
+        consulta = consulta.filter(Aluno.status_ativo == True)
+    return consulta.scalar()
+
+
+@em_cache("projetos")
+def contar_projetos(db: Session) -> int:
+    return db.query(func.count(Projeto.id)).scalar()
+
+
+def _consolidar(df: pd.DataFrame, chaves: list[str]) -> pd.DataFrame:
+    agrupado = df.groupby(chaves, as_index=False).agg(
+        turmas=("turma_id", "count"),
+        vagas_totais=("vagas_totais", "sum"),
+        matriculados=("matriculados", "sum"),
+    )
+    agrupado["vagas_livres"] = agrupado["vagas_totais"] - agrupado["matriculados"]
+    agrupado["ocupacao_pct"] = (agrupado["matriculados"] / agrupado["vagas_totais"].where(agrupado["vagas_totais"] > 0) * 100).fillna(0).round(1)
+    return agrupado
+
+
+def ocupacao_por_projeto(df_turmas: pd.DataFrame) -> pd.DataFrame:
+    # Consolida o resultado de ocupacao_por_turma() sem voltar ao banco
+    return _consolidar(df_turmas, ["projeto_id", "projeto"]).sort_values("matriculados", ascending=False)
+
+
+def ocupacao_por_ano(df_turmas: pd.DataFrame) -> pd.DataFrame:
+    return _consolidar(df_turmas, ["ano_letivo"]).sort_values("ano_letivo", ascending=False)
+
+
+@em_cache("matriculas")
+def matriculados_por_turma(db: Session, turma_ids: list[int]) -> dict[int, int]:
+    # {turma_id: nº de matrículas} para várias turmas de uma vez
+    if not turma_ids:
+        return {}
+    return dict(
+        db.query(Matricula.turma_id, func.count(Matricula.id))
+        .filter(Matricula.turma_id.in_(turma_ids))
+        .group_by(Matricula.turma_id)
+        .all()
+    )
+
+
+@em_cache("matriculas", "turmas")
+def alunos_distintos_matriculados(db: Session, ano_letivo: int | None = None) -> int:
+    consulta = db.query(func.count(func.distinct(Matricula.aluno_id))).join(Turma, Turma.id == Matricula.turma_id)
+    if ano_letivo is not None:
+        consulta = consulta.filter(Turma.ano_letivo == ano_letivo)
+    return consulta.scalar() or 0
+
+
+@em_cache("matriculas", "turmas")
+def matriculas_por_mes(db: Session, ano_letivo: int, projeto_id: int | None = None) -> pd.DataFrame:
+    # Drill-down por data: quantas matrículas foram feitas em cada mês
+    mes = extract("month", Matricula.data_matricula)
+    consulta = (
+        db.query(mes, func.count(Matricula.id))
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .filter(Turma.ano_letivo == ano_letivo)
+        .group_by(mes)
+        .order_by(mes)
+    )
+    if projeto_id is not None:
+        consulta = consulta.filter(Turma.projeto_id == projeto_id)
+
+    df = pd.DataFrame(consulta.all(), columns=["mes", "matriculas"])
+    df["mes"] = df["mes"].astype(int)
+    return df
+
+
+# ==========================================
+# ESTATÍSTICAS DOS ANOS LETIVOS FECHADOS
+# ==========================================
+# Um ano fechado pelo administrador tem os seus números gravados em estatisticas_ano
+# e passa a ser lido de lá (Dashboard e relatórios). Só os anos em aberto são
+# calculados na hora. Para refazer a fotografia, basta reabrir e fechar de novo.
+
+def _df_ocupacao(linhas: list[dict]) -> pd.DataFrame:
+    df = pd.DataFrame(linhas, columns=COLUNAS_OCUPACAO)
+    df["vagas_livres"] = df["vagas_totais"] - df["matriculados"]
+    return df
+
+
+@em_cache("estatisticas_ano")
+def anos_fechados(db: Session) -> dict[int, datetime]:
+    # {ano_letivo: data/hora do fechamento}
+    return dict(db.query(EstatisticaAno.ano_letivo, EstatisticaAno.fechado_em).order_by(EstatisticaAno.ano_letivo.desc()).all())
+
+
+@em_cache("estatisticas_ano")
+def estatisticas_fechadas(db: Session, ano_letivo: int) -> ResumoAno | None:
+    registro = db.get(EstatisticaAno, ano_letivo)
+    if registro is None:
+        return None
+    return {
+        "ano_letivo": registro.ano_letivo,
+        "fechado_em": registro.fechado_em,
+        "alunos_ativos": registro.alunos_ativos,
+        "alunos_matriculados": registro.alunos_matriculados,
+        "turmas": registro.turmas,
+        "matriculas": registro.matriculas,
+        "vagas_totais": registro.vagas_totais,
+        "df_turmas": _df_ocupacao(json.loads(registro.ocupacao_turmas_json)),
+    }
+
+
+def _estatisticas_ao_vivo(db: Session, ano_letivo: int | None = None, anos_excluidos: tuple[int, ...] = ()) -> ResumoAno:
+    df_turmas = ocupacao_por_turma(db, ano_letivo, anos_excluidos)
+    return {
+        "ano_letivo": ano_letivo,
+        "fechado_em": None,
+        "alunos_ativos": contar_alunos(db, apenas_ativos=True),
+        "alunos_matriculados": alunos_distintos_matriculados(db, ano_letivo),
+        "turmas": len(df_turmas),
+        "matriculas": int(df_turmas["matriculados"].sum()),
+        "vagas_totais": int(df_turmas["vagas_totais"].sum()),
+        "df_turmas": df_turmas,
+    }
+
+
+def resumo_ano(db: Session, ano_letivo: int | None = None) -> ResumoAno:
+    # Números do Dashboard/relatório. Ano fechado: lidos da fotografia.
+    # Todos os anos (None): anos fechados vêm das fotografias e só os abertos são agregados no banco.
+    if ano_letivo is not None:
+        return estatisticas_fechadas(db, ano_letivo) or _estatisticas_ao_vivo(db, ano_letivo)
+
+    fechados = anos_fechados(db)
+    resumo = _estatisticas_ao_vivo(db, anos_excluidos=tuple(sorted(fechados)))
+    partes = [resumo["df_turmas"]] + [estatisticas_fechadas(db, ano)["df_turmas"] for ano in fechados]
+    df_turmas = pd.concat([p for p in partes if not p.empty] or partes[:1], ignore_index=True)
+    df_turmas = df_turmas.sort_values(["ano_letivo", "projeto", "turma"], ascending=[False, True, True], ignore_index=True)
+    resumo.update(
+        df_turmas=df_turmas,
+        turmas=len(df_turmas),
+        matriculas=int(df_turmas["matriculados"].sum()),
+        vagas_totais=int(df_turmas["vagas_totais"].sum()),
+    )
+    return resumo
+
+
+def fechar_ano_letivo(db: Session, ano_letivo: int) -> None:
+    # Calcula os números do ano direto do banco e grava (ou substitui) a fotografia
+    atual = _estatisticas_ao_vivo(db, ano_letivo)
+    linhas = json.loads(atual["df_turmas"][COLUNAS_OCUPACAO].to_json(orient="records", force_ascii=False))
+    with _transacao(db):
+        db.merge(EstatisticaAno(
+            ano_letivo=ano_letivo,
+            fechado_em=datetime.now(),
+            alunos_ativos=atual["alunos_ativos"],
+            alunos_matriculados=atual["alunos_matriculados"],
+            turmas=atual["turmas"],
+            matriculas=atual["matriculas"],
+            vagas_totais=atual["vagas_totais"],
+            ocupacao_turmas_json=json.dumps(linhas, ensure_ascii=False),
+        ))
+
+
+def reabrir_ano_letivo(db: Session, ano_letivo: int) -> None:
+    with _transacao(db):
+        db.query(EstatisticaAno).filter(EstatisticaAno.ano_letivo == ano_letivo).delete()
+
+
+# ==========================================
+# PERFIL SOCIOECONÔMICO (DADOS DO CADASTRO)
+# ==========================================
+# Cada distribuição é um único GROUP BY no banco sobre os campos do cadastro
+# (colunas promovidas, tabela de vulnerabilidades ou extração do JSON): nenhuma
+# ficha é carregada no Python. Conta-se alunos distintos em cada categoria.
+
+NAO_INFORMADO = "Não informado"
+
+# (limite superior em R$, rótulo); a última faixa não tem limite
+FAIXAS_RENDA = [
+    (1000, "Até R$ 1.000"),
+    (2000, "R$ 1.000 a R$ 2.000"),
+    (3000, "R$ 2.000 a R$ 3.000"),
+    (5000, "R$ 3.000 a R$ 5.000"),
+    (None, "Acima de R$ 5.000"),
+]
+
+DIMENSOES_PERFIL = {
+    "vulnerabilidade": "Vulnerabilidades",
+    "faixa_renda": "Renda Familiar",
+    "bairro": "Bairro",
+    "beneficio_social": "Benefício Social",
+    "genero": "Gênero",
+    "periodo": "Período Escolar",
+}
+
+
+def _expressao_perfil(db: Session, dimensao: str):
+    if dimensao == "vulnerabilidade":
+        return AlunoVulnerabilidade.vulnerabilidade
+    if dimensao == "bairro":
+        return func.coalesce(func.nullif(func.trim(Aluno.bairro), ""), NAO_INFORMADO)
+    if dimensao == "faixa_renda":
+        renda = campo_json(db, "renda_familiar", "float")
+        faixas = [(renda <= limite, rotulo) for limite, rotulo in FAIXAS_RENDA if limite is not None]
+        return case((renda.is_(None), NAO_INFORMADO), *faixas, else_=FAIXAS_RENDA[-1][1])
+    if dimensao in ("beneficio_social", "genero", "periodo"):
+        return func.coalesce(func.nullif(campo_json(db, dimensao), ""), NAO_INFORMADO)
+    raise ValueError(f"Dimensão desconhecida: {dimensao}")
+
+
+@em_cache("alunos", "matriculas", "turmas", "projetos")
+def perfil_socioeconomico(db: Session, dimensao: str, ano_letivo: int | None = None, cruzar_por: str | None = None) -> pd.DataFrame:
+    # Sem ano e sem cruzamento: todos os alunos ativos. Com ano ou cruzamento
+    # (cruzar_por: "projeto" ou "ano_letivo"): os alunos matriculados no recorte.
+    # Devolve as colunas [grupo,] categoria, alunos.
+    grupo = {"projeto": Projeto.nome, "ano_letivo": Turma.ano_letivo, None: None}[cruzar_por]
+    colunas = {"categoria": _expressao_perfil(db, dimensao)}
+    if grupo is not None:
+        colunas = {"grupo": grupo, **colunas}
+
+    consulta = db.query(*(expr.label(nome) for nome, expr in colunas.items()), func.count(func.distinct(Aluno.id)))
+    if dimensao == "vulnerabilidade":
+        consulta = consulta.select_from(Aluno).join(AlunoVulnerabilidade, AlunoVulnerabilidade.aluno_id == Aluno.id)
+    if ano_letivo is None and cruzar_por is None:
+        consulta = consulta.filter(Aluno.status_ativo == True)
+    else:
+        consulta = consulta.join(Matricula, Matricula.aluno_id == Aluno.id).join(Turma, Turma.id == Matricula.turma_id)
+        if cruzar_por == "projeto":
+            consulta = consulta.join(Projeto, Projeto.id == Turma.projeto_id)
+        if ano_letivo is not None:
+            consulta = consulta.filter(Turma.ano_letivo == ano_letivo)
+
+    df = pd.DataFrame(consulta.group_by(*colunas.values()).all(), columns=[*colunas, "alunos"])
+
+    # Faixas de renda na ordem natural; as demais categorias da maior para a menor
+    if dimensao == "faixa_renda":
+        ordem = [rotulo for _, rotulo in FAIXAS_RENDA] + [NAO_INFORMADO]
+        df["categoria"] = pd.Categorical(df["categoria"], categories=ordem, ordered=True)
+        df = df.sort_values(["grupo", "categoria"] if grupo is not None else ["categoria"])
+        df["categoria"] = df["categoria"].astype(str)
+    else:
+        df = df.sort_values(["grupo", "alunos"] if grupo is not None else ["alunos"], ascending=[True, False] if grupo is not None else False)
+    return df.reset_index(drop=True)
+
+
+def tabela_cruzada(df_perfil: pd.DataFrame) -> pd.DataFrame:
+    # grupo x categoria (alunos), a partir do resultado de perfil_socioeconomico() com cruzamento
+    tabela = df_perfil.pivot_table(index="grupo", columns="categoria", values="alunos", aggfunc="sum", fill_value=0, sort=False)
+    return tabela.astype(int)
+
+
+# ==========================================
+# LISTAS DE OPÇÕES (SELECTBOX)
+# ==========================================
+
+@em_cache("projetos")
+def opcoes_projetos(db: Session) -> dict[int, str]:
+    return dict(db.query(Projeto.id, Projeto.nome).order_by(Projeto.nome).all())
+
+
+@em_cache("turmas")
+def opcoes_turmas(db: Session, projeto_id: int | None = None, ano_letivo: int | None = None) -> dict[int, str]:
+    consulta = db.query(Turma.id, Turma.nome_turma, Turma.ano_letivo).order_by(Turma.ano_letivo.desc(), Turma.nome_turma)
+    if projeto_id is not None:
+        consulta = consulta.filter(Turma.projeto_id == projeto_id)
+    if ano_letivo is not None:
+        consulta = consulta.filter(Turma.ano_letivo == ano_letivo)
+    return {t_id: f"{nome} ({ano})" for t_id, nome, ano in consulta.all()}
+
+
+@em_cache("projetos")
+def dados_projeto(db: Session, projeto_id: int) -> DadosProjeto | None:
+    linha = db.query(Projeto.id, Projeto.nome, Projeto.descricao, Projeto.local).filter(Projeto.id == projeto_id).first()
+    return dict(linha._mapping) if linha else None
+
+
+@em_cache("turmas")
+def dados_turma(db: Session, turma_id: int) -> DadosTurma | None:
+    linha = (
+        db.query(
+            Turma.nome_turma, Turma.horario, Turma.vagas_totais, Turma.ano_letivo,
+            Turma.nome_professor, Turma.cpf_professor, Turma.remuneracao_professor,
+        )
+        .filter(Turma.id == turma_id)
+        .first()
+    )
+    return dict(linha._mapping) if linha else None
+
+
+@em_cache("turmas")
+def turmas_do_projeto(db: Session, projeto_id: int, ano_letivo: int | None = None) -> list[TurmaDoProjeto]:
+    consulta = (
+        db.query(
+            Turma.id, Turma.nome_turma, Turma.horario, Turma.vagas_totais, Turma.ano_letivo, Turma.nome_professor,
+        )
+        .filter(Turma.projeto_id == projeto_id)
+        .order_by(Turma.ano_letivo.desc(), Turma.nome_turma)
+    )
+    if ano_letivo is not None:
+        consulta = consulta.filter(Turma.ano_letivo == ano_letivo)
+    return [dict(linha._mapping) for linha in consulta.all()]
+
+
+@em_cache("matriculas", "alunos", "turmas", "projetos")
+def opcoes_matriculas(db: Session, ano_letivo: int | None = None, projeto_id: int | None = None, turma_id: int | None = None) -> dict[int, str]:
+    # Rótulos das matrículas em uma só consulta (JOIN), trazendo apenas as colunas exibidas
+    consulta = (
+        db.query(Matricula.id, Aluno.nome_completo, Projeto.nome, Turma.nome_turma, Turma.ano_letivo)
+        .join(Aluno, Aluno.id == Matricula.aluno_id)
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .join(Projeto, Projeto.id == Turma.projeto_id)
+        .order_by(Aluno.nome_completo, Turma.ano_letivo.desc())
+    )
+    if ano_letivo is not None:
+        consulta = consulta.filter(Turma.ano_letivo == ano_letivo)
+    if projeto_id is not None:
+        consulta = consulta.filter(Turma.projeto_id == projeto_id)
+    if turma_id is not None:
+        consulta = consulta.filter(Matricula.turma_id == turma_id)
+
+    return {
+        m_id: f"{nome_aluno} - {nome_projeto} ({nome_turma} | {ano})"
+        for m_id, nome_aluno, nome_projeto, nome_turma, ano in consulta.all()
+    }
+
+
+# ==========================================
+# LISTA DE CHAMADA E HISTÓRICO DO ALUNO
+# ==========================================
+
+def campo_json(db: Session, nome: str, tipo: str = "string"):
+    # Extrai um campo de dados_cadastrais_json no próprio banco (->> no PostgreSQL, JSON_EXTRACT no SQLite).
+    # No SQLite um CAST para JSON converteria o texto em número, por isso só ajustamos o tipo.
+    # tipo: "string" ou "float" (campos "number" do config_campos.json)
+    dados = Aluno.dados_cadastrais_json
+    if db.get_bind().dialect.name == "sqlite":
+        dados = type_coerce(dados, JSON)
+    else:
+        dados = cast(dados, JSON)
+    return getattr(dados[nome], f"as_{tipo}")()
+
+
+@em_cache("alunos", "matriculas")
+def lista_chamada(db: Session, turma_id: int) -> list[dict[str, str]]:
+    consulta = (
+        db.query(Aluno.nome_completo, Aluno.status_ativo, Aluno.contato_resp1)
+        .join(Matricula, Matricula.aluno_id == Aluno.id)
+        .filter(Matricula.turma_id == turma_id)
+        .order_by(Aluno.nome_completo)
+    )
+    return [
+        {
+            "Nome do Aluno": nome,
+            "Status": "Ativo" if ativo else "Inativo",
+            "Telefone de Contato": contato if contato is not None else "N/A",
+        }
+        for nome, ativo, contato in consulta.all()
+    ]
+
+
+@em_cache("matriculas", "turmas", "projetos")
+def historico_matriculas(db: Session, aluno_id: int) -> list[dict[str, object]]:
+    consulta = (
+        db.query(
+            Turma.ano_letivo, Projeto.nome, Turma.nome_turma, Turma.nome_professor,
+            Turma.horario, Projeto.local, Matricula.data_matricula,
+        )
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .join(Projeto, Projeto.id == Turma.projeto_id)
+        .filter(Matricula.aluno_id == aluno_id)
+        .order_by(Turma.ano_letivo.desc())
+    )
+    return [
+        {
+            "Ano Letivo": ano,
+            "Projeto": projeto,
+            "Turma": turma,
+            "Professor": professor,
+            "Horário": horario,
+            "Local": local,
+            "Data da Matrícula": data.strftime('%d/%m/%Y'),
+        }
+        for ano, projeto, turma, professor, horario, local, data in consulta.all()
+    ]
+
+
+# ==========================================
+# BUSCA DE ALUNOS (INCREMENTAL, NO SERVIDOR)
+# ==========================================
+
+def buscar_alunos(db: Session, termo: str = "", limite: int = 20, apenas_ativos: bool = False,
+                  ano_letivo: int | None = None) -> list[Row]:
+    # Os primeiros resultados por nome (sem acentos, início de qualquer palavra) ou por CPF (prefixo
+    # dos dígitos), sem OFFSET: para ver outros alunos, refina-se o termo. Só as colunas exibidas
+    # no seletor saem do banco; o JSON do cadastro nunca é carregado.
+    consulta = db.query(Aluno.id, Aluno.nome_completo, Aluno.cpf, Aluno.status_ativo)
+    if apenas_ativos:
+        consulta = consulta.filter(Aluno.status_ativo == True)
+    if ano_letivo is not None:
+        # Só quem tem matrícula em alguma turma do ano
+        consulta = consulta.filter(
+            db.query(Matricula.id)
+            .join(Turma, Turma.id == Matricula.turma_id)
+            .filter(Matricula.aluno_id == Aluno.id, Turma.ano_letivo == ano_letivo)
+            .exists()
+        )
+
+    nome = normalizar_busca(termo)
+    digitos = apenas_digitos(termo)
+    ordem_relevancia = None
+
+    if digitos and not any(c.isalpha() for c in termo):
+        # O termo é um CPF (ou parte dele), com ou sem pontuação
+        consulta = consulta.filter(Aluno.cpf_digitos.like(f"{_escapar_like(digitos)}%", escape="\\"))
+    elif nome:
+        prefixo = _escapar_like(nome)
+        inicio_do_nome = Aluno.nome_busca.like(f"{prefixo}%", escape="\\")
+        consulta = consulta.filter(or_(inicio_do_nome, Aluno.nome_busca.like(f"% {prefixo}%", escape="\\")))
+        # Quem começa com o termo aparece antes de quem só tem uma palavra que começa com ele
+        ordem_relevancia = case((inicio_do_nome, 0), else_=1)
+
+    ordenacao = [Aluno.nome_busca, Aluno.id]
+    if ordem_relevancia is not None:
+        ordenacao.insert(0, ordem_relevancia)
+    return consulta.order_by(*ordenacao).limit(limite).all()
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# ==========================================
+# NAVEGAÇÃO PAGINADA (KEYSET)
+# ==========================================
+# Em vez de OFFSET (que lê e descarta todas as linhas anteriores), cada página continua
+# a partir da chave da última linha da página anterior, descendo pelo índice da
+# ordenação: a página 200 custa o mesmo que a primeira. O id entra no fim de toda chave
+# para desempatar linhas com o mesmo valor.
+
+ORDENACOES_ALUNOS = {"nome": "Nome", "nascimento": "Data de Nascimento", "cadastro": "Ordem de Cadastro"}
+ORDENACOES_MATRICULAS = {"data": "Data da Matrícula", "cadastro": "Ordem de Registro"}
+
+
+def _pagina_keyset(consulta, colunas: tuple, tamanho: int, decrescente: bool = False,
+                   apos: tuple | None = None, antes: tuple | None = None, fim: bool = False) -> PaginaKeyset:
+    # apos: página seguinte à chave; antes: página anterior à chave; fim: última página.
+    # Para voltar, a consulta anda no sentido contrário da ordenação e a página é invertida.
+    para_tras = antes is not None or fim
+    descendo = decrescente != para_tras
+    chave = tuple_(*colunas)
+    cursor = antes if antes is not None else apos
+    if cursor is not None:
+        consulta = consulta.filter(chave < tuple_(*cursor) if descendo else chave > tuple_(*cursor))
+    consulta = consulta.add_columns(*colunas).order_by(*(c.desc() if descendo else c.asc() for c in colunas))
+
+    # Pede uma linha a mais para saber se há outra página no mesmo sentido
+    linhas = consulta.limit(tamanho + 1).all()
+    ha_mais = len(linhas) > tamanho
+    linhas = linhas[:tamanho]
+    if para_tras:
+        linhas.reverse()
+
+    n = len(colunas)
+    return {
+        "linhas": [linha[:-n] for linha in linhas],
+        "primeira": tuple(linhas[0][-n:]) if linhas else None,
+        "ultima": tuple(linhas[-1][-n:]) if linhas else None,
+        "ha_anterior": ha_mais if para_tras else apos is not None,
+        "ha_proxima": (not fim) if para_tras else ha_mais,
+    }
+
+
+def _idade(nascimento: date, hoje: date) -> int:
+    return hoje.year - nascimento.year - ((hoje.month, hoje.day) < (nascimento.month, nascimento.day))
+
+
+def pagina_alunos(db: Session, ordenar_por: str = "nome", decrescente: bool = False, apos: tuple | None = None,
+                  antes: tuple | None = None, fim: bool = False, tamanho: int = 50, apenas_ativos: bool = False,
+                  ano_letivo: int | None = None) -> PaginaKeyset:
+    # Matrículas ativas = matrículas em turmas do ano letivo (o atual, se não informado),
+    # contadas só para as linhas da página
+    ano_letivo = ano_letivo or date.today().year
+    matriculas_ativas = (
+        select(func.count(Matricula.id))
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .where(Matricula.aluno_id == Aluno.id, Turma.ano_letivo == ano_letivo)
+        .correlate(Aluno)
+        .scalar_subquery()
+    )
+    consulta = db.query(Aluno.id, Aluno.nome_completo, Aluno.data_nascimento, Aluno.status_ativo, matriculas_ativas)
+    if apenas_ativos:
+        consulta = consulta.filter(Aluno.status_ativo == True)
+
+    colunas = {
+        "nome": (Aluno.nome_busca, Aluno.id),
+        "nascimento": (Aluno.data_nascimento, Aluno.id),
+        "cadastro": (Aluno.id,),
+    }[ordenar_por]
+    pagina = _pagina_keyset(consulta, colunas, tamanho, decrescente, apos, antes, fim)
+
+    hoje = date.today()
+    pagina["linhas"] = [
+        {
+            "ID": a_id,
+            "Nome do Aluno": nome,
+            "Data de Nasc.": nascimento.strftime('%d/%m/%Y'),
+            "Idade": _idade(nascimento, hoje),
+            "Status": "Ativo" if ativo else "Inativo",
+            f"Matrículas em {ano_letivo}": matriculas,
+        }
+        for a_id, nome, nascimento, ativo, matriculas in pagina["linhas"]
+    ]
+    return pagina
+
+
+def _filtrar_matriculas(consulta, ano_letivo: int | None, projeto_id: int | None, turma_id: int | None):
+    if ano_letivo is not None:
+        consulta = consulta.filter(Turma.ano_letivo == ano_letivo)
+    if projeto_id is not None:
+        consulta = consulta.filter(Turma.projeto_id == projeto_id)
+    if turma_id is not None:
+        consulta = consulta.filter(Matricula.turma_id == turma_id)
+    return consulta
+
+
+@em_cache("matriculas", "turmas")
+def contar_matriculas(db: Session, ano_letivo: int | None = None, projeto_id: int | None = None, turma_id: int | None = None) -> int:
+    consulta = db.query(func.count(Matricula.id))
+    if ano_letivo is not None or projeto_id is not None:
+        consulta = consulta.join(Turma, Turma.id == Matricula.turma_id)
+    return _filtrar_matriculas(consulta, ano_letivo, projeto_id, turma_id).scalar()
+
+
+def pagina_matriculas(db: Session, ordenar_por: str = "data", decrescente: bool = True, apos: tuple | None = None,
+                      antes: tuple | None = None, fim: bool = False, tamanho: int = 50, ano_letivo: int | None = None,
+                      projeto_id: int | None = None, turma_id: int | None = None) -> PaginaKeyset:
+    consulta = (
+        db.query(Matricula.id, Matricula.data_matricula, Aluno.nome_completo, Projeto.nome, Turma.nome_turma, Turma.ano_letivo)
+        .join(Aluno, Aluno.id == Matricula.aluno_id)
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .join(Projeto, Projeto.id == Turma.projeto_id)
+    )
+    consulta = _filtrar_matriculas(consulta, ano_letivo, projeto_id, turma_id)
+
+    colunas = {
+        "data": (Matricula.data_matricula, Matricula.id),
+        "cadastro": (Matricula.id,),
+    }[ordenar_por]
+    pagina = _pagina_keyset(consulta, colunas, tamanho, decrescente, apos, antes, fim)
+
+    pagina["linhas"] = [
+        {
+            "Data da Matrícula": data.strftime('%d/%m/%Y'),
+            "Aluno": aluno,
+            "Projeto": projeto,
+            "Turma": turma,
+            "Ano Letivo": ano,
+        }
+        for _, data, aluno, projeto, turma, ano in pagina["linhas"]
+    ]
+    return pagina
+
+
+# ==========================================
+# MATRÍCULA (RESERVA DE VAGA ATÔMICA)
+# ==========================================
+
+class MatriculaRecusada(Exception):
+    pass
+
+
+def matricular(db: Session, aluno_id: int, turma_id: int, data_matricula: date | None = None) -> None:
+    # Trava, verifica e grava numa única transação curta: duas pessoas matriculando ao
+    # mesmo tempo não conseguem lotar a turma além das vagas nem duplicar o aluno.
+    try:
+        if db.get_bind().dialect.name == "sqlite":
+            # O SQLite ignora FOR UPDATE: um UPDATE sem efeito obtém a trava de escrita do banco
+            db.execute(text("UPDATE turmas SET id = id WHERE id = :id"), {"id": turma_id})
+
+        # O aluno é travado antes da turma (sempre nessa ordem, para não haver deadlock)
+        aluno = db.query(Aluno.id, Aluno.status_ativo).filter(Aluno.id == aluno_id).with_for_update().first()
+        if aluno is None:
+            raise MatriculaRecusada("Aluno não encontrado.")
+        if not aluno.status_ativo:
+            raise MatriculaRecusada("O aluno está marcado como INATIVO.")
+
+        turma = (
+            db.query(Turma.projeto_id, Turma.ano_letivo, Turma.vagas_totais)
+            .filter(Turma.id == turma_id)
+            .with_for_update()
+            .first()
+        )
+        if turma is None:
+            raise MatriculaRecusada("Turma não encontrada.")
+
+        ja_matriculado_no_projeto = (
+            db.query(Matricula.id)
+            .join(Turma, Turma.id == Matricula.turma_id)
+            .filter(
+                Matricula.aluno_id == aluno_id,
+                Turma.projeto_id == turma.projeto_id,
+                Turma.ano_letivo == turma.ano_letivo,
+            )
+            .first()
+        )
+        if ja_matriculado_no_projeto:
+            raise MatriculaRecusada(f"O aluno já está matriculado neste projeto para o ano de {turma.ano_letivo}!")
+
+        ocupadas = db.query(func.count(Matricula.id)).filter(Matricula.turma_id == turma_id).scalar()
+        if ocupadas >= turma.vagas_totais:
+            raise MatriculaRecusada("A turma está lotada.")
+
+        db.add(Matricula(aluno_id=aluno_id, turma_id=turma_id, data_matricula=data_matricula or date.today()))
+        db.commit()
+    except IntegrityError:
+        # Último recurso: o índice único (aluno_id, turma_id) barrou uma duplicata
+        db.rollback()
+        raise MatriculaRecusada("O aluno já está matriculado nesta turma.")
+    except Exception:
+        db.rollback()
+        raise
+
+
+# ==========================================
+# CADASTRO E EDIÇÃO
+# ==========================================
+
+class CadastroRecusado(Exception):
+    pass
+
+
+def ficha_aluno(db: Session, aluno_id: int) -> Aluno | None:
+    return db.get(Aluno, aluno_id)
+
+
+def aluno_ja_cadastrado(db: Session, cpf: str, nome_completo: str, data_nascimento: date) -> bool:
+    # Mesmo CPF ou mesma combinação de nome + data de nascimento
+    if cpf and db.query(Aluno.id).filter(Aluno.cpf == cpf).first():
+        return True
+    return db.query(Aluno.id).filter(
+        Aluno.nome_completo == nome_completo,
+        Aluno.data_nascimento == data_nascimento,
+    ).first() is not None
+
+
+def cadastrar_aluno(db: Session, nome_completo: str, data_nascimento: date, rg: str, cpf: str, dados_cadastrais_json: str) -> int:
+    if aluno_ja_cadastrado(db, cpf, nome_completo, data_nascimento):
+        raise CadastroRecusado("Este aluno já está cadastrado no sistema (combinação de CPF ou Nome + Data de Nascimento já existe).")
+    aluno = Aluno(nome_completo=nome_completo, data_nascimento=data_nascimento, rg=rg, cpf=cpf, dados_cadastrais_json=dados_cadastrais_json)
+    with _transacao(db):
+        db.add(aluno)
+    return aluno.id
+
+
+def atualizar_aluno(db: Session, aluno_id: int, nome_completo: str, data_nascimento: date, rg: str, cpf: str, dados_cadastrais_json: str) -> None:
+    # As colunas derivadas (campos promovidos, chaves de busca, vulnerabilidades) são atualizadas no flush
+    with _transacao(db):
+        aluno = db.get(Aluno, aluno_id)
+        aluno.nome_completo = nome_completo
+        aluno.data_nascimento = data_nascimento
+        aluno.rg = rg
+        aluno.cpf = cpf
+        aluno.dados_cadastrais_json = dados_cadastrais_json
+
+
+def alterar_status_aluno(db: Session, aluno_id: int, ativo: bool) -> None:
+    alterar_status_alunos(db, [aluno_id], ativo)
+
+
+def cadastrar_projeto(db: Session, nome: str, descricao: str, local: str) -> int:
+    if db.query(Projeto.id).filter(Projeto.nome == nome).first():
+        raise CadastroRecusado(f"O projeto '{nome}' já existe no catálogo.")
+    projeto = Projeto(nome=nome, descricao=descricao, local=local)
+    with _transacao(db):
+        db.add(projeto)
+    return projeto.id
+
+
+def atualizar_projeto(db: Session, projeto_id: int, nome: str, descricao: str, local: str) -> None:
+    with _transacao(db):
+        db.query(Projeto).filter(Projeto.id == projeto_id).update(
+            {Projeto.nome: nome, Projeto.descricao: descricao, Projeto.local: local}, synchronize_session=False
+        )
+
+
+def abrir_turmas(db: Session, projeto_id: int, turmas: list[DadosTurma]) -> int:
+    # Todas as turmas numa única transação: ou abrem todas, ou nenhuma
+    with _transacao(db):
+        db.add_all([Turma(projeto_id=projeto_id, **turma) for turma in turmas])
+    return len(turmas)
+
+
+def atualizar_turma(db: Session, turma_id: int, dados: DadosTurma) -> None:
+    with _transacao(db):
+        db.query(Turma).filter(Turma.id == turma_id).update(
+            {getattr(Turma, campo): valor for campo, valor in dados.items()}, synchronize_session=False
+        )
+
+
+# ==========================================
+# CANCELAMENTOS E EXCLUSÕES
+# ==========================================
+
+def cancelar_matricula(db: Session, matricula_id: int) -> None:
+    with _transacao(db):
+        db.query(Matricula).filter(Matricula.id == matricula_id).delete(synchronize_session=False)
+
+
+# As chaves estrangeiras têm ON DELETE CASCADE (migração 008): um único DELETE na tabela
+# principal leva junto matrículas, turmas e vulnerabilidades, dentro da mesma transação.
+# As versões das tabelas dependentes são incrementadas pelo database._versionar_em_lote.
+
+def excluir_alunos(db: Session, aluno_ids: list[int]) -> int:
+    with _transacao(db):
+        return db.query(Aluno).filter(Aluno.id.in_(aluno_ids)).delete(synchronize_session=False)
+
+
+def alterar_status_alunos(db: Session, aluno_ids: list[int], ativo: bool) -> int:
+    with _transacao(db):
+        return db.query(Aluno).filter(Aluno.id.in_(aluno_ids)).update({Aluno.status_ativo: ativo}, synchronize_session=False)
+
+
+def excluir_turmas(db: Session, turma_ids: list[int]) -> int:
+    with _transacao(db):
+        return db.query(Turma).filter(Turma.id.in_(turma_ids)).delete(synchronize_session=False)
+
+
+def excluir_projetos(db: Session, projeto_ids: list[int]) -> int:
+    with _transacao(db):
+        return db.query(Projeto).filter(Projeto.id.in_(projeto_ids)).delete(synchronize_session=False)
+
+
+def excluir_aluno(db: Session, aluno_id: int) -> None:
+    excluir_alunos(db, [aluno_id])
+
+
+def excluir_turma(db: Session, turma_id: int) -> None:
+    excluir_turmas(db, [turma_id])
+
+
+def excluir_projeto(db: Session, projeto_id: int) -> None:
+    excluir_projetos(db, [projeto_id])
+
+
+# ==========================================
+# VIRADA DO ANO LETIVO
+# ==========================================
+# Copia as turmas escolhidas para o ano seguinte, rematricula os alunos que continuam e
+# inativa os que não voltam, numa só transação: turmas e inativações em lote (INSERT…SELECT
+# e UPDATE), rematrículas num único INSERT depois de travar alunos e turmas como o matricular.
+# A turma do ano seguinte é a de mesmo projeto e mesmo nome, então repetir a virada não
+# duplica turmas nem matrículas.
+
+class ViradaRecusada(Exception):
+    pass
+
+
+def alunos_das_turmas(db: Session, turma_ids: list[int]) -> list[dict[str, object]]:
+    # Um item por aluno ativo, com as turmas (entre as escolhidas) em que está matriculado
+    consulta = (
+        db.query(Aluno.id, Aluno.nome_completo, Projeto.nome, Turma.nome_turma)
+        .join(Matricula, Matricula.aluno_id == Aluno.id)
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .join(Projeto, Projeto.id == Turma.projeto_id)
+        .filter(Matricula.turma_id.in_(turma_ids), Aluno.status_ativo == True)
+        .order_by(Aluno.nome_busca, Aluno.id, Projeto.nome, Turma.nome_turma)
+    )
+    alunos = {}
+    for a_id, nome, projeto, turma in consulta.all():
+        aluno = alunos.setdefault(a_id, {"id": a_id, "nome": nome, "turmas": []})
+        aluno["turmas"].append(f"{projeto} - {turma}")
+    return list(alunos.values())
+
+
+def virada_ano_letivo(db: Session, ano_origem: int, turma_ids: list[int], aluno_ids: list[int],
+                      inativar_demais: bool = False, data_matricula: date | None = None,
+                      simular: bool = False) -> ResultadoVirada:
+    # simular=True executa tudo e desfaz no fim: a prévia mostra exatamente o que a virada faria
+    ano_destino = ano_origem + 1
+    if db.query(EstatisticaAno.ano_letivo).filter(EstatisticaAno.ano_letivo == ano_destino).first():
+        raise ViradaRecusada(f"O ano letivo de {ano_destino} está fechado. Reabra-o antes da virada.")
+
+    origem, destino = aliased(Turma), aliased(Turma)
+    mesma_turma_no_destino = and_(
+        destino.projeto_id == origem.projeto_id,
+        destino.nome_turma == origem.nome_turma,
+        destino.ano_letivo == ano_destino,
+    )
+    escolhidas = and_(origem.id.in_(turma_ids), origem.ano_letivo == ano_origem)
+
+    try:
+        if db.get_bind().dialect.name == "sqlite":
+            # O SQLite ignora FOR UPDATE: um UPDATE sem efeito obtém a trava de escrita do banco
+            db.execute(text("UPDATE turmas SET id = id WHERE ano_letivo = :ano"), {"ano": ano_destino})
+
+        # Duas turmas de mesmo nome no mesmo projeto viram uma só no ano seguinte (copiada da primeira)
+        turmas_origem = {}
+        for t_id, projeto_id, projeto, turma, ja_aberta in (
+            db.query(origem.id, origem.projeto_id, Projeto.nome, origem.nome_turma, exists().where(mesma_turma_no_destino))
+            .join(Projeto, Projeto.id == origem.projeto_id)
+            .filter(escolhidas)
+            .order_by(Projeto.nome, origem.nome_turma, origem.id)
+        ):
+            turmas_origem.setdefault((projeto_id, turma), (t_id, f"{projeto} - {turma}", ja_aberta))
+
+        # 1. Turmas: mesmo professor, horário e vagas, no ano seguinte
+        a_copiar = [t_id for t_id, _, ja_aberta in turmas_origem.values() if not ja_aberta]
+        if a_copiar:
+            colunas = ["projeto_id", "nome_turma", "horario", "vagas_totais", "nome_professor", "cpf_professor", "remuneracao_professor"]
+            db.execute(
+                insert(Turma).from_select(
+                    colunas + ["ano_letivo"],
+                    select(*(getattr(origem, c) for c in colunas), literal(ano_destino)).where(origem.id.in_(a_copiar)),
+                )
+            )
+
+        # 2. Rematrículas: cada aluno escolhido (e ainda ativo) vai para a turma correspondente,
+        # com as regras do matricular: vagas da turma e um único projeto por ano letivo
+        novas = []
+        sem_vaga = {}
+        if aluno_ids:
+            # Alunos antes das turmas (a mesma ordem do matricular, para não haver deadlock)
+            db.query(Aluno.id).filter(Aluno.id.in_(aluno_ids)).order_by(Aluno.id).with_for_update().all()
+            projetos = {projeto_id for projeto_id, _ in turmas_origem}
+            destinos = {}
+            for turma in (
+                db.query(Turma.id, Turma.projeto_id, Turma.nome_turma, Turma.vagas_totais)
+                .filter(Turma.ano_letivo == ano_destino, Turma.projeto_id.in_(projetos))
+                .order_by(Turma.id)
+                .with_for_update()
+            ):
+                destinos.setdefault((turma.projeto_id, turma.nome_turma), turma)
+            ocupadas = dict(
+                db.query(Matricula.turma_id, func.count(Matricula.id))
+                .filter(Matricula.turma_id.in_([t.id for t in destinos.values()]))
+                .group_by(Matricula.turma_id)
+                .all()
+            )
+            no_projeto = set(
+                db.query(Matricula.aluno_id, Turma.projeto_id)
+                .join(Turma, Turma.id == Matricula.turma_id)
+                .filter(Turma.ano_letivo == ano_destino, Turma.projeto_id.in_(projetos), Matricula.aluno_id.in_(aluno_ids))
+                .all()
+            )
+
+            # Por ordem de matrícula no ano de origem: quem se matriculou antes fica com a vaga
+            candidatos = (
+                db.query(Matricula.aluno_id, Aluno.nome_completo, origem.projeto_id, origem.nome_turma)
+                .join(origem, origem.id == Matricula.turma_id)
+                .join(Aluno, Aluno.id == Matricula.aluno_id)
+                .filter(escolhidas, Matricula.aluno_id.in_(aluno_ids), Aluno.status_ativo == True)
+                .order_by(Matricula.id)
+            )
+            for aluno_id, nome, projeto_id, nome_turma in candidatos:
+                turma = destinos.get((projeto_id, nome_turma))
+                if turma is None or (aluno_id, projeto_id) in no_projeto:
+                    continue
+                if ocupadas.get(turma.id, 0) >= turma.vagas_totais:
+                    sem_vaga[(aluno_id, projeto_id)] = f"{nome} ({turmas_origem[(projeto_id, nome_turma)][1]})"
+                    continue
+                ocupadas[turma.id] = ocupadas.get(turma.id, 0) + 1
+                no_projeto.add((aluno_id, projeto_id))
+                sem_vaga.pop((aluno_id, projeto_id), None)
+                novas.append({"aluno_id": aluno_id, "turma_id": turma.id, "data_matricula": data_matricula or date.today()})
+            if novas:
+                db.execute(insert(Matricula), novas)
+
+        # 3. Inativação: alunos das turmas escolhidas que não têm matrícula no ano seguinte
+        # (quem ficou sem vaga queria continuar e segue ativo)
+        inativacoes = 0
+        if inativar_demais:
+            inativacoes = db.execute(
+                update(Aluno)
+                .where(
+                    Aluno.status_ativo == True,
+                    Aluno.id.in_(select(Matricula.aluno_id).where(Matricula.turma_id.in_(turma_ids))),
+                    Aluno.id.not_in({aluno_id for aluno_id, _ in sem_vaga}),
+                    ~exists().where(Matricula.aluno_id == Aluno.id, Matricula.turma_id == destino.id, destino.ano_letivo == ano_destino),
+                )
+                .values(status_ativo=False)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+        if simular:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        "turmas_copiadas": [nome for _, nome, ja_aberta in turmas_origem.values() if not ja_aberta],
+        "turmas_ja_abertas": [nome for _, nome, ja_aberta in turmas_origem.values() if ja_aberta],
+        "rematriculas": len(novas),
+        "sem_vaga": sorted(sem_vaga.values()),
+        "inativacoes": inativacoes,
+    }
@@ -1,30 +1,357 @@
-import streamlit as st
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, ForeignKey, Date, Boolean
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy import create_engine, event, inspect, select, or_, Index, Column, Integer, String, Float, Text, ForeignKey, Date, DateTime, Boolean
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker, Session
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import collections
 import datetime
+import functools
+import heapq
+import json
+import logging
+import logging.handlers
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+import weakref
 
-# Busca a URL do banco de dados no cofre do Streamlit
-DATABASE_URL = st.secrets["DATABASE_URL"]
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python 3.10: o pacote toml já vem como dependência do Streamlit
+    tomllib = None
+    import toml
 
-# Cria a conexão com o PostgreSQL na nuvem
-engine = create_engine(DATABASE_URL, echo=False)
+# Este módulo (e consultas.py, relatorios.py, exportacao.py...) não depende do Streamlit:
+# pode ser usado por scripts, tarefas agendadas e ferramentas/ sem um servidor rodando.
+
+# --- CONFIGURAÇÃO ---
+# Cada valor pode vir de uma variável de ambiente ou do secrets.toml (os mesmos arquivos
+# lidos pelo st.secrets: o da pasta do projeto tem prioridade sobre o da pasta do usuário)
+ARQUIVOS_SECRETS = (
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+    os.path.join(os.getcwd(), ".streamlit", "secrets.toml"),
+)
+
+@functools.lru_cache(maxsize=1)
+def _ler_secrets():
+    valores = {}
+    for caminho in ARQUIVOS_SECRETS:
+        if os.path.exists(caminho):
+            if tomllib is not None:
+                with open(caminho, "rb") as f:
+                    valores.update(tomllib.load(f))
+            else:
+                valores.update(toml.load(caminho))
+    return valores
+
+def ler_config(chave, padrao=None):
+    if chave in os.environ:
+        return os.environ[chave]
+    return _ler_secrets().get(chave, padrao)
+
+def _ler_bool(valor):
+    return str(valor).strip().lower() in ("1", "true", "sim", "yes")
+
+# --- MÉTRICAS DO POOL DE CONEXÕES ---
+class MetricasPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retiradas = 0
+        self.tempo_espera_total = 0.0
+        self.tempo_espera_max = 0.0
+        self.esgotamentos = 0
+
+    def registrar(self, espera, esgotado=False):
+        with self._lock:
+            if esgotado:
+                self.esgotamentos += 1
+                return
+            self.retiradas += 1
+            self.tempo_espera_total += espera
+            self.tempo_espera_max = max(self.tempo_espera_max, espera)
+
+    def resumo(self):
+        with self._lock:
+            media = self.tempo_espera_total / self.retiradas if self.retiradas else 0.0
+            return {
+                "retiradas": self.retiradas,
+                "espera_media_ms": media * 1000,
+                "espera_max_ms": self.tempo_espera_max * 1000,
+                "esgotamentos": self.esgotamentos,
+            }
+
+metricas_pool = MetricasPool()
+
+class PoolMedido(QueuePool):
+    # QueuePool que cronometra quanto tempo cada sessão espera por uma conexão livre
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = super().connect()
+        except PoolTimeoutError:
+            metricas_pool.registrar(0, esgotado=True)
+            raise
+        metricas_pool.registrar(time.perf_counter() - inicio)
+        return conexao
+
+# --- ENGINE E SESSÕES (um único pool por processo, compartilhado entre as sessões) ---
+def criar_engine(url=None):
+    url = url or ler_config("DATABASE_URL")
+    if not url:
+        raise RuntimeError("DATABASE_URL não configurada: defina a variável de ambiente ou use o .streamlit/secrets.toml.")
+    opcoes = {"echo": False, "pool_pre_ping": _ler_bool(ler_config("DB_POOL_PRE_PING", "true"))}
+    if not url.startswith("sqlite:///:memory:") and url != "sqlite://":
+        opcoes.update(
+            poolclass=PoolMedido,
+            pool_size=int(ler_config("DB_POOL_SIZE", 5)),
+            max_overflow=int(ler_config("DB_MAX_OVERFLOW", 10)),
+            pool_timeout=float(ler_config("DB_POOL_TIMEOUT", 30)),
+            # O Postgres na nuvem derruba conexões ociosas: recicla antes disso
+            pool_recycle=int(ler_config("DB_POOL_RECYCLE", 1800)),
+        )
+    novo_engine = create_engine(url, **opcoes)
+    if novo_engine.dialect.name == "sqlite":
+        # O SQLite só aplica as chaves estrangeiras (e o ON DELETE CASCADE) se cada conexão pedir
+        @event.listens_for(novo_engine, "connect")
+        def _ligar_chaves_estrangeiras(conexao_dbapi, registro):
+            cursor = conexao_dbapi.cursor()
+            cursor.execute("PRAGMA foreign_keys = ON")
+            cursor.close()
+    return novo_engine
+
+def status_pool():
+    pool = engine.pool
+    status = {
+        "tamanho": pool.size() if hasattr(pool, "size") else None,
+        "em_uso": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        "livres": pool.checkedin() if hasattr(pool, "checkedin") else None,
+        "excedentes": max(pool.overflow(), 0) if hasattr(pool, "overflow") else None,
+    }
+    status.update(metricas_pool.resumo())
+    return status
+
+# O módulo é importado uma única vez por processo: engine e pool são compartilhados
+engine = criar_engine()
 Base = declarative_base()
 SessionLocal = sessionmaker(bind=engine)
 
+# --- INSTRUMENTAÇÃO DAS CONSULTAS ---
+# Cada página chama iniciar_medicao(__file__) no começo da execução: daí em diante, toda
+# consulta feita pela mesma thread entra na medição da página (quantidade, tempo no banco,
+# consultas mais lentas). A medição termina quando a thread começa outra ou quando a thread
+# da execução acaba. Só o texto SQL é guardado: os parâmetros (nomes, CPFs...) nunca vão
+# para o painel nem para o log.
+DIAGNOSTICO_ATIVO = _ler_bool(ler_config("DIAGNOSTICO_CONSULTAS", "true"))
+LENTA_MS = float(ler_config("DIAGNOSTICO_LENTA_MS", 200))
+# A mesma consulta (mudando só os parâmetros) repetida N vezes numa execução: padrão N+1
+REPETICOES_N1 = int(ler_config("DIAGNOSTICO_REPETICOES_N1", 10))
+LOG_CONSULTAS = ler_config("DIAGNOSTICO_LOG", os.path.join(tempfile.gettempdir(), "agape_consultas.log"))
+LOG_CONSULTAS_MB = float(ler_config("DIAGNOSTICO_LOG_MB", 5))
+LOG_CONSULTAS_ARQUIVOS = int(ler_config("DIAGNOSTICO_LOG_ARQUIVOS", 3))
+MAX_EXECUCOES_GUARDADAS = 200
+MAX_LENTAS_POR_EXECUCAO = 5
+
+PASTA_PROJETO = os.path.dirname(os.path.abspath(__file__))
+
+# Valores embutidos no texto viram "?": a mesma consulta com outro id conta como repetição
+_LITERAIS_SQL = (
+    (re.compile(r"%\(\w+\)s"), "?"),                      # parâmetros nomeados do psycopg2
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                   # textos
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),                # números
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?...)"),   # listas do IN de qualquer tamanho
+    (re.compile(r"\s+"), " "),
+)
+
+def normalizar_sql(sql):
+    for padrao, troca in _LITERAIS_SQL:
+        sql = padrao.sub(troca, sql)
+    return sql.strip()
+
+class MedicaoConsultas:
+    def __init__(self, rotulo):
+        self.rotulo = rotulo
+        self.inicio = datetime.datetime.now()
+        self.consultas = 0
+        self.tempo_total = 0.0
+        self.por_sql = {}  # sql normalizado -> [execuções, tempo]
+        self.lentas = []   # heap com as (tempo, sql) mais lentas
+        self.encerrada = False
+
+    def registrar(self, sql, tempo):
+        self.consultas += 1
+        self.tempo_total += tempo
+        contagem = self.por_sql.setdefault(sql, [0, 0.0])
+        contagem[0] += 1
+        contagem[1] += tempo
+        if len(self.lentas) < MAX_LENTAS_POR_EXECUCAO:
+            heapq.heappush(self.lentas, (tempo, sql))
+        elif tempo > self.lentas[0][0]:
+            heapq.heapreplace(self.lentas, (tempo, sql))
+
+    def resumo(self):
+        repetidas = [
+            {"sql": sql, "vezes": vezes, "tempo_ms": tempo * 1000}
+            for sql, (vezes, tempo) in self.por_sql.items()
+            if vezes >= REPETICOES_N1
+        ]
+        return {
+            "pagina": self.rotulo,
+            "inicio": self.inicio,
+            "consultas": self.consultas,
+            "tempo_ms": self.tempo_total * 1000,
+            "lentas": [{"sql": sql, "tempo_ms": tempo * 1000} for tempo, sql in sorted(self.lentas, reverse=True)],
+            "repetidas": sorted(repetidas, key=lambda r: r["vezes"], reverse=True),
+        }
+
+_execucoes = collections.deque(maxlen=MAX_EXECUCOES_GUARDADAS)
+_lock_execucoes = threading.Lock()
+_medicao_da_thread = threading.local()
+_log_consultas = logging.getLogger("agape.consultas")
+
+def _logger_consultas():
+    # O arquivo só é criado na primeira gravação (scripts que não medem nada não o tocam)
+    with _lock_execucoes:
+        if not _log_consultas.handlers:
+            os.makedirs(os.path.dirname(os.path.abspath(LOG_CONSULTAS)), exist_ok=True)
+            arquivo = logging.handlers.RotatingFileHandler(
+                LOG_CONSULTAS,
+                maxBytes=int(LOG_CONSULTAS_MB * 1024 * 1024),
+                backupCount=LOG_CONSULTAS_ARQUIVOS,
+                encoding="utf-8",
+            )
+            arquivo.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            _log_consultas.addHandler(arquivo)
+            _log_consultas.setLevel(logging.INFO)
+            _log_consultas.propagate = False
+    return _log_consultas
+
+class _FimDaThread:
+    # Fica no threading.local: é coletado quando a thread termina e encerra a medição pendente
+    pass
+
+def iniciar_medicao(pagina, trecho=None):
+    if not DIAGNOSTICO_ATIVO:
+        return
+    encerrar_medicao()
+    rotulo = os.path.relpath(os.path.abspath(pagina), PASTA_PROJETO).replace(os.sep, "/")
+    if trecho:
+        rotulo = f"{rotulo} › {trecho}"
+    medicao = MedicaoConsultas(rotulo)
+    fim = _FimDaThread()
+    weakref.finalize(fim, _publicar_medicao, medicao)
+    _medicao_da_thread.medicao = medicao
+    _medicao_da_thread.fim = fim
+
+def encerrar_medicao():
+    medicao = getattr(_medicao_da_thread, "medicao", None)
+    _medicao_da_thread.medicao = None
+    if medicao is not None:
+        _publicar_medicao(medicao)
+
+def _publicar_medicao(medicao):
+    if medicao.encerrada:
+        return
+    medicao.encerrada = True
+    resumo = medicao.resumo()
+    with _lock_execucoes:
+        _execucoes.append(resumo)
+    log = _logger_consultas()
+    log.info("%s: %d consulta(s), %.1f ms no banco", resumo["pagina"], resumo["consultas"], resumo["tempo_ms"])
+    for repetida in resumo["repetidas"]:
+        log.warning("N+1 em %s: %dx (%.1f ms) %s", resumo["pagina"], repetida["vezes"], repetida["tempo_ms"], repetida["sql"])
+
+def execucoes_medidas():
+    with _lock_execucoes:
+        return list(_execucoes)
+
+def limpar_execucoes_medidas():
+    with _lock_execucoes:
+        _execucoes.clear()
+
+def resumo_por_pagina():
+    paginas = {}
+    for execucao in execucoes_medidas():
+        paginas.setdefault(execucao["pagina"], []).append(execucao)
+    return [
+        {
+            "pagina": pagina,
+            "execucoes": len(lista),
+            "consultas_media": sum(e["consultas"] for e in lista) / len(lista),
+            "consultas_max": max(e["consultas"] for e in lista),
+            "tempo_medio_ms": sum(e["tempo_ms"] for e in lista) / len(lista),
+            "tempo_max_ms": max(e["tempo_ms"] for e in lista),
+            "alertas_n1": sum(1 for e in lista if e["repetidas"]),
+        }
+        for pagina, lista in sorted(paginas.items())
+    ]
+
+if DIAGNOSTICO_ATIVO:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+        conn.info["inicio_consulta"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+        tempo = time.perf_counter() - conn.info.pop("inicio_consulta", time.perf_counter())
+        medicao = getattr(_medicao_da_thread, "medicao", None)
+        lenta = tempo * 1000 >= LENTA_MS
+        if medicao is None and not lenta:
+            return
+        sql = normalizar_sql(statement)
+        if medicao is not None:
+            medicao.registrar(sql, tempo)
+        if lenta:
+            rotulo = medicao.rotulo if medicao is not None else threading.current_thread().name
+            _logger_consultas().warning("Consulta lenta em %s: %.1f ms %s", rotulo, tempo * 1000, sql)
+
 # --- TABELAS ---
 
 class Aluno(Base):
     __tablename__ = 'alunos'
+    __table_args__ = (
+        # Verificação de duplicidade no cadastro (Nome + Data de Nascimento)
+        Index("ix_alunos_nome_nascimento", "nome_completo", "data_nascimento"),
+        # Busca por prefixo do nome (no PostgreSQL o operador precisa servir ao LIKE 'abc%')
+        Index("ix_alunos_nome_busca", "nome_busca", postgresql_ops={"nome_busca": "varchar_pattern_ops"}),
+        Index("ix_alunos_cpf_digitos", "cpf_digitos", postgresql_ops={"cpf_digitos": "varchar_pattern_ops"}),
+        # Ordenações da navegação paginada (o id desempata e completa a chave do cursor)
+        Index("ix_alunos_ordem_nome", "nome_busca", "id"),
+        Index("ix_alunos_ordem_nascimento", "data_nascimento", "id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     nome_completo = Column(String, nullable=False)
     data_nascimento = Column(Date, nullable=False)
     rg = Column(String)
-    cpf = Column(String)
+    cpf = Column(String, index=True)
     status_ativo = Column(Boolean, default=True, nullable=False) 
     dados_cadastrais_json = Column(Text, nullable=False) 
     
-    matriculas = relationship("Matricula", back_populates="aluno")
+    # Campos muito consultados copiados do JSON (mantidos em sincronia no flush)
+    nome_resp1 = Column(String)
+    contato_resp1 = Column(String)
+    bairro = Column(String, index=True)
+    medicacao_continua = Column(String, index=True)
+    
+    # Chaves de busca: nome sem acentos em minúsculas e CPF só com dígitos
+    nome_busca = Column(String)
+    cpf_digitos = Column(String)
+    
+    # As exclusões em cascata ficam a cargo do banco (ON DELETE CASCADE nas chaves estrangeiras)
+    matriculas = relationship("Matricula", back_populates="aluno", passive_deletes=True)
+    vulnerabilidades = relationship("AlunoVulnerabilidade", back_populates="aluno", cascade="all, delete-orphan", passive_deletes=True)
+
+class AlunoVulnerabilidade(Base):
+    __tablename__ = 'alunos_vulnerabilidades'
+    
+    # Uma linha por vulnerabilidade marcada no cadastro (campo multiselect do JSON)
+    aluno_id = Column(Integer, ForeignKey('alunos.id', ondelete="CASCADE"), primary_key=True)
+    vulnerabilidade = Column(String, primary_key=True, index=True)
+    
+    aluno = relationship("Aluno", back_populates="vulnerabilidades")
 
 class Projeto(Base):
     __tablename__ = 'projetos'
@@ -35,13 +362,16 @@ class Projeto(Base):
     descricao = Column(Text)
     local = Column(String)
     
-    turmas = relationship("Turma", back_populates="projeto")
+    turmas = relationship("Turma", back_populates="projeto", passive_deletes=True)
 
 class Turma(Base):
     __tablename__ = 'turmas'
+    __table_args__ = (
+        Index("ix_turmas_projeto_ano", "projeto_id", "ano_letivo"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    projeto_id = Column(Integer, ForeignKey('projetos.id'))
+    projeto_id = Column(Integer, ForeignKey('projetos.id', ondelete="CASCADE"))
     nome_turma = Column(String, nullable=False)
     horario = Column(String, nullable=False)
     vagas_totais = Column(Integer, nullable=False)
@@ -53,14 +383,19 @@ class Turma(Base):
     remuneracao_professor = Column(Float, nullable=True)
     
     projeto = relationship("Projeto", back_populates="turmas")
-    matriculas = relationship("Matricula", back_populates="turma")
+    matriculas = relationship("Matricula", back_populates="turma", passive_deletes=True)
 
 class Matricula(Base):
     __tablename__ = 'matriculas'
+    __table_args__ = (
+        # Impede matricular o mesmo aluno duas vezes na mesma turma (e atende às buscas por aluno_id)
+        Index("uq_matriculas_aluno_turma", "aluno_id", "turma_id", unique=True),
+        Index("ix_matriculas_ordem_data", "data_matricula", "id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    aluno_id = Column(Integer, ForeignKey('alunos.id'))
-    turma_id = Column(Integer, ForeignKey('turmas.id'))
+    aluno_id = Column(Integer, ForeignKey('alunos.id', ondelete="CASCADE"))
+    turma_id = Column(Integer, ForeignKey('turmas.id', ondelete="CASCADE"), index=True)
     data_matricula = Column(Date, nullable=False)
     
     aluno = relationship("Aluno", back_populates="matriculas")
@@ -71,11 +406,202 @@ class Usuario(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     nome = Column(String, nullable=False)
-    email = Column(String, nullable=False, unique=True)
+    email = Column(String, nullable=False, unique=True) # unique já cria o índice usado no login
     senha = Column(String, nullable=False)
     
     # NOVO: Define se o usuário tem privilégios de administrador
     is_admin = Column(Boolean, default=False, nullable=False)
 
-# Comando para criar as tabelas
-Base.metadata.create_all(engine)
\ No newline at end of file
+class EstatisticaAno(Base):
+    __tablename__ = 'estatisticas_ano'
+    
+    # Números congelados de um ano letivo fechado (ver consultas.fechar_ano_letivo)
+    ano_letivo = Column(Integer, primary_key=True)
+    fechado_em = Column(DateTime, nullable=False)
+    alunos_ativos = Column(Integer, nullable=False)
+    alunos_matriculados = Column(Integer, nullable=False)
+    turmas = Column(Integer, nullable=False)
+    matriculas = Column(Integer, nullable=False)
+    vagas_totais = Column(Integer, nullable=False)
+    # Ocupação de cada turma no fechamento (linhas de consultas.ocupacao_por_turma)
+    ocupacao_turmas_json = Column(Text, nullable=False)
+
+class VersaoDados(Base):
+    __tablename__ = 'versoes_dados'
+    
+    # Um contador por tabela, incrementado na mesma transação de cada escrita (usado pelo cache_consultas.py),
+    # e um por ano letivo ("ano:2025", usado pelo cache dos relatórios)
+    tabela = Column(String, primary_key=True)
+    versao = Column(Integer, nullable=False, default=0)
+
+# --- CAMPOS PROMOVIDOS DO JSON ---
+
+CAMPOS_PROMOVIDOS = ("nome_resp1", "contato_resp1", "bairro", "medicacao_continua")
+
+def extrair_campos_promovidos(dados):
+    valores = {}
+    for campo in CAMPOS_PROMOVIDOS:
+        valor = dados.get(campo)
+        valores[campo] = str(valor) if valor not in (None, "") else None
+    return valores
+
+def sincronizar_campos_promovidos(aluno):
+    dados = json.loads(aluno.dados_cadastrais_json)
+    for campo, valor in extrair_campos_promovidos(dados).items():
+        setattr(aluno, campo, valor)
+    
+    # Só mexe nas linhas que mudaram (evita apagar e reinserir a mesma chave)
+    marcadas = set(dados.get("vulnerabilidades") or [])
+    atuais = {v.vulnerabilidade: v for v in aluno.vulnerabilidades}
+    for nome, linha in atuais.items():
+        if nome not in marcadas:
+            aluno.vulnerabilidades.remove(linha)
+    for nome in sorted(marcadas - atuais.keys()):
+        aluno.vulnerabilidades.append(AlunoVulnerabilidade(vulnerabilidade=nome))
+
+# --- CHAVES DE BUSCA ---
+
+def normalizar_busca(texto):
+    # "  José  da SILVA " -> "jose da silva"
+    sem_acentos = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(sem_acentos.lower().split())
+
+def apenas_digitos(texto):
+    return "".join(c for c in (texto or "") if c.isdigit())
+
+def sincronizar_chaves_busca(aluno):
+    aluno.nome_busca = normalizar_busca(aluno.nome_completo)
+    aluno.cpf_digitos = apenas_digitos(aluno.cpf) or None
+
+@event.listens_for(Session, "before_flush")
+def _sincronizar_alunos(session, flush_context, instances):
+    # Qualquer aluno novo ou alterado tem as colunas derivadas atualizadas antes de ir ao banco
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Aluno):
+            continue
+        novo = obj in session.new
+        atributos = inspect(obj).attrs
+        if novo or atributos.dados_cadastrais_json.history.has_changes():
+            sincronizar_campos_promovidos(obj)
+        if novo or atributos.nome_completo.history.has_changes() or atributos.cpf.history.has_changes():
+            sincronizar_chaves_busca(obj)
+
+# --- VERSÕES DOS DADOS (invalidação do cache de consultas) ---
+
+TABELAS_VERSIONADAS = ("alunos", "projetos", "turmas", "matriculas", "estatisticas_ano")
+
+# Tabelas auxiliares contam como escrita na tabela principal
+_TABELA_VERSIONADA = {"alunos_vulnerabilidades": "alunos"}
+
+# Excluir uma linha também apaga (ON DELETE CASCADE) as linhas que dependem dela
+_EXCLUSAO_AFETA = {
+    "alunos": ("matriculas",),
+    "turmas": ("matriculas",),
+    "projetos": ("turmas", "matriculas"),
+}
+
+# Versões por ano letivo (usadas pelo cache dos relatórios, ver relatorios.impressao_digital):
+# cada gravação ORM em turmas, matrículas, estatísticas, ou a edição de um aluno ou projeto,
+# conta para os anos letivos em que essas linhas aparecem. Gravações em lote, cujas linhas não
+# se conhecem, contam para todos os anos (VERSAO_TODOS_OS_ANOS).
+VERSAO_TODOS_OS_ANOS = "ano:*"
+
+def versao_do_ano(ano_letivo):
+    return f"ano:{ano_letivo}"
+
+def _valores(obj, atributo):
+    historico = inspect(obj).attrs[atributo].history
+    return {v for v in historico.sum() if v is not None}
+
+def _marcar_alteradas(session, tabelas, exclusao=False):
+    afetadas = {_TABELA_VERSIONADA.get(t, t) for t in tabelas}
+    if exclusao:
+        for tabela in list(afetadas):
+            afetadas.update(_EXCLUSAO_AFETA.get(tabela, ()))
+    afetadas &= set(TABELAS_VERSIONADAS)
+    if not afetadas:
+        return
+    # Só anota: as versões são incrementadas uma única vez, no commit (_versionar_no_commit)
+    session.info.setdefault("tabelas_alteradas", set()).update(afetadas)
+    session.info["dados_alterados"] = True
+    session.info.pop("versoes_dados", None)
+
+def _marcar_anos(session, objetos, editados):
+    # Anota os anos (ou os ids que levam a eles, resolvidos no commit) das linhas gravadas
+    anos = session.info.setdefault("anos_alterados", set())
+    ids = session.info.setdefault("ids_por_ano", collections.defaultdict(set))
+    for obj in objetos:
+        if isinstance(obj, (Turma, EstatisticaAno)):
+            anos.update(_valores(obj, "ano_letivo"))
+        elif isinstance(obj, Matricula):
+            ids["turmas"].update(_valores(obj, "turma_id"))
+        elif isinstance(obj, Aluno) and obj in editados:
+            # Aluno novo ainda não tem matrículas; excluído leva as matrículas junto (muda as contagens)
+            ids["alunos"].add(obj.id)
+        elif isinstance(obj, Projeto) and obj in editados:
+            ids["projetos"].add(obj.id)
+
+def _resolver_anos(session):
+    anos = session.info.pop("anos_alterados", set())
+    ids = session.info.pop("ids_por_ano", {})
+    condicoes = []
+    if ids.get("turmas"):
+        condicoes.append(Turma.id.in_(ids["turmas"]))
+    if ids.get("projetos"):
+        condicoes.append(Turma.projeto_id.in_(ids["projetos"]))
+    if ids.get("alunos"):
+        condicoes.append(Turma.id.in_(select(Matricula.turma_id).where(Matricula.aluno_id.in_(ids["alunos"]))))
+    if condicoes:
+        anos.update(session.connection().execute(select(Turma.ano_letivo).where(or_(*condicoes)).distinct()).scalars())
+    return {a if a == VERSAO_TODOS_OS_ANOS else versao_do_ano(a) for a in anos}
+
+@event.listens_for(Session, "after_flush")
+def _versionar_flush(session, flush_context):
+    editados = {obj for obj in session.dirty if session.is_modified(obj)}
+    gravadas = {obj.__table__.name for obj in session.new}
+    gravadas |= {obj.__table__.name for obj in editados}
+    excluidas = {obj.__table__.name for obj in session.deleted}
+    _marcar_alteradas(session, gravadas)
+    _marcar_alteradas(session, excluidas, exclusao=True)
+    _marcar_anos(session, list(session.new) + list(editados) + list(session.deleted), editados)
+
+@event.listens_for(Session, "do_orm_execute")
+def _versionar_em_lote(estado):
+    # INSERT/UPDATE/DELETE em lote (db.query(...).delete(), db.execute(insert(...))) não passam pelo flush
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    tabela = getattr(estado.statement, "table", None)
+    if tabela is not None:
+        _marcar_alteradas(estado.session, {tabela.name}, exclusao=estado.is_delete)
+        if _TABELA_VERSIONADA.get(tabela.name, tabela.name) in TABELAS_VERSIONADAS:
+            estado.session.info.setdefault("anos_alterados", set()).add(VERSAO_TODOS_OS_ANOS)
+
+_INSERIR_OU_IGNORAR = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+@event.listens_for(Session, "before_commit")
+def _versionar_no_commit(session):
+    # O commit só descarrega o que está pendente depois deste evento: descarrega antes,
+    # para que o after_flush anote as tabelas desse último flush
+    session.flush()
+    chaves = session.info.pop("tabelas_alteradas", set()) | _resolver_anos(session)
+    if not chaves:
+        return
+    # Na conexão da própria sessão (o incremento é confirmado junto com a escrita), no fim da
+    # transação e sempre em ordem alfabética: duas transações travam as linhas de versoes_dados
+    # na mesma ordem e não entram em deadlock no PostgreSQL
+    conexao = session.connection()
+    inserir = _INSERIR_OU_IGNORAR[conexao.dialect.name]
+    for chave in sorted(chaves):
+        # As linhas dos anos letivos nascem no primeiro incremento
+        conexao.execute(
+            inserir(VersaoDados).values(tabela=chave, versao=1)
+            .on_conflict_do_update(index_elements=["tabela"], set_={"versao": VersaoDados.versao + 1})
+        )
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _fim_da_transacao(session):
+    for chave in ("tabelas_alteradas", "anos_alterados", "ids_por_ano", "dados_alterados", "versoes_dados"):
+        session.info.pop(chave, None)
+
+# A criação e a atualização das tabelas ficam a cargo de migracoes.py
\ No newline at end of file
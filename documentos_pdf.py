@@ -0,0 +1,72 @@
+from fpdf import FPDF
+
+# Formatação dos PDFs, sem acesso ao banco: este módulo também é carregado pelos
+# processos que desenham as listas de chamada em paralelo (ver relatorios.py).
+
+
+# --- CLASSE PARA FORMATAR O PDF ---
+class PDF(FPDF):
+    titulo = "Relatório Anual - Ágape Missões Urbanas"
+
+    def header(self):
+        self.set_font("helvetica", "B", 14)
+        self.cell(0, 10, self.titulo, border=False, align="C", new_x="LMARGIN", new_y="NEXT")
+        # Sem data/hora de geração: o arquivo pode ser reaproveitado do cache (ver relatorios.py)
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font("helvetica", "I", 8)
+        self.cell(0, 10, f"Página {self.page_no()}", align="C", new_x="LMARGIN", new_y="NEXT")
+
+
+class PDFListaChamada(PDF):
+    titulo = "Lista de Chamada - Ágape Missões Urbanas"
+
+
+def _caber(pdf, texto, largura):
+    # Corta o texto que não cabe na célula (a célula da tabela não quebra linha)
+    if pdf.get_string_width(texto) <= largura - 2:
+        return texto
+    while texto and pdf.get_string_width(texto + "...") > largura - 2:
+        texto = texto[:-1]
+    return texto + "..."
+
+
+def renderizar_lista_chamada(turma):
+    # turma: dicionário simples (precisa ser enviado a outro processo) -> bytes do PDF
+    pdf = PDFListaChamada()
+    pdf.add_page()
+
+    pdf.set_font("helvetica", "B", 16)
+    pdf.cell(0, 10, f"Projeto: {turma['projeto']}", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("helvetica", "", 12)
+    pdf.cell(0, 8, f"Local: {turma['local'] or ''}", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(3)
+
+    pdf.set_font("helvetica", "B", 14)
+    pdf.cell(0, 10, f"Turma: {turma['nome_turma']} | Horário: {turma['horario']} | Ano Letivo: {turma['ano_letivo']}", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("helvetica", "", 12)
+    pdf.cell(0, 8, f"Professor(a): {turma['nome_professor']}", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 8, f"Alunos matriculados: {len(turma['alunos'])} de {turma['vagas_totais']} vagas", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(5)
+
+    if not turma["alunos"]:
+        pdf.cell(0, 8, "Nenhum aluno matriculado nesta turma.", new_x="LMARGIN", new_y="NEXT")
+        return bytes(pdf.output())
+
+    # Tabela: nº | aluno | responsável | contato
+    larguras = (10, 75, 60, 45)
+    pdf.set_font("helvetica", "B", 11)
+    for largura, titulo in zip(larguras, ("Nº", "Aluno", "Responsável", "Contato")):
+        pdf.cell(largura, 8, titulo, border=1)
+    pdf.ln()
+
+    pdf.set_font("helvetica", "", 10)
+    for idx, (nome, responsavel, contato) in enumerate(turma["alunos"]):
+        valores = (str(idx + 1), nome, responsavel or "Sem responsável", contato or "Sem contato")
+        for largura, valor in zip(larguras, valores):
+            pdf.cell(largura, 7, _caber(pdf, valor, largura), border=1)
+        pdf.ln()
+
+    return bytes(pdf.output())
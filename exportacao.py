@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import shutil
+import zipfile
+import tempfile
+import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select
+from database import Aluno, Projeto, Turma, Matricula, ler_config
+
+# ==========================================
+# EXPORTAÇÃO COMPLETA (CSV / PARQUET)
+# ==========================================
+# As linhas saem do banco em blocos (yield_per usa cursor no servidor no PostgreSQL)
+# e cada bloco é gravado no arquivo antes de o próximo ser lido: a memória usada
+# não cresce com o tamanho das tabelas.
+
+TAMANHO_BLOCO = 2000
+FORMATOS = ("csv", "parquet")
+SEPARADOR_LISTAS = "; "
+
+# Os arquivos (dados pessoais) são gerados numa pasta única do aplicativo. A página guarda só
+# o caminho e apaga o arquivo quando a exportação é substituída ou descartada; o que sobrar
+# (sessão encerrada, exportação interrompida) é removido na exportação seguinte
+PASTA_EXPORTACOES = ler_config("EXPORTACAO_DIR") or os.path.join(tempfile.gettempdir(), "agape_exportacoes")
+VALIDADE_SOBRAS_SEGUNDOS = 3600
+
+# Campos do JSON que já existem como colunas próprias do aluno
+CAMPOS_DO_ALUNO = {"nome_completo", "data_nascimento", "rg", "cpf"}
+
+
+def _carregar_campos():
+    with open("config_campos.json", "r", encoding="utf-8") as f:
+        return json.load(f)["cadastro_aluno"]
+
+
+def _colunas_cadastro():
+    # {coluna: tipo pandas} para os campos achatados do dados_cadastrais_json
+    colunas = {}
+    for campos in _carregar_campos().values():
+        for campo in campos:
+            if campo["nome"] in CAMPOS_DO_ALUNO:
+                continue
+            colunas[campo["nome"]] = "float64" if campo["tipo"] == "number" else "string"
+            if campo["tipo"] == "radio_com_detalhe":
+                colunas[f"{campo['nome']}_detalhe"] = "string"
+    return colunas
+
+
+def _blocos(db, consulta):
+    resultado = db.execute(consulta.execution_options(yield_per=TAMANHO_BLOCO))
+    for bloco in resultado.partitions():
+        yield [tuple(linha) for linha in bloco]
+
+
+# --- DEFINIÇÃO DE CADA ARQUIVO: (consulta, colunas com tipo, conversão do bloco) ---
+
+def _tabela_alunos():
+    colunas_cadastro = _colunas_cadastro()
+    colunas = {
+        "id": "int64", "nome_completo": "string", "data_nascimento": "datetime64[ms]",
+        "rg": "string", "cpf": "string", "status_ativo": "bool",
+        **colunas_cadastro,
+    }
+    consulta = select(
+        Aluno.id, Aluno.nome_completo, Aluno.data_nascimento, Aluno.rg, Aluno.cpf, Aluno.status_ativo,
+        Aluno.dados_cadastrais_json,
+    ).order_by(Aluno.id)
+
+    def converter(bloco):
+        base = pd.DataFrame([linha[:6] for linha in bloco], columns=list(colunas)[:6])
+        fichas = pd.DataFrame.from_records([json.loads(linha[6]) for linha in bloco])
+        fichas = fichas.reindex(columns=list(colunas_cadastro))
+        for coluna, tipo in colunas_cadastro.items():
+            if tipo == "float64":
+                # Fichas antigas podem ter texto vazio em campos numéricos
+                fichas[coluna] = pd.to_numeric(fichas[coluna], errors="coerce")
+            else:
+                # Listas (multiselect) viram texto separado por ";"
+                fichas[coluna] = fichas[coluna].map(
+                    lambda v: SEPARADOR_LISTAS.join(v) if isinstance(v, list) else v
+                )
+        return pd.concat([base, fichas], axis=1)
+
+    return consulta, colunas, converter
+
+
+def _tabela_projetos():
+    colunas = {"id": "int64", "nome": "string", "descricao": "string", "local": "string"}
+    consulta = select(Projeto.id, Projeto.nome, Projeto.descricao, Projeto.local).order_by(Projeto.id)
+    return consulta, colunas, None
+
+
+def _tabela_turmas():
+    colunas = {
+        "id": "int64", "projeto_id": "int64", "projeto": "string", "nome_turma": "string", "horario": "string",
+        "vagas_totais": "int64", "ano_letivo": "int64", "nome_professor": "string", "cpf_professor": "string",
+        "remuneracao_professor": "float64",
+    }
+    consulta = (
+        select(
+            Turma.id, Turma.projeto_id, Projeto.nome, Turma.nome_turma, Turma.horario, Turma.vagas_totais,
+            Turma.ano_letivo, Turma.nome_professor, Turma.cpf_professor, Turma.remuneracao_professor,
+        )
+        .join(Projeto, Projeto.id == Turma.projeto_id)
+        .order_by(Turma.id)
+    )
+    return consulta, colunas, None
+
+
+def _tabela_matriculas():
+    colunas = {
+        "id": "int64", "aluno_id": "int64", "aluno": "string", "turma_id": "int64", "turma": "string",
+        "projeto": "string", "ano_letivo": "int64", "data_matricula": "datetime64[ms]",
+    }
+    consulta = (
+        select(
+            Matricula.id, Matricula.aluno_id, Aluno.nome_completo, Matricula.turma_id, Turma.nome_turma,
+            Projeto.nome, Turma.ano_letivo, Matricula.data_matricula,
+        )
+        .join(Aluno, Aluno.id == Matricula.aluno_id)
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .join(Projeto, Projeto.id == Turma.projeto_id)
+        .order_by(Matricula.id)
+    )
+    return consulta, colunas, None
+
+
+TABELAS = {
+    "alunos": _tabela_alunos,
+    "matriculas": _tabela_matriculas,
+    "turmas": _tabela_turmas,
+    "projetos": _tabela_projetos,
+}
+
+
+# --- GRAVAÇÃO ---
+
+def _gravar_tabela(db, definicao, caminho, formato):
+    consulta, colunas, converter = definicao()
+    schema = None
+    escritor = None
+    total = 0
+    try:
+        for bloco in _blocos(db, consulta):
+            df = converter(bloco) if converter else pd.DataFrame(bloco, columns=list(colunas))
+            df = df.astype(colunas)
+            if formato == "csv":
+                df.to_csv(caminho, mode="a", header=(total == 0), index=False, encoding="utf-8")
+            else:
+                if escritor is None:
+                    schema = pa.Schema.from_pandas(df, preserve_index=False)
+                    escritor = pq.ParquetWriter(caminho, schema)
+                escritor.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            total += len(df)
+
+        if total == 0:
+            # Tabela vazia: grava só o cabeçalho / esquema
+            vazio = pd.DataFrame({c: pd.Series(dtype=t) for c, t in colunas.items()})
+            if formato == "csv":
+                vazio.to_csv(caminho, index=False, encoding="utf-8")
+            else:
+                pq.write_table(pa.Table.from_pandas(vazio, preserve_index=False), caminho)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return total
+
+
+def _remover_sobras():
+    limite = time.time() - VALIDADE_SOBRAS_SEGUNDOS
+    for nome in os.listdir(PASTA_EXPORTACOES):
+        caminho = os.path.join(PASTA_EXPORTACOES, nome)
+        if os.path.isdir(caminho) and os.path.getmtime(caminho) < limite:
+            shutil.rmtree(caminho, ignore_errors=True)
+
+
+def descartar_exportacao(caminho_zip):
+    # Apaga o .zip e a pasta da exportação (cada exportação tem a sua, dentro de PASTA_EXPORTACOES)
+    shutil.rmtree(os.path.dirname(caminho_zip), ignore_errors=True)
+
+
+def exportar_tudo(db, formato="csv", progresso=None):
+    # Gera um .zip com um arquivo por tabela e devolve (caminho do zip, {tabela: nº de linhas}).
+    # Quem chama apaga o arquivo com descartar_exportacao depois de usá-lo.
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato não suportado: {formato}")
+
+    os.makedirs(PASTA_EXPORTACOES, exist_ok=True)
+    _remover_sobras()
+    pasta = tempfile.mkdtemp(prefix="exportacao_", dir=PASTA_EXPORTACOES)
+    carimbo = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+    caminho_zip = os.path.join(pasta, f"Exportacao_Agape_{carimbo}_{formato}.zip")
+    contagens = {}
+
+    try:
+        with zipfile.ZipFile(caminho_zip, "w", compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+            for indice, (nome, definicao) in enumerate(TABELAS.items()):
+                if progresso:
+                    progresso(indice / len(TABELAS), f"Exportando {nome}...")
+                caminho = os.path.join(pasta, f"{nome}.{formato}")
+                contagens[nome] = _gravar_tabela(db, definicao, caminho, formato)
+                arquivo_zip.write(caminho, arcname=f"{nome}.{formato}")
+                os.remove(caminho)
+    except Exception:
+        descartar_exportacao(caminho_zip)
+        raise
+
+    if progresso:
+        progresso(1.0, "Exportação concluída.")
+    return caminho_zip, contagens
@@ -0,0 +1,124 @@
+# Mede o custo do bcrypt e a vazão de logins passando pelo pool de seguranca.py.
+#
+# Uso (usa um SQLite temporário se DATABASE_URL não estiver definida):
+#     python ferramentas/benchmark_login.py [--sessoes 16] [--logins 64] [--custos 10 11 12 13]
+#
+# O custo usado nos logins é o BCRYPT_ROUNDS configurado (variável de ambiente ou secrets.toml).
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import threading
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "benchmark_login.db")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal, Usuario  # noqa: E402
+from migracoes import aplicar_migracoes  # noqa: E402
+import seguranca  # noqa: E402
+
+EMAIL_TESTE = "benchmark.login@agape.local"
+SENHA_TESTE = "senha-de-benchmark"
+
+
+def medir_custos(custos, repeticoes=3):
+    print("Custo | ms por hash (mediana)")
+    for custo in custos:
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            seguranca._hash(SENHA_TESTE, custo)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        print(f"{custo:5d} | {statistics.median(tempos):8.1f}")
+
+
+def preparar_usuario():
+    db = SessionLocal()
+    try:
+        usuario = db.query(Usuario).filter(Usuario.email == EMAIL_TESTE).first()
+        if usuario is None:
+            usuario = Usuario(nome="Benchmark", email=EMAIL_TESTE, is_admin=False)
+            db.add(usuario)
+        usuario.senha = seguranca.gerar_hash(SENHA_TESTE)
+        db.commit()
+    finally:
+        db.close()
+
+
+def remover_usuario():
+    db = SessionLocal()
+    try:
+        db.query(Usuario).filter(Usuario.email == EMAIL_TESTE).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def medir_logins(num_sessoes, num_logins):
+    latencias = []
+    falhas = []
+    trava = threading.Lock()
+    fila = iter(range(num_logins))
+
+    def sessao():
+        # Cada thread faz o papel de uma sessão do Streamlit enviando o formulário de login
+        while True:
+            with trava:
+                if next(fila, None) is None:
+                    return
+            db = SessionLocal()
+            try:
+                inicio = time.perf_counter()
+                usuario = seguranca.autenticar(db, EMAIL_TESTE, SENHA_TESTE)
+                duracao = (time.perf_counter() - inicio) * 1000
+            finally:
+                db.close()
+            with trava:
+                latencias.append(duracao)
+                if usuario is None:
+                    falhas.append(duracao)
+
+    threads = [threading.Thread(target=sessao) for _ in range(num_sessoes)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    p95 = latencias[max(int(len(latencias) * 0.95) - 1, 0)]
+    print(f"\nLogins: {len(latencias)} | sessões simultâneas: {num_sessoes} | "
+          f"custo: {seguranca.BCRYPT_ROUNDS} | threads bcrypt: {seguranca.BCRYPT_THREADS}")
+    print(f"Vazão: {len(latencias) / total:.1f} logins/s")
+    print(f"Latência: mediana {statistics.median(latencias):.0f} ms | p95 {p95:.0f} ms | máx {latencias[-1]:.0f} ms")
+    return not falhas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessoes", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--custos", type=int, nargs="+", default=[10, 11, 12, 13])
+    args = parser.parse_args()
+
+    medir_custos(args.custos)
+
+    aplicar_migracoes()
+    preparar_usuario()
+    try:
+        ok = medir_logins(args.sessoes, args.logins)
+    finally:
+        remover_usuario()
+
+    if not ok:
+        print("FALHA: algum login válido foi recusado.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Estresse de concorrência da matrícula no PostgreSQL: várias threads disputam as vagas
+# de uma mesma turma e tentam matricular o mesmo aluno duas vezes no mesmo projeto.
+# A garantia em si é conferida pelo pytest (tests/test_matricula_concorrente.py); este
+# script serve para rodar a mesma disputa em volume contra o banco de produção/homologação.
+#
+# Uso (usa um SQLite temporário se DATABASE_URL não estiver definida):
+#     python ferramentas/estresse_matriculas.py [--threads 32] [--alunos 200] [--vagas 15]
+import os
+import sys
+import json
+import argparse
+import datetime
+import tempfile
+import threading
+from collections import Counter
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "estresse.db")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal, Aluno, Projeto, Turma, Matricula  # noqa: E402
+from migracoes import aplicar_migracoes  # noqa: E402
+import consultas  # noqa: E402
+
+
+def preparar(num_alunos, vagas):
+    db = SessionLocal()
+    try:
+        projeto = Projeto(nome=f"Estresse {datetime.datetime.now():%Y%m%d%H%M%S%f}", descricao="", local="")
+        db.add(projeto)
+        db.flush()
+        turmas = [
+            Turma(projeto_id=projeto.id, nome_turma=f"Turma {i + 1}", horario="-", vagas_totais=vagas,
+                  ano_letivo=datetime.date.today().year, nome_professor="-")
+            for i in range(2)
+        ]
+        alunos = [
+            Aluno(nome_completo=f"Aluno Estresse {i}", data_nascimento=datetime.date(2015, 1, 1),
+                  dados_cadastrais_json=json.dumps({"nome_completo": f"Aluno Estresse {i}"}))
+            for i in range(num_alunos)
+        ]
+        db.add_all(turmas + alunos)
+        db.commit()
+        return [t.id for t in turmas], [a.id for a in alunos]
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--alunos", type=int, default=200)
+    parser.add_argument("--vagas", type=int, default=15)
+    args = parser.parse_args()
+
+    aplicar_migracoes()
+    turmas_ids, alunos_ids = preparar(args.alunos, args.vagas)
+    turma_disputada, outra_turma = turmas_ids
+
+    # Cada aluno tenta a turma disputada e, em seguida, a outra turma do mesmo projeto
+    tentativas = [(a, turma_disputada) for a in alunos_ids] + [(a, outra_turma) for a in alunos_ids]
+    resultados = Counter()
+    lock = threading.Lock()
+    barreira = threading.Barrier(args.threads)
+
+    def trabalhador(indice):
+        barreira.wait()
+        for aluno_id, turma_id in tentativas[indice::args.threads]:
+            db = SessionLocal()
+            try:
+                consultas.matricular(db, aluno_id, turma_id)
+                chave = "aceitas"
+            except consultas.MatriculaRecusada:
+                chave = "recusadas"
+            except Exception as e:
+                chave = f"erro: {type(e).__name__}"
+            finally:
+                db.close()
+            with lock:
+                resultados[chave] += 1
+
+    threads = [threading.Thread(target=trabalhador, args=(i,)) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    db = SessionLocal()
+    try:
+        por_turma = Counter(t for (t,) in db.query(Matricula.turma_id).filter(Matricula.turma_id.in_(turmas_ids)))
+        por_aluno = Counter(a for (a,) in db.query(Matricula.aluno_id).filter(Matricula.turma_id.in_(turmas_ids)))
+    finally:
+        db.close()
+
+    print(f"Tentativas: {len(tentativas)} | {dict(resultados)}")
+    print(f"Matriculados por turma: {dict(por_turma)} (vagas por turma: {args.vagas})")
+
+    falhas = []
+    if any(qtd > args.vagas for qtd in por_turma.values()):
+        falhas.append("turma com mais matrículas do que vagas")
+    if any(qtd > 1 for qtd in por_aluno.values()):
+        falhas.append("aluno matriculado duas vezes no mesmo projeto/ano")
+    if sum(por_turma.values()) != min(2 * args.vagas, args.alunos):
+        falhas.append("total de matrículas diferente do total de vagas disponíveis")
+    if any(chave.startswith("erro") for chave in resultados):
+        falhas.append("tentativas terminaram com erro inesperado")
+
+    if falhas:
+        print("FALHOU: " + "; ".join(falhas))
+        sys.exit(1)
+    print("OK: nenhuma turma lotada além do limite e nenhuma matrícula duplicada.")
+
+
+if __name__ == "__main__":
+    main()
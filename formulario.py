@@ -0,0 +1,151 @@
+import streamlit as st
+import json
+import datetime
+
+# ==========================================
+# FORMULÁRIO DO ALUNO (a partir do config_campos.json)
+# ==========================================
+# O JSON é lido e compilado uma vez por processo. Cada categoria é desenhada dentro
+# de um st.fragment: digitar num campo só reexecuta a própria seção, e não a página
+# inteira com as suas consultas. Os valores ficam no session_state (pelas keys dos
+# widgets) e são recolhidos por coletar() quando o usuário salva.
+
+DATA_MINIMA = datetime.date(1990, 1, 1)
+
+
+class CampoFormulario:
+    def __init__(self, config):
+        self.nome = config["nome"]
+        self.label = config["label"]
+        self.tipo = config["tipo"]
+        self.obrigatorio = config.get("obrigatorio", False)
+        self.opcoes = config.get("opcoes", [])
+        self.rotulo = self.label + (" *" if self.obrigatorio else "")
+        self.renderizar = RENDERIZADORES.get(self.tipo, _texto)
+
+    def pendencias(self, respostas):
+        # Rótulos dos campos obrigatórios que ficaram em branco
+        faltando = []
+        if self.obrigatorio:
+            valor = respostas.get(self.nome)
+            if valor is None or valor == "" or valor == []:
+                faltando.append(self.label)
+            if self.tipo == "radio_com_detalhe" and valor == "Sim" and not respostas.get(f"{self.nome}_detalhe"):
+                faltando.append(f"Detalhes de: {self.label}")
+        return faltando
+
+
+class Secao:
+    def __init__(self, categoria, campos):
+        self.categoria = categoria
+        self.titulo = categoria.replace('_', ' ').title()
+        self.campos = [CampoFormulario(c) for c in campos]
+
+
+# --- WIDGETS POR TIPO DE CAMPO: (campo, key, dados atuais) -> valor ---
+
+def _texto(campo, key, dados):
+    return st.text_input(campo.rotulo, value=dados.get(campo.nome) or "", key=key)
+
+
+def _data(campo, key, dados):
+    try:
+        valor = datetime.datetime.strptime(dados[campo.nome], "%Y-%m-%d").date()
+    except (KeyError, TypeError, ValueError):
+        valor = datetime.date.today()
+    return st.date_input(campo.rotulo, value=valor, min_value=DATA_MINIMA, max_value=datetime.date.today(), key=key)
+
+
+def _numero(campo, key, dados):
+    try:
+        valor = max(float(dados.get(campo.nome) or 0.0), 0.0)
+    except (TypeError, ValueError):
+        valor = 0.0
+    return st.number_input(campo.rotulo, value=valor, min_value=0.0, step=0.1, key=key)
+
+
+def _selecao(campo, key, dados):
+    valor = dados.get(campo.nome)
+    indice = campo.opcoes.index(valor) if valor in campo.opcoes else 0
+    return st.selectbox(campo.rotulo, options=campo.opcoes, index=indice, key=key)
+
+
+def _multipla(campo, key, dados):
+    valor = dados.get(campo.nome)
+    selecionados = [v for v in valor if v in campo.opcoes] if isinstance(valor, list) else []
+    return st.multiselect(campo.rotulo, options=campo.opcoes, default=selecionados, key=key)
+
+
+def _area_texto(campo, key, dados):
+    return st.text_area(campo.rotulo, value=dados.get(campo.nome) or "", key=key)
+
+
+def _sim_nao_com_detalhe(campo, key, dados):
+    indice = 1 if dados.get(campo.nome) == "Sim" else 0
+    resposta = st.radio(campo.rotulo, options=["Não", "Sim"], index=indice, key=key, horizontal=True)
+    if resposta == "Sim":
+        st.text_input(f"Especifique ({campo.label}):", value=dados.get(f"{campo.nome}_detalhe") or "", key=f"{key}_detalhe")
+    return resposta
+
+
+RENDERIZADORES = {
+    "text": _texto,
+    "date": _data,
+    "number": _numero,
+    "selectbox": _selecao,
+    "multiselect": _multipla,
+    "textarea": _area_texto,
+    "radio_com_detalhe": _sim_nao_com_detalhe,
+}
+
+
+# --- COMPILAÇÃO E DESENHO ---
+
+@st.cache_resource
+def compilar_formulario():
+    with open("config_campos.json", "r", encoding="utf-8") as f:
+        config = json.load(f)["cadastro_aluno"]
+    return [Secao(categoria, campos) for categoria, campos in config.items()]
+
+
+@st.fragment
+def _desenhar_secao(secao, prefixo, dados, nivel_titulo):
+    st.markdown(f"{nivel_titulo} {secao.titulo}")
+    cols = st.columns(2)
+    for index, campo in enumerate(secao.campos):
+        with cols[index % 2]:
+            campo.renderizar(campo, f"{prefixo}_{campo.nome}", dados)
+
+
+def desenhar_formulario(prefixo, dados=None, nivel_titulo="###", separador=True):
+    # prefixo separa as keys de cada uso do formulário (ex.: um por aluno em edição)
+    for secao in compilar_formulario():
+        _desenhar_secao(secao, prefixo, dados or {}, nivel_titulo)
+        if separador:
+            st.markdown("---")
+
+
+def coletar(prefixo):
+    # Lê as respostas do session_state no mesmo formato salvo em dados_cadastrais_json
+    respostas = {}
+    for secao in compilar_formulario():
+        for campo in secao.campos:
+            key = f"{prefixo}_{campo.nome}"
+            if key in st.session_state:
+                respostas[campo.nome] = st.session_state[key]
+            if campo.tipo == "radio_com_detalhe" and respostas.get(campo.nome) == "Sim":
+                respostas[f"{campo.nome}_detalhe"] = st.session_state.get(f"{key}_detalhe", "")
+    return respostas
+
+
+def validar(respostas):
+    return [rotulo for secao in compilar_formulario() for campo in secao.campos for rotulo in campo.pendencias(respostas)]
+
+
+def para_json(respostas):
+    # Datas viram texto para poderem ir para o JSON
+    seguras = {
+        nome: valor.strftime("%Y-%m-%d") if isinstance(valor, datetime.date) else valor
+        for nome, valor in respostas.items()
+    }
+    return json.dumps(seguras, ensure_ascii=False)
@@ -0,0 +1,229 @@
+import io
+import json
+import datetime
+import pandas as pd
+from sqlalchemy import insert, or_
+from database import (
+    Aluno, AlunoVulnerabilidade,
+    extrair_campos_promovidos, normalizar_busca, apenas_digitos,
+)
+
+# ==========================================
+# IMPORTAÇÃO EM LOTE DE ALUNOS (CSV / XLSX)
+# ==========================================
+# Todas as validações trabalham com colunas inteiras do DataFrame (sem laço por
+# aluno) e seguem as mesmas regras do formulário de config_campos.json.
+
+TAMANHO_LOTE = 500
+TAMANHO_LOTE_CONSULTA = 1000
+SEPARADOR_MULTISELECT = ";"
+DATA_MINIMA = pd.Timestamp(1990, 1, 1)
+
+SIM = {"sim", "s", "yes", "y", "1", "true", "verdadeiro", "x"}
+NAO = {"não", "nao", "n", "no", "0", "false", "falso", ""}
+
+
+def carregar_campos():
+    with open("config_campos.json", "r", encoding="utf-8") as f:
+        return json.load(f)["cadastro_aluno"]
+
+
+def listar_campos(config):
+    return [campo for campos in config.values() for campo in campos]
+
+
+def modelo_planilha(config):
+    # Cabeçalho vazio com as colunas esperadas (inclui os detalhes dos campos Sim/Não)
+    colunas = []
+    for campo in listar_campos(config):
+        colunas.append(campo["nome"])
+        if campo["tipo"] == "radio_com_detalhe":
+            colunas.append(f"{campo['nome']}_detalhe")
+    return pd.DataFrame(columns=colunas).to_csv(index=False).encode("utf-8-sig")
+
+
+def ler_arquivo(arquivo, nome_arquivo):
+    if nome_arquivo.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(arquivo, dtype=str)
+    else:
+        conteudo = arquivo.read() if hasattr(arquivo, "read") else arquivo
+        # sep=None deixa o pandas descobrir se o separador é vírgula ou ponto e vírgula
+        df = pd.read_csv(io.BytesIO(conteudo), dtype=str, sep=None, engine="python", encoding="utf-8-sig")
+    return df.dropna(how="all").reset_index(drop=True)
+
+
+def _padronizar_colunas(df, config):
+    # Aceita tanto o nome interno do campo quanto o rótulo do formulário no cabeçalho
+    por_rotulo = {}
+    for campo in listar_campos(config):
+        por_rotulo[campo["label"].strip().lower()] = campo["nome"]
+        por_rotulo[campo["nome"].lower()] = campo["nome"]
+    renomear = {col: por_rotulo.get(str(col).strip().lower(), str(col).strip()) for col in df.columns}
+    return df.rename(columns=renomear)
+
+
+def _texto(serie):
+    return serie.fillna("").astype(str).str.strip()
+
+
+def validar(df, config):
+    # Devolve (DataFrame com os valores já convertidos, DataFrame de erros por linha)
+    df = _padronizar_colunas(df, config)
+    dados = pd.DataFrame(index=df.index)
+    erros = []
+
+    def registrar(mascara, campo, mensagem):
+        for indice in mascara[mascara].index:
+            erros.append({"Linha": indice + 2, "Campo": campo, "Erro": mensagem})
+
+    for campo in listar_campos(config):
+        nome, tipo, rotulo = campo["nome"], campo["tipo"], campo["label"]
+        texto = _texto(df[nome]) if nome in df.columns else pd.Series("", index=df.index)
+        vazio = texto == ""
+
+        if campo.get("obrigatorio"):
+            registrar(vazio, rotulo, "Campo obrigatório não preenchido")
+
+        if tipo == "date":
+            # AAAA-MM-DD (inclusive as células de data do Excel, lidas como "2015-03-04 00:00:00")
+            # nunca passa pelo dayfirst: o resto precisa estar em DD/MM/AAAA
+            iso = texto.str.match(r"^\d{4}-\d{2}-\d{2}")
+            datas = pd.to_datetime(texto.where(iso & ~vazio), errors="coerce", format="ISO8601")
+            datas = datas.fillna(pd.to_datetime(texto.where(~iso & ~vazio), errors="coerce", format="%d/%m/%Y"))
+            registrar(~vazio & datas.isna(), rotulo, "Data inválida (use DD/MM/AAAA ou AAAA-MM-DD)")
+            fora = datas.notna() & ((datas < DATA_MINIMA) | (datas > pd.Timestamp(datetime.date.today())))
+            registrar(fora, rotulo, "Data fora do intervalo permitido")
+            dados[nome] = datas.dt.date.where(datas.notna() & ~fora, None)
+
+        elif tipo == "number":
+            # "1.200,50" (formato brasileiro) e "1200.50" são aceitos
+            com_virgula = texto.str.contains(",", regex=False)
+            normalizado = texto.where(~com_virgula, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+            numeros = pd.to_numeric(normalizado.where(~vazio), errors="coerce")
+            registrar(~vazio & numeros.isna(), rotulo, "Número inválido")
+            registrar(numeros < 0, rotulo, "O valor não pode ser negativo")
+            dados[nome] = numeros.fillna(0.0).astype(float)
+
+        elif tipo == "selectbox":
+            opcoes = campo.get("opcoes", [])
+            registrar(~vazio & ~texto.isin(opcoes), rotulo, f"Opção inválida (válidas: {', '.join(opcoes)})")
+            dados[nome] = texto
+
+        elif tipo == "multiselect":
+            opcoes = set(campo.get("opcoes", []))
+            listas = texto.str.split(SEPARADOR_MULTISELECT).apply(lambda itens: [i.strip() for i in itens if i.strip()])
+            itens = listas.explode()
+            invalidos = itens.notna() & ~itens.isin(opcoes)
+            registrar(invalidos.groupby(level=0).any().reindex(df.index, fill_value=False), rotulo,
+                      f"Opção inválida (separe as opções com '{SEPARADOR_MULTISELECT}')")
+            dados[nome] = listas
+
+        elif tipo == "radio_com_detalhe":
+            minusculo = texto.str.lower()
+            eh_sim = minusculo.isin(SIM)
+            registrar(~eh_sim & ~minusculo.isin(NAO), rotulo, "Use Sim ou Não")
+            dados[nome] = eh_sim.map({True: "Sim", False: "Não"})
+            coluna_detalhe = f"{nome}_detalhe"
+            detalhe = _texto(df[coluna_detalhe]) if coluna_detalhe in df.columns else pd.Series("", index=df.index)
+            if campo.get("obrigatorio"):
+                registrar(eh_sim & (detalhe == ""), f"Detalhes de: {rotulo}", "Especifique quando a resposta for Sim")
+            dados[coluna_detalhe] = detalhe.where(eh_sim, None)
+
+        else:
+            dados[nome] = texto
+
+    # --- DUPLICIDADE DENTRO DO PRÓPRIO ARQUIVO ---
+    dados["nome_busca"] = dados["nome_completo"].map(normalizar_busca)
+    dados["cpf_digitos"] = dados["cpf"].map(apenas_digitos)
+    cpf_repetido = (dados["cpf_digitos"] != "") & dados.duplicated("cpf_digitos", keep="first")
+    registrar(cpf_repetido, "CPF", "CPF repetido no próprio arquivo")
+    pessoa_repetida = dados["data_nascimento"].notna() & dados.duplicated(["nome_busca", "data_nascimento"], keep="first")
+    registrar(pessoa_repetida, "Nome Completo", "Aluno (nome + nascimento) repetido no próprio arquivo")
+
+    return dados, pd.DataFrame(erros, columns=["Linha", "Campo", "Erro"])
+
+
+def marcar_existentes(db, dados):
+    # Uma consulta por lote de chaves (CPF ou nome normalizado) contra o banco
+    cpfs = sorted(set(dados["cpf_digitos"]) - {""})
+    nomes = sorted(set(dados["nome_busca"]) - {""})
+    existentes_cpf, existentes_pessoa = set(), set()
+    for inicio in range(0, max(len(cpfs), len(nomes)), TAMANHO_LOTE_CONSULTA):
+        lote_cpf = cpfs[inicio:inicio + TAMANHO_LOTE_CONSULTA]
+        lote_nome = nomes[inicio:inicio + TAMANHO_LOTE_CONSULTA]
+        condicoes = []
+        if lote_cpf:
+            condicoes.append(Aluno.cpf_digitos.in_(lote_cpf))
+        if lote_nome:
+            condicoes.append(Aluno.nome_busca.in_(lote_nome))
+        for cpf, nome, nascimento in db.query(Aluno.cpf_digitos, Aluno.nome_busca, Aluno.data_nascimento).filter(or_(*condicoes)):
+            if cpf:
+                existentes_cpf.add(cpf)
+            existentes_pessoa.add((nome, nascimento))
+
+    por_cpf = dados["cpf_digitos"].isin(existentes_cpf) & (dados["cpf_digitos"] != "")
+    por_pessoa = pd.Series(
+        [(n, d) in existentes_pessoa for n, d in zip(dados["nome_busca"], dados["data_nascimento"])],
+        index=dados.index, dtype=bool,
+    )
+    duplicado = por_cpf | por_pessoa
+    erros = pd.DataFrame({
+        "Linha": duplicado[duplicado].index + 2,
+        "Campo": "Aluno",
+        "Erro": "Já cadastrado no sistema (CPF ou Nome + Data de Nascimento)",
+    })
+    return duplicado, erros
+
+
+def _registro_json(linha, colunas_json):
+    registro = {}
+    for coluna in colunas_json:
+        valor = linha[coluna]
+        if coluna.endswith("_detalhe") and not isinstance(valor, str):
+            # Detalhe só é gravado quando a resposta é Sim, como no formulário
+            continue
+        if isinstance(valor, datetime.date):
+            valor = valor.strftime("%Y-%m-%d")
+        registro[coluna] = valor
+    return registro
+
+
+def importar(db, dados):
+    # Insere os alunos válidos em lotes (um INSERT multi-linhas por lote) numa única transação
+    colunas_json = [c for c in dados.columns if c not in ("nome_busca", "cpf_digitos")]
+    total = 0
+    try:
+        for inicio in range(0, len(dados), TAMANHO_LOTE):
+            lote = dados.iloc[inicio:inicio + TAMANHO_LOTE]
+            linhas_alunos, listas_vulnerabilidades = [], []
+            for linha in lote.to_dict("records"):
+                registro = _registro_json(linha, colunas_json)
+                linhas_alunos.append({
+                    "nome_completo": linha["nome_completo"],
+                    "data_nascimento": linha["data_nascimento"],
+                    "rg": linha.get("rg", ""),
+                    "cpf": linha.get("cpf", ""),
+                    "status_ativo": True,
+                    "dados_cadastrais_json": json.dumps(registro, ensure_ascii=False),
+                    "nome_busca": linha["nome_busca"],
+                    "cpf_digitos": linha["cpf_digitos"] or None,
+                    **extrair_campos_promovidos(registro),
+                })
+                listas_vulnerabilidades.append(sorted(set(registro.get("vulnerabilidades") or [])))
+
+            ids = db.execute(
+                insert(Aluno).returning(Aluno.id, sort_by_parameter_order=True), linhas_alunos
+            ).scalars().all()
+            vulnerabilidades = [
+                {"aluno_id": aluno_id, "vulnerabilidade": v}
+                for aluno_id, lista in zip(ids, listas_vulnerabilidades)
+                for v in lista
+            ]
+            if vulnerabilidades:
+                db.execute(insert(AlunoVulnerabilidade), vulnerabilidades)
+            total += len(ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return total
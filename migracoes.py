@@ -0,0 +1,270 @@
+# Migrações versionadas do banco de dados.
+#
+# Cada migração roda uma única vez, dentro da sua própria transação, e fica
+# registrada na tabela schema_versao. Para aplicar as pendentes no deploy:
+#
+#     python migracoes.py
+#
+# As migrações usam verificações "se não existir" porque a primeira delas cria
+# as tabelas a partir dos modelos atuais: num banco novo, as seguintes apenas
+# confirmam o que já foi criado.
+import datetime
+import json
+import re
+from sqlalchemy import inspect, text, Table, Column, Integer, String, DateTime, MetaData
+from sqlalchemy.schema import CreateTable
+from database import (
+    engine, Base, Aluno, AlunoVulnerabilidade, Turma, Matricula, VersaoDados, EstatisticaAno,
+    CAMPOS_PROMOVIDOS, extrair_campos_promovidos, normalizar_busca, apenas_digitos,
+)
+
+TAMANHO_LOTE = 500
+
+# Chave arbitrária usada no pg_advisory_lock para que dois processos não migrem ao mesmo tempo
+CHAVE_TRAVA_POSTGRES = 720_240_001
+
+schema_versao = Table(
+    "schema_versao", MetaData(),
+    Column("versao", Integer, primary_key=True),
+    Column("descricao", String, nullable=False),
+    Column("aplicada_em", DateTime, nullable=False),
+)
+
+
+# --- AUXILIARES ---
+
+def _adicionar_coluna(conn, tabela, coluna, tipo_sql):
+    existentes = {c["name"] for c in inspect(conn).get_columns(tabela)}
+    if coluna not in existentes:
+        conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo_sql}"))
+
+
+def _criar_indices(conn, modelo, nomes):
+    # Cada migração cita os índices pelo nome: os modelos continuam evoluindo e um
+    # índice novo não pode ser criado antes da migração que adiciona a sua coluna
+    for indice in modelo.__table__.indexes:
+        if indice.name in nomes:
+            indice.create(bind=conn, checkfirst=True)
+
+
+# --- MIGRAÇÕES ---
+
+def _m001_esquema_inicial(conn):
+    Base.metadata.create_all(conn)
+
+
+def _m002_campos_promovidos(conn):
+    for campo in CAMPOS_PROMOVIDOS:
+        _adicionar_coluna(conn, "alunos", campo, "VARCHAR")
+    Base.metadata.tables["alunos_vulnerabilidades"].create(bind=conn, checkfirst=True)
+    _criar_indices(conn, Aluno, {"ix_alunos_bairro", "ix_alunos_medicacao_continua"})
+
+    # Preenche os alunos já cadastrados, em lotes ordenados por id (SQL puro, pois
+    # os modelos já podem ter colunas de migrações posteriores)
+    atualizar = text(
+        "UPDATE alunos SET " + ", ".join(f"{c} = :{c}" for c in CAMPOS_PROMOVIDOS) + " WHERE id = :id"
+    )
+    inserir_vulnerabilidade = text(
+        "INSERT INTO alunos_vulnerabilidades (aluno_id, vulnerabilidade) VALUES (:aluno_id, :vulnerabilidade)"
+    )
+    conn.execute(text("DELETE FROM alunos_vulnerabilidades"))
+    ultimo_id = 0
+    while True:
+        lote = conn.execute(
+            text("SELECT id, dados_cadastrais_json FROM alunos WHERE id > :ultimo ORDER BY id LIMIT :limite"),
+            {"ultimo": ultimo_id, "limite": TAMANHO_LOTE},
+        ).all()
+        if not lote:
+            break
+        atualizacoes, vulnerabilidades = [], []
+        for a_id, dados_json in lote:
+            dados = json.loads(dados_json)
+            atualizacoes.append({"id": a_id, **extrair_campos_promovidos(dados)})
+            vulnerabilidades.extend(
+                {"aluno_id": a_id, "vulnerabilidade": v} for v in sorted(set(dados.get("vulnerabilidades") or []))
+            )
+        conn.execute(atualizar, atualizacoes)
+        if vulnerabilidades:
+            conn.execute(inserir_vulnerabilidade, vulnerabilidades)
+        ultimo_id = lote[-1][0]
+
+
+def _m003_indices_e_unicidade(conn):
+    # Remove matrículas repetidas (mesmo aluno na mesma turma) antes de criar o índice único
+    conn.execute(text(
+        "DELETE FROM matriculas WHERE id NOT IN "
+        "(SELECT MIN(id) FROM matriculas GROUP BY aluno_id, turma_id)"
+    ))
+    _criar_indices(conn, Aluno, {"ix_alunos_cpf", "ix_alunos_nome_nascimento"})
+    _criar_indices(conn, Turma, {"ix_turmas_projeto_ano"})
+    _criar_indices(conn, Matricula, {"ix_matriculas_turma_id", "uq_matriculas_aluno_turma"})
+
+
+def _m004_busca_de_alunos(conn):
+    _adicionar_coluna(conn, "alunos", "nome_busca", "VARCHAR")
+    _adicionar_coluna(conn, "alunos", "cpf_digitos", "VARCHAR")
+
+    # Preenche as chaves de busca em lotes (a normalização de acentos é feita em Python
+    # para não depender da extensão unaccent)
+    atualizar = text("UPDATE alunos SET nome_busca = :nome_busca, cpf_digitos = :cpf_digitos WHERE id = :id")
+    ultimo_id = 0
+    while True:
+        lote = conn.execute(
+            text("SELECT id, nome_completo, cpf FROM alunos WHERE id > :ultimo ORDER BY id LIMIT :limite"),
+            {"ultimo": ultimo_id, "limite": TAMANHO_LOTE},
+        ).all()
+        if not lote:
+            break
+        conn.execute(atualizar, [
+            {"id": a_id, "nome_busca": normalizar_busca(nome), "cpf_digitos": apenas_digitos(cpf) or None}
+            for a_id, nome, cpf in lote
+        ])
+        ultimo_id = lote[-1][0]
+
+    _criar_indices(conn, Aluno, {"ix_alunos_nome_busca", "ix_alunos_cpf_digitos"})
+    if conn.dialect.name == "postgresql":
+        # Trigramas atendem à busca por qualquer palavra do nome (LIKE '%termo%')
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_alunos_nome_busca_trgm ON alunos USING gin (nome_busca gin_trgm_ops)"
+        ))
+
+
+def _registrar_versoes(conn, tabelas):
+    existentes = {linha[0] for linha in conn.execute(text("SELECT tabela FROM versoes_dados"))}
+    for tabela in tabelas:
+        if tabela not in existentes:
+            conn.execute(text("INSERT INTO versoes_dados (tabela, versao) VALUES (:tabela, 0)"), {"tabela": tabela})
+
+
+def _m005_versoes_dos_dados(conn):
+    VersaoDados.__table__.create(bind=conn, checkfirst=True)
+    _registrar_versoes(conn, ("alunos", "projetos", "turmas", "matriculas"))
+
+
+def _m006_estatisticas_por_ano(conn):
+    EstatisticaAno.__table__.create(bind=conn, checkfirst=True)
+    _registrar_versoes(conn, ("estatisticas_ano",))
+
+
+def _m007_indices_navegacao(conn):
+    # O ix_alunos_nome_busca do PostgreSQL usa varchar_pattern_ops, que serve ao LIKE mas não ao ORDER BY
+    _criar_indices(conn, Aluno, {"ix_alunos_ordem_nome", "ix_alunos_ordem_nascimento"})
+    _criar_indices(conn, Matricula, {"ix_matriculas_ordem_data"})
+
+
+# (tabela, coluna, tabela referida): FKs que passam a ter ON DELETE CASCADE
+CASCATAS = (
+    ("turmas", "projeto_id", "projetos"),
+    ("matriculas", "aluno_id", "alunos"),
+    ("matriculas", "turma_id", "turmas"),
+    ("alunos_vulnerabilidades", "aluno_id", "alunos"),
+)
+
+
+def _recriar_tabela_sqlite(conn, modelo):
+    # O SQLite não altera chaves estrangeiras: cria a tabela nova pelo modelo, copia as
+    # linhas, apaga a antiga e renomeia (roda com as FKs desligadas, ver aplicar_migracoes)
+    tabela = modelo.__table__
+    nova = f"{tabela.name}_nova"
+    criar = str(CreateTable(tabela).compile(dialect=conn.dialect))
+    conn.execute(text(re.sub(rf"^\s*CREATE TABLE {tabela.name} ", f"CREATE TABLE {nova} ", criar, count=1)))
+    existentes = {c["name"] for c in inspect(conn).get_columns(tabela.name)}
+    colunas = ", ".join(c.name for c in tabela.columns if c.name in existentes)
+    conn.execute(text(f"INSERT INTO {nova} ({colunas}) SELECT {colunas} FROM {tabela.name}"))
+    conn.execute(text(f"DROP TABLE {tabela.name}"))
+    conn.execute(text(f"ALTER TABLE {nova} RENAME TO {tabela.name}"))
+    for indice in tabela.indexes:
+        indice.create(bind=conn, checkfirst=True)
+
+
+def _m008_exclusao_em_cascata(conn):
+    # Linhas órfãs de exclusões antigas (sem FK aplicada no SQLite) impediriam as novas chaves
+    conn.execute(text("DELETE FROM turmas WHERE projeto_id NOT IN (SELECT id FROM projetos)"))
+    conn.execute(text("DELETE FROM matriculas WHERE aluno_id NOT IN (SELECT id FROM alunos) OR turma_id NOT IN (SELECT id FROM turmas)"))
+    conn.execute(text("DELETE FROM alunos_vulnerabilidades WHERE aluno_id NOT IN (SELECT id FROM alunos)"))
+    conn.execute(text("UPDATE versoes_dados SET versao = versao + 1 WHERE tabela IN ('alunos', 'turmas', 'matriculas')"))
+
+    # Só mexe nas FKs que ainda não têm a cascata (num banco novo, a migração 001 já as criou assim)
+    pendentes = []
+    for tabela, coluna, referida in CASCATAS:
+        for fk in inspect(conn).get_foreign_keys(tabela):
+            if fk["constrained_columns"] == [coluna] and (fk.get("options") or {}).get("ondelete", "").upper() != "CASCADE":
+                pendentes.append((tabela, coluna, referida, fk["name"]))
+
+    if conn.dialect.name == "sqlite":
+        modelos = {"turmas": Turma, "matriculas": Matricula, "alunos_vulnerabilidades": AlunoVulnerabilidade}
+        for tabela in dict.fromkeys(t for t, _, _, _ in pendentes):
+            _recriar_tabela_sqlite(conn, modelos[tabela])
+        return
+
+    for tabela, coluna, referida, nome in pendentes:
+        conn.execute(text(f'ALTER TABLE {tabela} DROP CONSTRAINT "{nome}"'))
+        conn.execute(text(
+            f"ALTER TABLE {tabela} ADD CONSTRAINT {tabela}_{coluna}_fkey "
+            f"FOREIGN KEY ({coluna}) REFERENCES {referida} (id) ON DELETE CASCADE"
+        ))
+
+
+MIGRACOES = [
+    (1, "Esquema inicial", _m001_esquema_inicial),
+    (2, "Campos promovidos do cadastro", _m002_campos_promovidos),
+    (3, "Índices de busca e matrícula única por turma", _m003_indices_e_unicidade),
+    (4, "Busca de alunos sem acentos por nome e CPF", _m004_busca_de_alunos),
+    (5, "Versões dos dados para o cache de consultas", _m005_versoes_dos_dados),
+    (6, "Estatísticas congeladas dos anos letivos fechados", _m006_estatisticas_por_ano),
+    (7, "Índices da navegação paginada de alunos e matrículas", _m007_indices_navegacao),
+    (8, "Exclusão em cascata nas chaves estrangeiras", _m008_exclusao_em_cascata),
+]
+
+
+# --- EXECUÇÃO ---
+
+def versao_atual(conn):
+    schema_versao.create(bind=conn, checkfirst=True)
+    return conn.execute(text("SELECT COALESCE(MAX(versao), 0) FROM schema_versao")).scalar()
+
+
+def aplicar_migracoes(bind=None):
+    bind = bind or engine
+    aplicadas = []
+    with bind.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": CHAVE_TRAVA_POSTGRES})
+            conn.commit()
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite:
+            # Recriar tabelas exige as FKs desligadas (o PRAGMA não tem efeito dentro de uma transação);
+            # elas são conferidas com foreign_key_check antes de cada commit
+            conn.execute(text("PRAGMA foreign_keys = OFF"))
+            conn.commit()
+        try:
+            with conn.begin():
+                versao = versao_atual(conn)
+            for numero, descricao, migracao in MIGRACOES:
+                if numero <= versao:
+                    continue
+                with conn.begin():
+                    migracao(conn)
+                    if sqlite and conn.execute(text("PRAGMA foreign_key_check")).first() is not None:
+                        raise RuntimeError(f"Migração {numero:03d} deixou linhas violando chaves estrangeiras.")
+                    conn.execute(schema_versao.insert().values(
+                        versao=numero, descricao=descricao, aplicada_em=datetime.datetime.now()
+                    ))
+                aplicadas.append((numero, descricao))
+        finally:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_TRAVA_POSTGRES})
+                conn.commit()
+            if sqlite:
+                conn.execute(text("PRAGMA foreign_keys = ON"))
+                conn.commit()
+    return aplicadas
+
+
+if __name__ == "__main__":
+    aplicadas = aplicar_migracoes()
+    if not aplicadas:
+        print("Banco de dados já está na versão mais recente.")
+    for numero, descricao in aplicadas:
+        print(f"Migração {numero:03d} aplicada: {descricao}")
@@ -1,6 +1,7 @@
 import streamlit as st
 import datetime
-from database import SessionLocal, Projeto, Turma
+import consultas
+from database import SessionLocal, iniciar_medicao
 
 st.set_page_config(page_title="Gestão de Projetos e Turmas", page_icon="⚽", layout="wide")
 
@@ -10,6 +11,8 @@ if "autenticado" not in st.session_state or not st.session_state.autenticado:
     st.stop() # Interrompe a leitura do código aqui e bloqueia a tela
 # --------------------------
 
+iniciar_medicao(__file__)
+
 st.title("Gestão de Projetos e Turmas")
 st.write("Cadastre novos projetos no catálogo ou abra novas turmas para projetos já existentes (Ciclo Anual).")
 
@@ -33,15 +36,12 @@ try:
             if not nome_projeto.strip() or not local.strip():
                 st.error("⚠️ Preencha o nome e o local do projeto.")
             else:
-                projeto_existente = db.query(Projeto).filter(Projeto.nome == nome_projeto.strip()).first()
-                if projeto_existente:
-                    st.warning(f"❌ O projeto '{nome_projeto}' já existe no catálogo.")
-                else:
-                    novo_projeto = Projeto(nome=nome_projeto.strip(), descricao=descricao.strip(), local=local.strip())
-                    db.add(novo_projeto)
-                    db.commit()
+                try:
+                    consultas.cadastrar_projeto(db, nome_projeto.strip(), descricao.strip(), local.strip())
                     st.toast('Ação concluída com sucesso!', icon='✅')
                     st.success(f"✅ Projeto '{nome_projeto}' cadastrado com sucesso! Agora vá na aba ao lado para abrir as turmas.")
+                except consultas.CadastroRecusado as e:
+                    st.warning(f"❌ {e}")
 
     # ==========================================
     # ABA 2: ABRIR TURMAS E PROFESSORES
@@ -49,11 +49,10 @@ try:
     with aba_turma:
         st.header("Abrir Turmas e Definir Professores")
         
-        projetos = db.query(Projeto).all()
-        if not projetos:
+        opcoes_projetos = consultas.opcoes_projetos(db)
+        if not opcoes_projetos:
             st.warning("Nenhum projeto cadastrado. Crie um projeto na aba ao lado primeiro.")
         else:
-            opcoes_projetos = {p.id: p.nome for p in projetos}
             projeto_selecionado_id = st.selectbox("Selecione o Projeto:", options=list(opcoes_projetos.keys()), format_func=lambda x: opcoes_projetos[x])
             
             st.markdown("---")
@@ -110,24 +109,21 @@ try:
                     st.error(f"⚠️ Preencha o Horário e o Nome do Professor para as turmas: {', '.join(erros)}")
                 else:
                     try:
-                        for t in turmas_dados:
-                            nova_turma = Turma(
-                                projeto_id=projeto_selecionado_id,
-                                nome_turma=t["nome_turma"].strip(),
-                                horario=t["horario"].strip(),
-                                vagas_totais=t["vagas_totais"],
-                                ano_letivo=t["ano_letivo"],
-                                nome_professor=t["nome_professor"].strip(),
-                                cpf_professor=t["cpf_professor"].strip(),
-                                remuneracao_professor=t["remuneracao_professor"]
-                            )
-                            db.add(nova_turma)
-                        
-                        db.commit()
+                        consultas.abrir_turmas(db, projeto_selecionado_id, [
+                            {
+                                "nome_turma": t["nome_turma"].strip(),
+                                "horario": t["horario"].strip(),
+                                "vagas_totais": t["vagas_totais"],
+                                "ano_letivo": t["ano_letivo"],
+                                "nome_professor": t["nome_professor"].strip(),
+                                "cpf_professor": t["cpf_professor"].strip(),
+                                "remuneracao_professor": t["remuneracao_professor"],
+                            }
+                            for t in turmas_dados
+                        ])
                         st.toast('Ação concluída com sucesso!', icon='✅')
                         st.success(f"✅ {num_turmas} turma(s) abertas com sucesso para o projeto!")
                     except Exception as e:
-                        db.rollback()
                         st.error(f"Erro ao salvar: {e}")
 finally:
     db.close()
\ No newline at end of file
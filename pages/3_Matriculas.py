@@ -1,6 +1,8 @@
 import streamlit as st
 from datetime import date
-from database import SessionLocal, Aluno, Projeto, Turma, Matricula
+import consultas
+from database import SessionLocal, iniciar_medicao
+from busca_alunos import seletor_aluno
 
 st.set_page_config(page_title="Matrículas", page_icon="📝")
 
@@ -10,43 +12,45 @@ if "autenticado" not in st.session_state or not st.session_state.autenticado:
     st.stop() # Interrompe a leitura do código aqui e bloqueia a tela
 # --------------------------
 
+iniciar_medicao(__file__)
+
 st.title("Matrícula de Alunos")
 
 db = SessionLocal()
 
 try:
     # Filtra apenas alunos com status_ativo == True
-    alunos_ativos = db.query(Aluno).filter(Aluno.status_ativo == True).all()
-    projetos = db.query(Projeto).all()
+    existe_aluno_ativo = consultas.contar_alunos(db, apenas_ativos=True) > 0
+    opcoes_projetos = consultas.opcoes_projetos(db)
 
-    if not alunos_ativos:
+    if not existe_aluno_ativo:
         st.warning("⚠️ Nenhum aluno ATIVO cadastrado no sistema.")
         st.stop()
-    if not projetos:
+    if not opcoes_projetos:
         st.warning("⚠️ Nenhum projeto cadastrado no sistema.")
         st.stop()
 
     st.header("1. Selecione o Aluno (Somente Ativos)")
-    opcoes_alunos = {aluno.id: f"{aluno.nome_completo} (CPF: {aluno.cpf if aluno.cpf else 'N/A'})" for aluno in alunos_ativos}
-    aluno_id_selecionado = st.selectbox("Buscar Aluno:", options=list(opcoes_alunos.keys()), format_func=lambda x: opcoes_alunos[x])
+    aluno_id_selecionado = seletor_aluno(db, "matricula_aluno", apenas_ativos=True)
+    if aluno_id_selecionado is None:
+        st.stop()
 
     st.header("2. Selecione o Projeto e a Turma")
-    opcoes_projetos = {projeto.id: projeto.nome for projeto in projetos}
     projeto_id_selecionado = st.selectbox("Selecione o Projeto:", options=list(opcoes_projetos.keys()), format_func=lambda x: opcoes_projetos[x])
 
     # Filtro visual de ano letivo
     ano_filtro = st.number_input("Filtrar turmas pelo Ano Letivo:", min_value=2024, max_value=2100, value=date.today().year)
-    turmas_do_projeto = db.query(Turma).filter(Turma.projeto_id == projeto_id_selecionado, Turma.ano_letivo == ano_filtro).all()
+    turmas_do_projeto = {t["id"]: t for t in consultas.turmas_do_projeto(db, projeto_id_selecionado, ano_letivo=ano_filtro)}
 
     if not turmas_do_projeto:
         st.error(f"Este projeto não possui turmas cadastradas para o ano de {ano_filtro}.")
     else:
-        opcoes_turmas = {turma.id: f"{turma.nome_turma} - {turma.horario} ({turma.ano_letivo})" for turma in turmas_do_projeto}
+        opcoes_turmas = {t_id: f"{t['nome_turma']} - {t['horario']} ({t['ano_letivo']})" for t_id, t in turmas_do_projeto.items()}
         turma_id_selecionada = st.selectbox("Selecione a Turma:", options=list(opcoes_turmas.keys()), format_func=lambda x: opcoes_turmas[x])
 
-        turma_escolhida = db.query(Turma).filter(Turma.id == turma_id_selecionada).first()
-        quantidade_matriculados = db.query(Matricula).filter(Matricula.turma_id == turma_id_selecionada).count()
-        vagas_disponiveis = turma_escolhida.vagas_totais - quantidade_matriculados
+        turma_escolhida = turmas_do_projeto[turma_id_selecionada]
+        quantidade_matriculados = consultas.matriculados_por_turma(db, [turma_id_selecionada]).get(turma_id_selecionada, 0)
+        vagas_disponiveis = turma_escolhida["vagas_totais"] - quantidade_matriculados
 
         st.markdown("### Situação da Turma")
         if vagas_disponiveis > 0:
@@ -55,22 +59,14 @@ try:
             st.error(f"❌ **Turma Lotada**")
 
         if st.button("Confirmar Matrícula", type="primary"):
-            ids_turmas_projeto = [t.id for t in turmas_do_projeto]
-            ja_matriculado_no_projeto = db.query(Matricula).filter(Matricula.aluno_id == aluno_id_selecionado, Matricula.turma_id.in_(ids_turmas_projeto)).first()
-
-            if ja_matriculado_no_projeto:
-                st.warning(f"⚠️ O aluno já está matriculado neste projeto para o ano de {ano_filtro}!")
-            elif vagas_disponiveis <= 0:
-                st.error("❌ A turma está lotada.")
-            else:
-                try:
-                    nova_matricula = Matricula(aluno_id=aluno_id_selecionado, turma_id=turma_id_selecionada, data_matricula=date.today())
-                    db.add(nova_matricula)
-                    db.commit()
-                    st.success("🎉 Matrícula realizada com sucesso!")
-                    st.balloons()
-                except Exception as e:
-                    db.rollback()
-                    st.error(f"Erro ao salvar: {e}")
+            # Vagas e duplicidade são verificadas de novo, com a turma travada, no momento de gravar
+            try:
+                consultas.matricular(db, aluno_id_selecionado, turma_id_selecionada)
+                st.success("🎉 Matrícula realizada com sucesso!")
+                st.balloons()
+            except consultas.MatriculaRecusada as e:
+                st.warning(f"⚠️ {e}")
+            except Exception as e:
+                st.error(f"Erro ao salvar: {e}")
 finally:
     db.close()
\ No newline at end of file
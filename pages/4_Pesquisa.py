@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
 import json
-from database import SessionLocal, Aluno, Projeto, Turma, Matricula
+import datetime
+import consultas
+from busca_alunos import seletor_aluno
+from tabela_paginada import tabela_paginada
+from database import SessionLocal, iniciar_medicao
 
 st.set_page_config(page_title="Pesquisa e Relatórios", page_icon="🔍", layout="wide")
 
@@ -11,34 +15,86 @@ if "autenticado" not in st.session_state or not st.session_state.autenticado:
     st.stop() # Interrompe a leitura do código aqui e bloqueia a tela
 # --------------------------
 
+iniciar_medicao(__file__)
+
 st.title("🔍 Pesquisa e Painel Geral")
 st.write("Consulte os dados cadastrais, verifique as matrículas e acompanhe a lotação dos projetos.")
 
+# ==========================================
+# LISTAS PAGINADAS (ABAS 3 E 4)
+# ==========================================
+# Trocar de página ou de filtro reexecuta só a lista, com a sua própria sessão do banco
+@st.fragment
+def navegar_alunos():
+    iniciar_medicao(__file__, "Lista de Alunos")
+    col_ord, col_sentido, col_ano, col_ativos = st.columns([2, 1, 1, 1])
+    ordenar_por = col_ord.selectbox("Ordenar por:", options=list(consultas.ORDENACOES_ALUNOS.keys()), format_func=lambda o: consultas.ORDENACOES_ALUNOS[o], key="lista_alunos_ordem")
+    decrescente = col_sentido.toggle("Decrescente", key="lista_alunos_desc")
+    ano_letivo = col_ano.number_input("Matrículas no Ano:", min_value=2024, max_value=2100, value=datetime.date.today().year, key="lista_alunos_ano")
+    apenas_ativos = col_ativos.checkbox("Somente ativos", key="lista_alunos_ativos")
+
+    db = SessionLocal()
+    try:
+        tabela_paginada(
+            "lista_alunos",
+            lambda **cursor: consultas.pagina_alunos(db, ordenar_por, decrescente, apenas_ativos=apenas_ativos, ano_letivo=ano_letivo, **cursor),
+            consultas.contar_alunos(db, apenas_ativos=apenas_ativos),
+            filtros=(ordenar_por, decrescente, apenas_ativos, ano_letivo),
+        )
+    finally:
+        db.close()
+
+
+@st.fragment
+def navegar_matriculas():
+    iniciar_medicao(__file__, "Lista de Matrículas")
+    db = SessionLocal()
+    try:
+        col_ano, col_proj, col_turma = st.columns(3)
+        ano_letivo = col_ano.selectbox("Ano Letivo:", options=[None] + consultas.anos_letivos(db), format_func=lambda a: "Todos" if a is None else str(a), key="lista_mat_ano")
+        opcoes_proj = consultas.opcoes_projetos(db)
+        projeto_id = col_proj.selectbox("Projeto:", options=[None] + list(opcoes_proj.keys()), format_func=lambda p: "Todos" if p is None else opcoes_proj[p], key="lista_mat_projeto")
+        opcoes_turma = consultas.opcoes_turmas(db, projeto_id, ano_letivo) if projeto_id is not None else {}
+        turma_id = col_turma.selectbox("Turma:", options=[None] + list(opcoes_turma.keys()), format_func=lambda t: "Todas" if t is None else opcoes_turma[t], key="lista_mat_turma", disabled=projeto_id is None)
+        if turma_id not in opcoes_turma:
+            turma_id = None
+
+        col_ord, col_sentido = st.columns([2, 3])
+        ordenar_por = col_ord.selectbox("Ordenar por:", options=list(consultas.ORDENACOES_MATRICULAS.keys()), format_func=lambda o: consultas.ORDENACOES_MATRICULAS[o], key="lista_mat_ordem")
+        decrescente = col_sentido.toggle("Mais recentes primeiro", value=True, key="lista_mat_desc")
+
+        tabela_paginada(
+            "lista_matriculas",
+            lambda **cursor: consultas.pagina_matriculas(db, ordenar_por, decrescente, ano_letivo=ano_letivo, projeto_id=projeto_id, turma_id=turma_id, **cursor),
+            consultas.contar_matriculas(db, ano_letivo, projeto_id, turma_id),
+            filtros=(ordenar_por, decrescente, ano_letivo, projeto_id, turma_id),
+        )
+    finally:
+        db.close()
+
+
 db = SessionLocal()
 
 try:
-    aba_alunos, aba_projetos = st.tabs(["🎓 Pesquisa de Alunos", "⚽ Pesquisa de Projetos e Vagas"])
+    aba_alunos, aba_projetos, aba_lista_alunos, aba_lista_matriculas = st.tabs(
+        ["🎓 Pesquisa de Alunos", "⚽ Pesquisa de Projetos e Vagas", "📋 Lista de Alunos", "🗂️ Lista de Matrículas"]
+    )
 
     # ==========================================
     # ABA 1: PESQUISA DE ALUNOS
     # ==========================================
     with aba_alunos:
         st.header("Buscar Aluno")
-        alunos = db.query(Aluno).all()
+        existe_aluno = consultas.contar_alunos(db) > 0
         
-        if not alunos:
+        if not existe_aluno:
             st.info("Nenhum aluno cadastrado na base de dados.")
         else:
-            # Mostra o status visualmente no selectbox
-            opcoes_alunos = {a.id: f"{'🟢' if a.status_ativo else '🔴'} {a.nome_completo} (CPF: {a.cpf if a.cpf else 'N/A'})" for a in alunos}
-            aluno_id_selecionado = st.selectbox(
-                "Digite ou selecione o nome do aluno:", 
-                options=list(opcoes_alunos.keys()), 
-                format_func=lambda x: opcoes_alunos[x]
-            )
+            # Mostra o status visualmente no seletor
+            aluno_id_selecionado = seletor_aluno(db, "pesquisa_aluno", rotulo="Digite o nome ou o CPF do aluno:", mostrar_status=True)
 
             if aluno_id_selecionado:
-                aluno = db.query(Aluno).filter(Aluno.id == aluno_id_selecionado).first()
+                aluno = consultas.ficha_aluno(db, aluno_id_selecionado)
                 
                 st.markdown("---")
                 st.subheader(f"Perfil: {aluno.nome_completo}")
@@ -72,27 +128,11 @@ try:
                             st.write(f"**{chave_limpa}:** {valor_limpo}")
 
                 st.markdown("### 📚 Matrículas (Histórico)")
-                matriculas_aluno = db.query(Matricula).filter(Matricula.aluno_id == aluno.id).all()
+                lista_matriculas = consultas.historico_matriculas(db, aluno.id)
                 
-                if matriculas_aluno:
-                    lista_matriculas = []
-                    for m in matriculas_aluno:
-                        turma = db.query(Turma).filter(Turma.id == m.turma_id).first()
-                        projeto = db.query(Projeto).filter(Projeto.id == turma.projeto_id).first()
-                        
-                        lista_matriculas.append({
-                            "Ano Letivo": turma.ano_letivo,
-                            "Projeto": projeto.nome,
-                            "Turma": turma.nome_turma,
-                            "Professor": turma.nome_professor,
-                            "Horário": turma.horario,
-                            "Local": projeto.local,
-                            "Data da Matrícula": m.data_matricula.strftime('%d/%m/%Y')
-                        })
-                    
+                if lista_matriculas:
+                    # A consulta já vem ordenada do ano mais recente para o mais antigo
                     df_mat = pd.DataFrame(lista_matriculas)
-                    # Ordenando do ano mais recente para o mais antigo
-                    df_mat = df_mat.sort_values(by="Ano Letivo", ascending=False)
                     st.dataframe(df_mat, width='content', hide_index=True)
                 else:
                     st.warning("Este aluno não possui histórico de matrículas.")
@@ -102,12 +142,11 @@ try:
     # ==========================================
     with aba_projetos:
         st.header("Visão Geral dos Projetos")
-        projetos = db.query(Projeto).all()
+        opcoes_projetos = consultas.opcoes_projetos(db)
         
-        if not projetos:
+        if not opcoes_projetos:
             st.info("Nenhum projeto cadastrado na base de dados.")
         else:
-            opcoes_projetos = {p.id: p.nome for p in projetos}
             projeto_id_selec = st.selectbox(
                 "Selecione o Projeto para ver os detalhes:", 
                 options=list(opcoes_projetos.keys()), 
@@ -115,27 +154,28 @@ try:
             )
 
             if projeto_id_selec:
-                projeto = db.query(Projeto).filter(Projeto.id == projeto_id_selec).first()
+                projeto = consultas.dados_projeto(db, projeto_id_selec)
                 
                 st.markdown("---")
-                st.write(f"**📍 Local do Projeto:** {projeto.local}")
-                st.write(f"**📝 Descrição:** {projeto.descricao}")
+                st.write(f"**📍 Local do Projeto:** {projeto['local']}")
+                st.write(f"**📝 Descrição:** {projeto['descricao']}")
 
                 st.markdown("### 📊 Relatório de Turmas e Vagas")
-                turmas_proj = db.query(Turma).filter(Turma.projeto_id == projeto.id).all()
+                turmas_proj = consultas.turmas_do_projeto(db, projeto_id_selec)
                 
                 if turmas_proj:
+                    contagens = consultas.matriculados_por_turma(db, [t["id"] for t in turmas_proj])
                     lista_turmas = []
                     for t in turmas_proj:
-                        qtd_matriculados = db.query(Matricula).filter(Matricula.turma_id == t.id).count()
-                        vagas_livres = t.vagas_totais - qtd_matriculados
+                        qtd_matriculados = contagens.get(t["id"], 0)
+                        vagas_livres = t["vagas_totais"] - qtd_matriculados
                         
                         lista_turmas.append({
-                            "Ano Letivo": t.ano_letivo,
-                            "Turma": t.nome_turma,
-                            "Horário": t.horario,
-                            "Professor": t.nome_professor,
-                            "Vagas Totais": t.vagas_totais,
+                            "Ano Letivo": t["ano_letivo"],
+                            "Turma": t["nome_turma"],
+                            "Horário": t["horario"],
+                            "Professor": t["nome_professor"],
+                            "Vagas Totais": t["vagas_totais"],
                             "Matriculados": qtd_matriculados,
                             "Vagas Disponíveis": vagas_livres,
                             "Status": "🔴 Lotada" if vagas_livres <= 0 else "🟢 Vagas Abertas"
@@ -146,21 +186,13 @@ try:
                     st.dataframe(df_turmas, width='content', hide_index=True)
                     
                     st.markdown("#### 📋 Lista de Chamada")
-                    opcoes_chamada = {t.id: f"{t.nome_turma} ({t.ano_letivo})" for t in turmas_proj}
+                    opcoes_chamada = {t["id"]: f"{t['nome_turma']} ({t['ano_letivo']})" for t in turmas_proj}
                     turma_escolhida_id = st.selectbox("Selecione a turma para ver os alunos:", options=list(opcoes_chamada.keys()), format_func=lambda x: opcoes_chamada[x])
                     
                     if turma_escolhida_id:
-                        alunos_da_turma = db.query(Matricula).filter(Matricula.turma_id == turma_escolhida_id).all()
+                        lista_chamada = consultas.lista_chamada(db, turma_escolhida_id)
                         
-                        if alunos_da_turma:
-                            lista_chamada = []
-                            for m in alunos_da_turma:
-                                al = db.query(Aluno).filter(Aluno.id == m.aluno_id).first()
-                                lista_chamada.append({
-                                    "Nome do Aluno": al.nome_completo, 
-                                    "Status": "Ativo" if al.status_ativo else "Inativo",
-                                    "Telefone de Contato": json.loads(al.dados_cadastrais_json).get("contato_resp1", "N/A")
-                                })
+                        if lista_chamada:
                             st.table(pd.DataFrame(lista_chamada))
                         else:
                             st.info("Nenhum aluno matriculado nesta turma.")
@@ -168,5 +200,16 @@ try:
                 else:
                     st.warning("Este projeto ainda não possui turmas cadastradas.")
 
+    # ==========================================
+    # ABAS 3 E 4: LISTAS PAGINADAS
+    # ==========================================
+    with aba_lista_alunos:
+        st.header("Todos os Alunos")
+        navegar_alunos()
+
+    with aba_lista_matriculas:
+        st.header("Todas as Matrículas")
+        navegar_matriculas()
+
 finally:
     db.close()
\ No newline at end of file
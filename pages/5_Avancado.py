@@ -1,8 +1,16 @@
 import streamlit as st
+import os
 import json
 import datetime
-import bcrypt
-from database import SessionLocal, Aluno, Projeto, Turma, Matricula, Usuario
+import consultas
+import exportacao
+import cache_relatorios
+from busca_alunos import seletor_aluno
+from formulario import desenhar_formulario, coletar, validar, para_json
+import seguranca
+from cache_consultas import status_cache, limpar_cache
+import database
+from database import SessionLocal, status_pool, iniciar_medicao
 
 st.set_page_config(page_title="Avançado e Edição", page_icon="⚙️", layout="wide")
 
@@ -17,363 +25,698 @@ if "mensagem_sucesso" in st.session_state:
     st.success(st.session_state.mensagem_sucesso)
     del st.session_state.mensagem_sucesso
 
-db = SessionLocal()
-
-@st.cache_data
-def carregar_campos():
-    with open("config_campos.json", "r", encoding="utf-8") as f:
-        return json.load(f)["cadastro_aluno"]
-
-try:
-    # --- LÓGICA DE ABAS DINÂMICAS (Oculta a aba de usuários para quem não é Admin) ---
-    nomes_abas = ["🔄 Estado", "❌ Desmatricular", "✏️ Editar Aluno", "✏️ Editar Projetos", "🗑️ Eliminar Registos"]
-    
-    eh_admin = st.session_state.get("is_admin", False)
-    if eh_admin:
-        nomes_abas.append("👥 Gerir Utilizadores (Admin)")
-
-    abas = st.tabs(nomes_abas)
-    
-    aba_status, aba_desmatricular, aba_editar_aluno, aba_editar_proj, aba_excluir = abas[:5]
-
-    # ==========================================
-    # ABA 1: STATUS DO ALUNO (Ativo/Inativo)
-    # ==========================================
-    with aba_status:
-        st.header("Alterar Status do Aluno (Ciclo Anual)")
-        alunos_todos = db.query(Aluno).all()
-        if alunos_todos:
-            opcoes_status = {a.id: f"{'🟢' if a.status_ativo else '🔴'} {a.nome_completo}" for a in alunos_todos}
-            aluno_status_id = st.selectbox("Selecione o aluno:", options=list(opcoes_status.keys()), format_func=lambda x: opcoes_status[x], key="sel_status")
-            
-            aluno_selecionado = db.query(Aluno).filter(Aluno.id == aluno_status_id).first()
-            novo_status = st.radio("Definir como:", ["Ativo", "Inativo"], index=0 if aluno_selecionado.status_ativo else 1)
-            
-            # BOTÃO COM CONFIRMAÇÃO
-            with st.popover("🔄 Atualizar Status"):
-                st.write(f"Deseja realmente alterar o status deste aluno para **{novo_status}**?")
-                if st.button("Sim, Atualizar Status", key="conf_status", type="primary"):
-                    aluno_selecionado.status_ativo = (novo_status == "Ativo")
-                    db.commit()
-                    st.session_state.mensagem_sucesso = f"Status atualizado para {novo_status} com sucesso!"
+# Cada seção é uma função: só a escolhida no menu roda (e consulta o banco) a cada recarga.
+
+# ==========================================
+# SEÇÃO 1: STATUS DO ALUNO (Ativo/Inativo)
+# ==========================================
+def secao_status(db):
+    st.header("Alterar Status do Aluno (Ciclo Anual)")
+    aluno_status_id = seletor_aluno(db, "sel_status", mostrar_status=True)
+    if aluno_status_id:
+        aluno_selecionado = consultas.ficha_aluno(db, aluno_status_id)
+        novo_status = st.radio("Definir como:", ["Ativo", "Inativo"], index=0 if aluno_selecionado.status_ativo else 1)
+
+        # BOTÃO COM CONFIRMAÇÃO
+        with st.popover("🔄 Atualizar Status"):
+            st.write(f"Deseja realmente alterar o status deste aluno para **{novo_status}**?")
+            if st.button("Sim, Atualizar Status", key="conf_status", type="primary"):
+                consultas.alterar_status_aluno(db, aluno_status_id, novo_status == "Ativo")
+                st.session_state.mensagem_sucesso = f"Status atualizado para {novo_status} com sucesso!"
+                st.rerun()
+
+
+# ==========================================
+# SEÇÃO 2: DESMATRICULAR
+# ==========================================
+def secao_desmatricular(db):
+    st.header("Remover Aluno de uma Turma")
+    # --- FILTROS (Ano, Projeto e Turma) ---
+    col_f_ano, col_f_proj, col_f_turma = st.columns(3)
+    with col_f_ano:
+        anos_mat = consultas.anos_letivos(db)
+        opcoes_ano_mat = ["Todos"] + anos_mat
+        ano_corrente = datetime.date.today().year
+        ano_mat = st.selectbox("Ano Letivo:", options=opcoes_ano_mat, index=opcoes_ano_mat.index(ano_corrente) if ano_corrente in opcoes_ano_mat else 0, key="desmat_ano")
+        ano_mat = None if ano_mat == "Todos" else ano_mat
+    with col_f_proj:
+        opcoes_proj_mat = {0: "Todos"}
+        opcoes_proj_mat.update(consultas.opcoes_projetos(db))
+        proj_mat = st.selectbox("Projeto:", options=list(opcoes_proj_mat.keys()), format_func=lambda x: opcoes_proj_mat[x], key="desmat_proj")
+        proj_mat = None if proj_mat == 0 else proj_mat
+    with col_f_turma:
+        opcoes_turma_mat = {0: "Todas"}
+        if proj_mat is not None:
+            opcoes_turma_mat.update(consultas.opcoes_turmas(db, projeto_id=proj_mat, ano_letivo=ano_mat))
+        turma_mat = st.selectbox("Turma:", options=list(opcoes_turma_mat.keys()), format_func=lambda x: opcoes_turma_mat[x], key="desmat_turma", disabled=proj_mat is None)
+        turma_mat = None if turma_mat == 0 else turma_mat
+
+    opcoes_mat = consultas.opcoes_matriculas(db, ano_letivo=ano_mat, projeto_id=proj_mat, turma_id=turma_mat)
+    if not opcoes_mat:
+        st.info("Nenhuma matrícula encontrada para os filtros selecionados.")
+    else:
+        mat_selecionada = st.selectbox("Selecione a matrícula para cancelar:", options=list(opcoes_mat.keys()), format_func=lambda x: opcoes_mat[x])
+
+        # BOTÃO COM CONFIRMAÇÃO
+        with st.popover("❌ Cancelar Matrícula"):
+            st.warning("Tem certeza? O aluno perderá a vaga nesta turma.")
+            if st.button("Sim, Cancelar Matrícula", key="conf_desmatricular", type="primary"):
+                consultas.cancelar_matricula(db, mat_selecionada)
+                st.session_state.mensagem_sucesso = "Matrícula cancelada com sucesso! A vaga está livre novamente."
+                st.rerun()
+
+
+# ==========================================
+# SEÇÃO 3: EDITAR ALUNO (Dinâmico)
+# ==========================================
+def secao_editar_aluno(db):
+    st.header("Editar Dados Cadastrais do Aluno")
+    aluno_edit_id = seletor_aluno(db, "sel_edit_aluno", rotulo="Buscar o aluno para editar:")
+    if aluno_edit_id:
+        aluno_edit = consultas.ficha_aluno(db, aluno_edit_id)
+        prefixo = f"edit_aluno_{aluno_edit_id}"
+
+        st.markdown("---")
+        # Cada categoria atualiza sozinha: editar um campo não recarrega o resto da página
+        desenhar_formulario(prefixo, json.loads(aluno_edit.dados_cadastrais_json), nivel_titulo="####", separador=False)
+
+        st.markdown("---")
+        # BOTÃO COM CONFIRMAÇÃO
+        with st.popover("💾 Salvar Alterações do Aluno"):
+            st.write("Confirma a atualização dos dados cadastrais deste aluno?")
+            if st.button("Sim, Salvar Alterações", key="conf_salvar_aluno", type="primary"):
+                novas_respostas = coletar(prefixo)
+                erros = validar(novas_respostas)
+                if erros:
+                    st.error(f"⚠️ Preencha os campos obrigatórios: {', '.join(erros)}")
+                else:
+                    consultas.atualizar_aluno(
+                        db, aluno_edit_id,
+                        nome_completo=novas_respostas.get("nome_completo", aluno_edit.nome_completo),
+                        data_nascimento=novas_respostas.get("data_nascimento", aluno_edit.data_nascimento),
+                        rg=novas_respostas.get("rg", aluno_edit.rg),
+                        cpf=novas_respostas.get("cpf", aluno_edit.cpf),
+                        dados_cadastrais_json=para_json(novas_respostas),
+                    )
+                    st.session_state.mensagem_sucesso = "Dados do aluno atualizados com sucesso!"
                     st.rerun()
 
-    # ==========================================
-    # ABA 2: DESMATRICULAR
-    # ==========================================
-    with aba_desmatricular:
-        st.header("Remover Aluno de uma Turma")
-        matriculas = db.query(Matricula).all()
-        if matriculas:
-            opcoes_mat = {}
-            for m in matriculas:
-                aluno = db.query(Aluno).filter(Aluno.id == m.aluno_id).first()
-                turma = db.query(Turma).filter(Turma.id == m.turma_id).first()
-                projeto = db.query(Projeto).filter(Projeto.id == turma.projeto_id).first()
-                opcoes_mat[m.id] = f"{aluno.nome_completo} - {projeto.nome} ({turma.nome_turma} | {turma.ano_letivo})"
-                
-            mat_selecionada = st.selectbox("Selecione a matrícula para cancelar:", options=list(opcoes_mat.keys()), format_func=lambda x: opcoes_mat[x])
-            
+
+# ==========================================
+# SEÇÃO 4: EDITAR PROJETOS E TURMAS
+# ==========================================
+def secao_editar_projetos(db):
+    st.header("Editar Projetos e Turmas")
+    tipo_edicao = st.radio("O que você deseja editar?", ["O Projeto (Catálogo)", "A Turma (Professor, Horário, Vagas)"], horizontal=True)
+
+    opcoes_proj_edit = consultas.opcoes_projetos(db)
+    if not opcoes_proj_edit:
+        st.warning("Nenhum projeto cadastrado.")
+    else:
+        if tipo_edicao == "O Projeto (Catálogo)":
+            proj_id_edit = st.selectbox("Selecione o Projeto:", options=list(opcoes_proj_edit.keys()), format_func=lambda x: opcoes_proj_edit[x], key="sel_edit_proj")
+            proj_selec = consultas.dados_projeto(db, proj_id_edit)
+
+            novo_nome = st.text_input("Nome do Projeto", value=proj_selec["nome"])
+            nova_desc = st.text_area("Descrição", value=proj_selec["descricao"])
+            novo_local = st.text_input("Local", value=proj_selec["local"])
+
             # BOTÃO COM CONFIRMAÇÃO
-            with st.popover("❌ Cancelar Matrícula"):
-                st.warning("Tem certeza? O aluno perderá a vaga nesta turma.")
-                if st.button("Sim, Cancelar Matrícula", key="conf_desmatricular", type="primary"):
-                    db.query(Matricula).filter(Matricula.id == mat_selecionada).delete()
-                    db.commit()
-                    st.session_state.mensagem_sucesso = "Matrícula cancelada com sucesso! A vaga está livre novamente."
+            with st.popover("💾 Atualizar Projeto"):
+                st.write("Confirma as alterações nas informações deste projeto?")
+                if st.button("Sim, Atualizar Projeto", key="conf_salvar_proj", type="primary"):
+                    consultas.atualizar_projeto(db, proj_id_edit, novo_nome, nova_desc, novo_local)
+                    st.session_state.mensagem_sucesso = "Projeto atualizado no catálogo com sucesso!"
                     st.rerun()
 
-    # ==========================================
-    # ABA 3: EDITAR ALUNO (Dinâmico)
-    # ==========================================
-    with aba_editar_aluno:
-        st.header("Editar Dados Cadastrais do Aluno")
-        if alunos_todos:
-            opcoes_alunos_edit = {a.id: a.nome_completo for a in alunos_todos}
-            aluno_edit_id = st.selectbox("Selecione o aluno para editar:", options=list(opcoes_alunos_edit.keys()), format_func=lambda x: opcoes_alunos_edit[x], key="sel_edit_aluno")
-            
-            aluno_edit = db.query(Aluno).filter(Aluno.id == aluno_edit_id).first()
-            dados_atuais = json.loads(aluno_edit.dados_cadastrais_json)
-            config = carregar_campos()
-            novas_respostas = {}
-
-            st.markdown("---")
-            for categoria, campos in config.items():
-                st.markdown(f"#### {categoria.replace('_', ' ').title()}")
-                cols = st.columns(2)
-                
-                for index, campo in enumerate(campos):
-                    nome = campo["nome"]
-                    tipo = campo["tipo"]
-                    label = campo["label"]
-                    valor_atual = dados_atuais.get(nome)
-                    key = f"edit_aluno_{nome}_{aluno_edit_id}"
-                    
-                    with cols[index % 2]:                    
-                        if tipo == "text":
-                            novas_respostas[nome] = st.text_input(label, value=valor_atual if valor_atual else "", key=key)
-                        elif tipo == "date":
-                            try:
-                                d_atual = datetime.datetime.strptime(valor_atual, "%Y-%m-%d").date() if valor_atual else datetime.date.today()
-                            except:
-                                d_atual = datetime.date.today()
-                            novas_respostas[nome] = st.date_input(label, value=d_atual, min_value=datetime.date(1990, 1, 1), max_value=datetime.date.today(), key=key)
-                        elif tipo == "number":
-                            novas_respostas[nome] = st.number_input(label, value=float(valor_atual) if valor_atual else 0.0, step=0.1, key=key)
-                        elif tipo == "selectbox":
-                            opcoes = campo.get("opcoes", [])
-                            idx = opcoes.index(valor_atual) if valor_atual in opcoes else 0
-                            novas_respostas[nome] = st.selectbox(label, options=opcoes, index=idx, key=key)
-                        elif tipo == "multiselect":
-                            opcoes = campo.get("opcoes", [])
-                            val_sel = valor_atual if isinstance(valor_atual, list) else []
-                            novas_respostas[nome] = st.multiselect(label, options=opcoes, default=val_sel, key=key)
-                        elif tipo == "textarea":
-                            novas_respostas[nome] = st.text_area(label, value=valor_atual if valor_atual else "", key=key)
-                        elif tipo == "radio_com_detalhe":
-                            idx = 1 if valor_atual == "Sim" else 0
-                            novas_respostas[nome] = st.radio(label, options=["Não", "Sim"], index=idx, key=key)
-                            if novas_respostas[nome] == "Sim":
-                                val_detalhe = dados_atuais.get(f"{nome}_detalhe", "")
-                                novas_respostas[f"{nome}_detalhe"] = st.text_input(f"Especifique ({campo['label']}):", value=val_detalhe, key=f"{key}_detalhe")
-
-            st.markdown("---")
+        else:
+            proj_id_edit = st.selectbox("Selecione o Projeto:", options=list(opcoes_proj_edit.keys()), format_func=lambda x: opcoes_proj_edit[x], key="sel_edit_proj_turma")
+            opcoes_turma_edit = consultas.opcoes_turmas(db, projeto_id=proj_id_edit)
+
+            if not opcoes_turma_edit:
+                st.warning("Nenhuma turma cadastrada para este projeto.")
+            else:
+                turma_id_edit = st.selectbox("Selecione a Turma:", options=list(opcoes_turma_edit.keys()), format_func=lambda x: opcoes_turma_edit[x])
+                turma_selec = consultas.dados_turma(db, turma_id_edit)
+
+                st.markdown("---")
+                col1, col2 = st.columns(2)
+                with col1:
+                    t_nome = st.text_input("Nome da Turma", value=turma_selec["nome_turma"])
+                    t_horario = st.text_input("Horário", value=turma_selec["horario"])
+                    t_vagas = st.number_input("Vagas Totais", value=turma_selec["vagas_totais"], min_value=1)
+                    t_ano = st.number_input("Ano Letivo", value=turma_selec["ano_letivo"], min_value=2024)
+                with col2:
+                    t_prof = st.text_input("Professor(a)", value=turma_selec["nome_professor"])
+                    t_cpf = st.text_input("CPF do Professor", value=turma_selec["cpf_professor"] or "")
+                    t_remun = st.number_input("Remuneração (R$)", value=float(turma_selec["remuneracao_professor"] or 0.0), step=50.0)
+
+                # BOTÃO COM CONFIRMAÇÃO
+                with st.popover("💾 Atualizar Turma"):
+                    st.write("Confirma as alterações nos dados desta turma e professor?")
+                    if st.button("Sim, Atualizar Turma", key="conf_salvar_turma", type="primary"):
+                        consultas.atualizar_turma(db, turma_id_edit, {
+                            "nome_turma": t_nome, "horario": t_horario, "vagas_totais": t_vagas, "ano_letivo": t_ano,
+                            "nome_professor": t_prof, "cpf_professor": t_cpf, "remuneracao_professor": t_remun,
+                        })
+                        st.session_state.mensagem_sucesso = "Dados da turma e do professor atualizados com sucesso!"
+                        st.rerun()
+
+
+# ==========================================
+# SEÇÃO 5: EXCLUIR REGISTROS
+# ==========================================
+def secao_excluir(db):
+    st.header("Exclusão Permanente")
+    col_ex_aluno, col_ex_proj = st.columns(2)
+
+    with col_ex_aluno:
+        st.subheader("🗑️ Excluir Aluno")
+        st.info("💡 Dica: Se o aluno apenas parou de frequentar, prefira inativá-lo na aba 'Status'.")
+        aluno_id = seletor_aluno(db, "sel_excluir_aluno")
+        if aluno_id:
             # BOTÃO COM CONFIRMAÇÃO
-            with st.popover("💾 Salvar Alterações do Aluno"):
-                st.write("Confirma a atualização dos dados cadastrais deste aluno?")
-                if st.button("Sim, Salvar Alterações", key="conf_salvar_aluno", type="primary"):
-                    aluno_edit.nome_completo = novas_respostas.get("nome_completo", aluno_edit.nome_completo)
-                    aluno_edit.data_nascimento = novas_respostas.get("data_nascimento", aluno_edit.data_nascimento)
-                    aluno_edit.rg = novas_respostas.get("rg", aluno_edit.rg)
-                    aluno_edit.cpf = novas_respostas.get("cpf", aluno_edit.cpf)
-                    
-                    respostas_json_safe = novas_respostas.copy()
-                    if "data_nascimento" in respostas_json_safe:
-                        respostas_json_safe["data_nascimento"] = respostas_json_safe["data_nascimento"].strftime("%Y-%m-%d")
-                    
-                    aluno_edit.dados_cadastrais_json = json.dumps(respostas_json_safe, ensure_ascii=False)
-                    
-                    db.commit()
-                    st.session_state.mensagem_sucesso = "Dados do aluno atualizados com sucesso!"
+            with st.popover("Excluir Aluno"):
+                st.error("⚠️ **ATENÇÃO:** Esta ação é IRREVERSÍVEL. Todo o histórico do aluno será apagado.")
+                if st.button("Sim, Excluir Definitivamente", key="conf_excluir_aluno", type="primary"):
+                    consultas.excluir_aluno(db, aluno_id)
+                    st.session_state.mensagem_sucesso = "Aluno e histórico excluídos permanentemente."
                     st.rerun()
 
-    # ==========================================
-    # ABA 4: EDITAR PROJETOS E TURMAS
-    # ==========================================
-    with aba_editar_proj:
-        st.header("Editar Projetos e Turmas")
-        tipo_edicao = st.radio("O que você deseja editar?", ["O Projeto (Catálogo)", "A Turma (Professor, Horário, Vagas)"], horizontal=True)
-        
-        projetos = db.query(Projeto).all()
-        if not projetos:
-            st.warning("Nenhum projeto cadastrado.")
-        else:
-            opcoes_proj_edit = {p.id: p.nome for p in projetos}
-            
-            if tipo_edicao == "O Projeto (Catálogo)":
-                proj_id_edit = st.selectbox("Selecione o Projeto:", options=list(opcoes_proj_edit.keys()), format_func=lambda x: opcoes_proj_edit[x], key="sel_edit_proj")
-                proj_selec = db.query(Projeto).filter(Projeto.id == proj_id_edit).first()
-                
-                novo_nome = st.text_input("Nome do Projeto", value=proj_selec.nome)
-                nova_desc = st.text_area("Descrição", value=proj_selec.descricao)
-                novo_local = st.text_input("Local", value=proj_selec.local)
-                
+    with col_ex_proj:
+        st.subheader("🗑️ Excluir Projeto ou Turma")
+        tipo_exclusao = st.radio("O que você deseja excluir?", ["O Projeto Completo (Catálogo e Turmas)", "Apenas uma Turma Específica"])
+
+        opcoes_projetos_ex = consultas.opcoes_projetos(db)
+        if opcoes_projetos_ex:
+            if tipo_exclusao == "O Projeto Completo (Catálogo e Turmas)":
+                proj_id = st.selectbox("Selecione o projeto para excluir:", options=list(opcoes_projetos_ex.keys()), format_func=lambda x: opcoes_projetos_ex[x], key="excluir_proj_completo")
+
                 # BOTÃO COM CONFIRMAÇÃO
-                with st.popover("💾 Atualizar Projeto"):
-                    st.write("Confirma as alterações nas informações deste projeto?")
-                    if st.button("Sim, Atualizar Projeto", key="conf_salvar_proj", type="primary"):
-                        proj_selec.nome = novo_nome
-                        proj_selec.descricao = nova_desc
-                        proj_selec.local = novo_local
-                        db.commit()
-                        st.session_state.mensagem_sucesso = "Projeto atualizado no catálogo com sucesso!"
+                with st.popover("Excluir Projeto"):
+                    st.error("⚠️ **ATENÇÃO:** O projeto, todas as suas turmas e matrículas serão apagados.")
+                    if st.button("Sim, Excluir Projeto e Turmas", key="conf_excluir_proj_total", type="primary"):
+                        consultas.excluir_projeto(db, proj_id)
+                        st.session_state.mensagem_sucesso = "Projeto e todas as dependências excluídos com sucesso."
                         st.rerun()
-            
+
             else:
-                proj_id_edit = st.selectbox("Selecione o Projeto:", options=list(opcoes_proj_edit.keys()), format_func=lambda x: opcoes_proj_edit[x], key="sel_edit_proj_turma")
-                turmas_do_proj = db.query(Turma).filter(Turma.projeto_id == proj_id_edit).all()
-                
-                if not turmas_do_proj:
-                    st.warning("Nenhuma turma cadastrada para este projeto.")
+                proj_id = st.selectbox("Selecione o projeto:", options=list(opcoes_projetos_ex.keys()), format_func=lambda x: opcoes_projetos_ex[x], key="excluir_proj_turma")
+                opcoes_turma_ex = consultas.opcoes_turmas(db, projeto_id=proj_id)
+
+                if not opcoes_turma_ex:
+                    st.info("Este projeto não possui turmas cadastradas para excluir.")
                 else:
-                    opcoes_turma_edit = {t.id: f"{t.nome_turma} ({t.ano_letivo})" for t in turmas_do_proj}
-                    turma_id_edit = st.selectbox("Selecione a Turma:", options=list(opcoes_turma_edit.keys()), format_func=lambda x: opcoes_turma_edit[x])
-                    turma_selec = db.query(Turma).filter(Turma.id == turma_id_edit).first()
-                    
-                    st.markdown("---")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        t_nome = st.text_input("Nome da Turma", value=turma_selec.nome_turma)
-                        t_horario = st.text_input("Horário", value=turma_selec.horario)
-                        t_vagas = st.number_input("Vagas Totais", value=turma_selec.vagas_totais, min_value=1)
-                        t_ano = st.number_input("Ano Letivo", value=turma_selec.ano_letivo, min_value=2024)
-                    with col2:
-                        t_prof = st.text_input("Professor(a)", value=turma_selec.nome_professor)
-                        t_cpf = st.text_input("CPF do Professor", value=turma_selec.cpf_professor if turma_selec.cpf_professor else "")
-                        t_remun = st.number_input("Remuneração (R$)", value=float(turma_selec.remuneracao_professor) if turma_selec.remuneracao_professor else 0.0, step=50.0)
-                        
+                    turma_id_ex = st.selectbox("Selecione a turma para excluir:", options=list(opcoes_turma_ex.keys()), format_func=lambda x: opcoes_turma_ex[x])
+
                     # BOTÃO COM CONFIRMAÇÃO
-                    with st.popover("💾 Atualizar Turma"):
-                        st.write("Confirma as alterações nos dados desta turma e professor?")
-                        if st.button("Sim, Atualizar Turma", key="conf_salvar_turma", type="primary"):
-                            turma_selec.nome_turma = t_nome
-                            turma_selec.horario = t_horario
-                            turma_selec.vagas_totais = t_vagas
-                            turma_selec.ano_letivo = t_ano
-                            turma_selec.nome_professor = t_prof
-                            turma_selec.cpf_professor = t_cpf
-                            turma_selec.remuneracao_professor = t_remun
-                            db.commit()
-                            st.session_state.mensagem_sucesso = "Dados da turma e do professor atualizados com sucesso!"
+                    with st.popover("Excluir Apenas a Turma"):
+                        st.error("⚠️ **ATENÇÃO:** A turma e as matrículas vinculadas a ela serão apagadas.")
+                        if st.button("Sim, Excluir Turma", key="conf_excluir_turma_unica", type="primary"):
+                            consultas.excluir_turma(db, turma_id_ex)
+                            st.session_state.mensagem_sucesso = "Turma excluída com sucesso."
                             st.rerun()
 
-    # ==========================================
-    # ABA 5: EXCLUIR REGISTROS
-    # ==========================================
-    with aba_excluir:
-        st.header("Exclusão Permanente")
-        col_ex_aluno, col_ex_proj = st.columns(2)
-        
-        with col_ex_aluno:
-            st.subheader("🗑️ Excluir Aluno")
-            st.info("💡 Dica: Se o aluno apenas parou de frequentar, prefira inativá-lo na aba 'Status'.")
-            if alunos_todos:
-                opcoes_excluir = {a.id: a.nome_completo for a in alunos_todos}
-                aluno_id = st.selectbox("Selecione o aluno:", options=list(opcoes_excluir.keys()), format_func=lambda x: opcoes_excluir[x])
-                
-                # BOTÃO COM CONFIRMAÇÃO
-                with st.popover("Excluir Aluno"):
-                    st.error("⚠️ **ATENÇÃO:** Esta ação é IRREVERSÍVEL. Todo o histórico do aluno será apagado.")
-                    if st.button("Sim, Excluir Definitivamente", key="conf_excluir_aluno", type="primary"):
-                        db.query(Matricula).filter(Matricula.aluno_id == aluno_id).delete()
-                        db.query(Aluno).filter(Aluno.id == aluno_id).delete()
-                        db.commit()
-                        st.session_state.mensagem_sucesso = "Aluno e histórico excluídos permanentemente."
-                        st.rerun()
+    st.markdown("---")
+    st.subheader("🧹 Ações em Lote")
+    st.caption("Cada ação é um único comando no banco, numa só transação: as matrículas (e as turmas, no caso de projetos) vão junto pela exclusão em cascata.")
+    alvo_lote = st.radio("Registros:", ["Alunos", "Turmas"], horizontal=True, key="lote_alvo")
+    if alvo_lote == "Alunos":
+        lote_alunos(db)
+    else:
+        lote_turmas(db)
 
-        with col_ex_proj:
-            st.subheader("🗑️ Excluir Projeto ou Turma")
-            tipo_exclusao = st.radio("O que você deseja excluir?", ["O Projeto Completo (Catálogo e Turmas)", "Apenas uma Turma Específica"])
-            
-            projetos = db.query(Projeto).all()
-            if projetos:
-                opcoes_projetos_ex = {p.id: p.nome for p in projetos}
-                
-                if tipo_exclusao == "O Projeto Completo (Catálogo e Turmas)":
-                    proj_id = st.selectbox("Selecione o projeto para excluir:", options=list(opcoes_projetos_ex.keys()), format_func=lambda x: opcoes_projetos_ex[x], key="excluir_proj_completo")
-                    
-                    # BOTÃO COM CONFIRMAÇÃO
-                    with st.popover("Excluir Projeto"):
-                        st.error("⚠️ **ATENÇÃO:** O projeto, todas as suas turmas e matrículas serão apagados.")
-                        if st.button("Sim, Excluir Projeto e Turmas", key="conf_excluir_proj_total", type="primary"):
-                            turmas = db.query(Turma).filter(Turma.projeto_id == proj_id).all()
-                            ids_turmas = [t.id for t in turmas]
-                            if ids_turmas:
-                                db.query(Matricula).filter(Matricula.turma_id.in_(ids_turmas)).delete(synchronize_session=False)
-                            db.query(Turma).filter(Turma.projeto_id == proj_id).delete()
-                            db.query(Projeto).filter(Projeto.id == proj_id).delete()
-                            db.commit()
-                            st.session_state.mensagem_sucesso = "Projeto e todas as dependências excluídos com sucesso."
-                            st.rerun()
-                
+
+LIMITE_LOTE = 1000
+
+
+def lote_alunos(db):
+    col_termo, col_ano, col_ativos = st.columns([2, 1, 1])
+    termo = col_termo.text_input("Nome ou CPF (vazio = todos):", key="lote_alunos_termo")
+    ano_lote = col_ano.selectbox("Matriculados no ano:", options=[None] + consultas.anos_letivos(db), format_func=lambda a: "Qualquer ano" if a is None else str(a), key="lote_alunos_ano")
+    apenas_ativos = col_ativos.checkbox("Somente ativos", key="lote_alunos_ativos")
+
+    encontrados = consultas.buscar_alunos(db, termo, limite=LIMITE_LOTE + 1, apenas_ativos=apenas_ativos, ano_letivo=ano_lote)
+    if not encontrados:
+        st.info("Nenhum aluno encontrado para este filtro.")
+        return
+    if len(encontrados) > LIMITE_LOTE:
+        st.caption(f"Mostrando os {LIMITE_LOTE} primeiros resultados. Refine o filtro para alcançar os demais.")
+        encontrados = encontrados[:LIMITE_LOTE]
+
+    tabela = st.dataframe(
+        [{"Nome do Aluno": nome, "CPF": cpf or "N/A", "Status": "Ativo" if ativo else "Inativo"} for _, nome, cpf, ativo in encontrados],
+        width="stretch", hide_index=True, on_select="rerun", selection_mode="multi-row", key="lote_alunos_tabela",
+    )
+    if st.checkbox(f"Selecionar todos os {len(encontrados)} resultados", key="lote_alunos_todos"):
+        selecionados = [a_id for a_id, _, _, _ in encontrados]
+    else:
+        selecionados = [encontrados[i][0] for i in tabela.selection.rows]
+    st.write(f"**{len(selecionados)}** aluno(s) selecionado(s).")
+    if not selecionados:
+        return
+
+    col_inativar, col_excluir = st.columns(2)
+    with col_inativar.popover("🔴 Inativar Selecionados"):
+        st.write(f"Marcar **{len(selecionados)}** aluno(s) como inativos? O histórico de matrículas é mantido.")
+        if st.button("Sim, Inativar", key="conf_lote_inativar", type="primary"):
+            total = consultas.alterar_status_alunos(db, selecionados, False)
+            st.session_state.mensagem_sucesso = f"{total} aluno(s) marcado(s) como inativos."
+            st.rerun()
+    with col_excluir.popover("🗑️ Excluir Selecionados"):
+        st.error(f"⚠️ **ATENÇÃO:** {len(selecionados)} aluno(s) e todas as suas matrículas serão apagados. Esta ação é IRREVERSÍVEL.")
+        if st.button("Sim, Excluir Definitivamente", key="conf_lote_excluir_alunos", type="primary"):
+            total = consultas.excluir_alunos(db, selecionados)
+            st.session_state.mensagem_sucesso = f"{total} aluno(s) e os seus históricos excluídos permanentemente."
+            st.rerun()
+
+
+def lote_turmas(db):
+    anos = consultas.anos_letivos(db)
+    if not anos:
+        st.info("Nenhuma turma cadastrada ainda.")
+        return
+    ano_lote = st.selectbox("Ano Letivo:", options=anos, key="lote_turmas_ano")
+    df_turmas = consultas.ocupacao_por_turma(db, ano_lote)
+    if df_turmas.empty:
+        st.info("Nenhuma turma com projeto neste ano.")
+        return
+
+    tabela = st.dataframe(
+        df_turmas[["projeto", "turma", "vagas_totais", "matriculados"]].rename(columns={
+            "projeto": "Projeto", "turma": "Turma", "vagas_totais": "Vagas", "matriculados": "Matriculados",
+        }),
+        width="stretch", hide_index=True, on_select="rerun", selection_mode="multi-row", key="lote_turmas_tabela",
+    )
+    if st.checkbox(f"Selecionar todas as {len(df_turmas)} turmas de {ano_lote}", key="lote_turmas_todas"):
+        linhas = df_turmas
+    else:
+        linhas = df_turmas.iloc[tabela.selection.rows]
+    turma_ids = [int(t) for t in linhas["turma_id"]]
+    st.write(f"**{len(turma_ids)}** turma(s) selecionada(s), com {int(linhas['matriculados'].sum())} matrícula(s).")
+    if not turma_ids:
+        return
+
+    with st.popover("🗑️ Excluir Turmas Selecionadas"):
+        st.error(f"⚠️ **ATENÇÃO:** {len(turma_ids)} turma(s) e as suas matrículas serão apagadas. Os alunos continuam cadastrados.")
+        if st.button("Sim, Excluir Turmas", key="conf_lote_excluir_turmas", type="primary"):
+            total = consultas.excluir_turmas(db, turma_ids)
+            st.session_state.mensagem_sucesso = f"{total} turma(s) excluída(s) com as suas matrículas."
+            st.rerun()
+
+
+# ==========================================
+# SEÇÃO 6: GERIR UTILIZADORES (APENAS ADMIN)
+# ==========================================
+def secao_usuarios(db):
+    st.header("Gestão de Acessos da Equipa")
+    st.write("Controle exclusivo para Administradores.")
+    st.markdown("---")
+
+    # 3 colunas para acomodar a nova função de resetar senha
+    col_add, col_reset, col_del = st.columns(3)
+
+    with col_add:
+        st.subheader("➕ Adicionar Utilizador")
+        with st.form("form_novo_usuario"):
+            novo_nome = st.text_input("Nome Completo")
+            novo_email = st.text_input("E-mail")
+            nova_senha = st.text_input("Palavra-passe provisória", type="password")
+
+            # Permite escolher se o novo funcionário também será admin
+            novo_perfil = st.selectbox("Perfil de Acesso", ["Comum", "Administrador"])
+
+            btn_criar_user = st.form_submit_button("Criar Utilizador", type="primary")
+
+            if btn_criar_user:
+                if not novo_nome or not novo_email or not nova_senha:
+                    st.error("⚠️ Preencha todos os campos.")
                 else:
-                    proj_id = st.selectbox("Selecione o projeto:", options=list(opcoes_projetos_ex.keys()), format_func=lambda x: opcoes_projetos_ex[x], key="excluir_proj_turma")
-                    turmas_do_proj = db.query(Turma).filter(Turma.projeto_id == proj_id).all()
-                    
-                    if not turmas_do_proj:
-                        st.info("Este projeto não possui turmas cadastradas para excluir.")
-                    else:
-                        opcoes_turma_ex = {t.id: f"{t.nome_turma} ({t.ano_letivo})" for t in turmas_do_proj}
-                        turma_id_ex = st.selectbox("Selecione a turma para excluir:", options=list(opcoes_turma_ex.keys()), format_func=lambda x: opcoes_turma_ex[x])
-                        
-                        # BOTÃO COM CONFIRMAÇÃO
-                        with st.popover("Excluir Apenas a Turma"):
-                            st.error("⚠️ **ATENÇÃO:** A turma e as matrículas vinculadas a ela serão apagadas.")
-                            if st.button("Sim, Excluir Turma", key="conf_excluir_turma_unica", type="primary"):
-                                db.query(Matricula).filter(Matricula.turma_id == turma_id_ex).delete(synchronize_session=False)
-                                db.query(Turma).filter(Turma.id == turma_id_ex).delete()
-                                db.commit()
-                                st.session_state.mensagem_sucesso = "Turma excluída com sucesso."
-                                st.rerun()
-
-    # ==========================================
-    # ABA 6: GERIR UTILIZADORES (APENAS ADMIN)
-    # ==========================================
-    if eh_admin:
-        aba_usuarios = abas[5]
-        with aba_usuarios:
-            st.header("Gestão de Acessos da Equipa")
-            st.write("Controle exclusivo para Administradores.")
-            st.markdown("---")
-            
-            # 3 colunas para acomodar a nova função de resetar senha
-            col_add, col_reset, col_del = st.columns(3)
-            
-            with col_add:
-                st.subheader("➕ Adicionar Utilizador")
-                with st.form("form_novo_usuario"):
-                    novo_nome = st.text_input("Nome Completo")
-                    novo_email = st.text_input("E-mail")
-                    nova_senha = st.text_input("Palavra-passe provisória", type="password")
-                    
-                    # Permite escolher se o novo funcionário também será admin
-                    novo_perfil = st.selectbox("Perfil de Acesso", ["Comum", "Administrador"])
-                    
-                    btn_criar_user = st.form_submit_button("Criar Utilizador", type="primary")
-                    
-                    if btn_criar_user:
-                        if not novo_nome or not novo_email or not nova_senha:
-                            st.error("⚠️ Preencha todos os campos.")
-                        elif db.query(Usuario).filter(Usuario.email == novo_email).first():
-                            st.error("❌ Este e-mail já existe no sistema.")
-                        else:
-                            senha_hash = bcrypt.hashpw(nova_senha.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-                            is_adm = True if novo_perfil == "Administrador" else False
-                            
-                            novo_user = Usuario(nome=novo_nome, email=novo_email, senha=senha_hash, is_admin=is_adm)
-                            db.add(novo_user)
-                            db.commit()
-                            st.session_state.mensagem_sucesso = f"Usuário {novo_nome} criado com sucesso!"
-                            st.rerun()
+                    try:
+                        seguranca.criar_usuario(db, novo_nome, novo_email, nova_senha, is_admin=novo_perfil == "Administrador")
+                        st.session_state.mensagem_sucesso = f"Usuário {novo_nome} criado com sucesso!"
+                        st.rerun()
+                    except seguranca.UsuarioRecusado as e:
+                        st.error(f"❌ {e}")
 
-            with col_reset:
-                st.subheader("🔑 Redefinir Senha")
-                usuarios_db = db.query(Usuario).all()
-                opcoes_users_reset = {u.id: f"{u.nome} ({u.email})" for u in usuarios_db}
-                
-                with st.form("form_reset_senha"):
-                    user_id_reset = st.selectbox("Selecione o usuário:", options=list(opcoes_users_reset.keys()), format_func=lambda x: opcoes_users_reset[x])
-                    senha_recuperacao = st.text_input("Digite a nova palavra-passe", type="password")
-                    btn_reset = st.form_submit_button("Salvar Nova Senha")
-                    
-                    if btn_reset:
-                        if not senha_recuperacao:
-                            st.error("⚠️ Digite uma nova senha.")
-                        else:
-                            user_para_reset = db.query(Usuario).filter(Usuario.id == user_id_reset).first()
-                            senha_hash_nova = bcrypt.hashpw(senha_recuperacao.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-                            user_para_reset.senha = senha_hash_nova
-                            db.commit()
-                            st.session_state.mensagem_sucesso = f"Senha de {user_para_reset.nome} redefinida com sucesso!"
-                            st.rerun()
-                            
-            with col_del:
-                st.subheader("🗑️ Remover Acesso")
-                usuarios_removiveis = [u for u in usuarios_db if u.email != st.session_state.get("email_usuario")]
-                
-                if not usuarios_removiveis:
-                    st.info("Não existem outros utilizadores no sistema além de si.")
+    with col_reset:
+        st.subheader("🔑 Redefinir Senha")
+        usuarios_db = seguranca.listar_usuarios(db)
+        opcoes_users_reset = {u.id: f"{u.nome} ({u.email})" for u in usuarios_db}
+
+        with st.form("form_reset_senha"):
+            user_id_reset = st.selectbox("Selecione o usuário:", options=list(opcoes_users_reset.keys()), format_func=lambda x: opcoes_users_reset[x])
+            senha_recuperacao = st.text_input("Digite a nova palavra-passe", type="password")
+            btn_reset = st.form_submit_button("Salvar Nova Senha")
+
+            if btn_reset:
+                if not senha_recuperacao:
+                    st.error("⚠️ Digite uma nova senha.")
                 else:
-                    opcoes_users_del = {u.id: f"{u.nome} ({u.email})" for u in usuarios_removiveis}
-                    user_id_del = st.selectbox("Selecione a pessoa a remover:", options=list(opcoes_users_del.keys()), format_func=lambda x: opcoes_users_del[x])
-                    
-                    with st.popover("Remover Acesso"):
-                        st.error("⚠️ **ATENÇÃO:** O acesso será revogado imediatamente.")
-                        if st.button("Sim, Remover", type="primary"):
-                            db.query(Usuario).filter(Usuario.id == user_id_del).delete()
-                            db.commit()
-                            st.session_state.mensagem_sucesso = "Acesso revogado com sucesso!"
-                            st.rerun()
+                    seguranca.redefinir_senha(db, user_id_reset, senha_recuperacao)
+                    st.session_state.mensagem_sucesso = f"Senha de {opcoes_users_reset[user_id_reset]} redefinida com sucesso!"
+                    st.rerun()
+
+    with col_del:
+        st.subheader("🗑️ Remover Acesso")
+        usuarios_removiveis = [u for u in usuarios_db if u.email != st.session_state.get("email_usuario")]
+
+        if not usuarios_removiveis:
+            st.info("Não existem outros utilizadores no sistema além de si.")
+        else:
+            opcoes_users_del = {u.id: f"{u.nome} ({u.email})" for u in usuarios_removiveis}
+            user_id_del = st.selectbox("Selecione a pessoa a remover:", options=list(opcoes_users_del.keys()), format_func=lambda x: opcoes_users_del[x])
+
+            with st.popover("Remover Acesso"):
+                st.error("⚠️ **ATENÇÃO:** O acesso será revogado imediatamente.")
+                if st.button("Sim, Remover", type="primary"):
+                    seguranca.remover_usuario(db, user_id_del)
+                    st.session_state.mensagem_sucesso = "Acesso revogado com sucesso!"
+                    st.rerun()
+
+
+# ==========================================
+# SEÇÃO 7: EXPORTAÇÃO COMPLETA (APENAS ADMIN)
+# ==========================================
+def descartar_exportacao_pronta():
+    pronta = st.session_state.pop("exportacao_pronta", None)
+    if pronta is not None:
+        exportacao.descartar_exportacao(pronta[0])
+
+
+def secao_exportar(db):
+    st.header("Exportar Todos os Dados")
+    st.write("Gera um arquivo .zip com uma tabela por arquivo: alunos (com todos os campos da ficha em colunas), matrículas, turmas e projetos.")
+    st.caption("Os registros são lidos e gravados em blocos, então a exportação funciona mesmo com bases grandes. Parquet preserva os tipos das colunas e é o formato indicado para análise em Python, R ou BI.")
+
+    formato = st.radio("Formato:", ["csv", "parquet"], format_func=lambda f: {"csv": "CSV (Excel, Planilhas)", "parquet": "Parquet (Análise de Dados)"}[f], horizontal=True, key="formato_exportacao")
+
+    if st.button("📤 Gerar Exportação", type="primary"):
+        barra = st.progress(0.0, text="Iniciando...")
+        try:
+            caminho_zip, contagens = exportacao.exportar_tudo(db, formato, progresso=lambda fracao, etapa: barra.progress(fracao, text=etapa))
+        except Exception as e:
+            st.error(f"Erro ao exportar os dados: {e}")
+        else:
+            # A sessão guarda só o caminho: a exportação anterior é apagada do disco ao ser substituída
+            descartar_exportacao_pronta()
+            st.session_state.exportacao_pronta = (caminho_zip, contagens)
+
+    if "exportacao_pronta" in st.session_state:
+        caminho_zip, contagens = st.session_state.exportacao_pronta
+        if not os.path.exists(caminho_zip):
+            # Removida pela limpeza das exportações antigas (ver exportacao.VALIDADE_SOBRAS_SEGUNDOS)
+            del st.session_state.exportacao_pronta
+            st.info("A exportação expirou. Gere-a novamente.")
+            return
+        st.success("Exportação pronta: " + " | ".join(f"{nome}: {total} linha(s)" for nome, total in contagens.items()))
+        col_baixar, col_descartar = st.columns(2)
+        with open(caminho_zip, "rb") as arquivo_zip:
+            col_baixar.download_button("📥 Baixar Exportação (.zip)", data=arquivo_zip, file_name=os.path.basename(caminho_zip), mime="application/zip")
+        col_descartar.button("🗑️ Descartar Exportação", on_click=descartar_exportacao_pronta)
+
+
+# ==========================================
+# SEÇÃO 8: DESEMPENHO (APENAS ADMIN)
+# ==========================================
+def secao_desempenho(db):
+    st.header("Desempenho do Sistema")
+    st.subheader("🔌 Pool de Conexões com o Banco")
+    st.caption("Um único pool é compartilhado por todas as sessões deste servidor. Valores acumulados desde o último reinício.")
+
+    status = status_pool()
+    col_p1, col_p2, col_p3, col_p4 = st.columns(4)
+    col_p1.metric("Tamanho do Pool", status["tamanho"] if status["tamanho"] is not None else "N/A")
+    col_p2.metric("Conexões em Uso", status["em_uso"] if status["em_uso"] is not None else "N/A")
+    col_p3.metric("Conexões Livres", status["livres"] if status["livres"] is not None else "N/A")
+    col_p4.metric("Conexões Excedentes", status["excedentes"] if status["excedentes"] is not None else "N/A")
+
+    col_e1, col_e2, col_e3, col_e4 = st.columns(4)
+    col_e1.metric("Retiradas do Pool", status["retiradas"])
+    col_e2.metric("Espera Média", f"{status['espera_media_ms']:.1f} ms")
+    col_e3.metric("Espera Máxima", f"{status['espera_max_ms']:.1f} ms")
+    col_e4.metric("Pool Esgotado (timeouts)", status["esgotamentos"])
+
+    st.subheader("🗃️ Cache de Consultas")
+    st.caption("Leituras frequentes (listas de projetos e turmas, contagens do Dashboard, opções dos seletores) são compartilhadas entre as sessões e descartadas automaticamente quando alguém grava nas tabelas correspondentes.")
+
+    cache = status_cache()
+    col_c1, col_c2, col_c3, col_c4 = st.columns(4)
+    col_c1.metric("Taxa de Acerto", f"{cache['taxa_acerto'] * 100:.1f}%")
+    col_c2.metric("Acertos", cache["acertos"])
+    col_c3.metric("Falhas (consultas ao banco)", cache["falhas"])
+    col_c4.metric("Entradas em Cache", f"{cache['entradas']} / {cache['max_entradas']}")
+    st.caption(f"Leituras feitas direto no banco por estarem numa transação com escrita pendente: {cache['ignoradas']}")
+
+    if st.button("🧹 Limpar Cache e Contadores"):
+        limpar_cache()
+        st.rerun()
+
+    st.subheader("🖨️ Relatórios em Disco")
+    relatorios_guardados = cache_relatorios.status_cache()
+    st.caption(
+        f"{relatorios_guardados['arquivos']} arquivo(s) guardado(s), "
+        f"{relatorios_guardados['bytes'] / 1024 / 1024:.1f} MB de {relatorios_guardados['limite_bytes'] / 1024 / 1024:.0f} MB. "
+        "Um relatório pedido de novo sem mudanças nos dados é entregue direto daqui."
+    )
+
+    st.subheader("🔎 Consultas por Página")
+    if not database.DIAGNOSTICO_ATIVO:
+        st.info("Medição desligada (DIAGNOSTICO_CONSULTAS = false).")
+        return
+    st.caption(
+        f"Últimas {database.MAX_EXECUCOES_GUARDADAS} execuções de páginas neste servidor. "
+        f"Consultas acima de {database.LENTA_MS:.0f} ms e repetições a partir de {database.REPETICOES_N1}x "
+        f"(padrão N+1) também vão para o log `{database.LOG_CONSULTAS}`."
+    )
+    execucoes = database.execucoes_medidas()
+    if not execucoes:
+        st.info("Nenhuma execução medida ainda.")
+        return
+
+    st.dataframe(
+        [
+            {
+                "Página": r["pagina"],
+                "Execuções": r["execucoes"],
+                "Consultas (média)": round(r["consultas_media"], 1),
+                "Consultas (máx.)": r["consultas_max"],
+                "Tempo no Banco (média, ms)": round(r["tempo_medio_ms"], 1),
+                "Tempo no Banco (máx., ms)": round(r["tempo_max_ms"], 1),
+                "Alertas N+1": r["alertas_n1"],
+            }
+            for r in database.resumo_por_pagina()
+        ],
+        width="stretch",
+        hide_index=True,
+    )
+
+    alertas = [(e, r) for e in reversed(execucoes) for r in e["repetidas"]]
+    st.markdown("**⚠️ Possíveis N+1** (a mesma consulta repetida numa única execução)")
+    if alertas:
+        st.dataframe(
+            [
+                {"Quando": e["inicio"].strftime("%d/%m %H:%M:%S"), "Página": e["pagina"], "Vezes": r["vezes"], "Tempo (ms)": round(r["tempo_ms"], 1), "Consulta": r["sql"]}
+                for e, r in alertas[:20]
+            ],
+            width="stretch",
+            hide_index=True,
+        )
+    else:
+        st.caption("Nenhum padrão N+1 nas execuções guardadas.")
+
+    lentas = sorted(((c, e) for e in execucoes for c in e["lentas"]), key=lambda item: item[0]["tempo_ms"], reverse=True)
+    st.markdown("**🐢 Consultas mais lentas**")
+    st.dataframe(
+        [
+            {"Quando": e["inicio"].strftime("%d/%m %H:%M:%S"), "Página": e["pagina"], "Tempo (ms)": round(c["tempo_ms"], 1), "Consulta": c["sql"]}
+            for c, e in lentas[:10]
+        ],
+        width="stretch",
+        hide_index=True,
+    )
+
+    if st.button("🧹 Limpar Execuções Medidas"):
+        database.limpar_execucoes_medidas()
+        st.rerun()
+
+
+# ==========================================
+# SEÇÃO 9: FECHAMENTO DO ANO LETIVO (APENAS ADMIN)
+# ==========================================
+def secao_fechar_ano(db):
+    st.header("Fechar Ano Letivo")
+    st.write("Fechar um ano grava os seus números (alunos, turmas, matrículas e ocupação de cada turma). O Dashboard e os relatórios passam a ler esses números em vez de recalculá-los.")
+    st.caption("Alterações feitas depois do fechamento não mudam os números gravados. Para atualizá-los, reabra e feche o ano de novo.")
+
+    anos = consultas.anos_letivos(db)
+    if not anos:
+        st.info("Nenhuma turma cadastrada ainda.")
+        return
+
+    fechados = consultas.anos_fechados(db)
+    st.dataframe(
+        [
+            {"Ano Letivo": ano, "Situação": f"🔒 Fechado em {fechados[ano].strftime('%d/%m/%Y %H:%M')}" if ano in fechados else "🟢 Em aberto"}
+            for ano in anos
+        ],
+        width='content', hide_index=True
+    )
+
+    ano = st.selectbox("Ano letivo:", options=anos, key="ano_fechamento")
+    if ano in fechados:
+        # BOTÃO COM CONFIRMAÇÃO
+        with st.popover("🔓 Reabrir Ano"):
+            st.warning(f"Os números de {ano} voltarão a ser calculados a partir dos dados atuais.")
+            if st.button("Sim, Reabrir", key="conf_reabrir_ano", type="primary"):
+                consultas.reabrir_ano_letivo(db, ano)
+                st.session_state.mensagem_sucesso = f"Ano letivo {ano} reaberto."
+                st.rerun()
+    else:
+        # BOTÃO COM CONFIRMAÇÃO
+        with st.popover("🔒 Fechar Ano"):
+            if ano >= datetime.date.today().year:
+                st.warning(f"⚠️ {ano} ainda está em andamento: matrículas feitas depois do fechamento não entrarão nos números.")
+            if st.button("Sim, Fechar o Ano", key="conf_fechar_ano", type="primary"):
+                consultas.fechar_ano_letivo(db, ano)
+                st.session_state.mensagem_sucesso = f"Ano letivo {ano} fechado: números gravados."
+                st.rerun()
+
+
+# ==========================================
+# SEÇÃO 10: VIRADA DO ANO LETIVO (APENAS ADMIN)
+# ==========================================
+def secao_virada_ano(db):
+    st.header("Virada do Ano Letivo")
+    st.write("Copia as turmas escolhidas (professor, horário e vagas) para o ano seguinte, rematricula os alunos que continuam e, se desejar, inativa os que não voltam. Tudo é gravado de uma vez, numa única transação.")
+    st.caption("Turmas que já existem no ano seguinte (mesmo projeto e mesmo nome) não são copiadas de novo: os alunos são rematriculados nelas.")
+
+    anos = consultas.anos_letivos(db)
+    if not anos:
+        st.info("Nenhuma turma cadastrada ainda.")
+        return
+    ano_origem = st.selectbox("Copiar as turmas de:", options=anos, key="virada_ano")
+    ano_destino = ano_origem + 1
+
+    # --- 1. TURMAS ---
+    st.subheader(f"1. Turmas de {ano_origem} que continuam em {ano_destino}")
+    df_turmas = consultas.ocupacao_por_turma(db, ano_origem)
+    if df_turmas.empty:
+        st.info("Nenhuma turma com projeto neste ano.")
+        return
+    todas_turmas = st.checkbox(f"Todas as {len(df_turmas)} turmas", value=True, key="virada_todas_turmas")
+    if todas_turmas:
+        turma_ids = [int(t) for t in df_turmas["turma_id"]]
+    else:
+        tabela_turmas = st.dataframe(
+            df_turmas[["projeto", "turma", "vagas_totais", "matriculados"]].rename(columns={
+                "projeto": "Projeto", "turma": "Turma", "vagas_totais": "Vagas", "matriculados": "Matriculados",
+            }),
+            width="stretch", hide_index=True, on_select="rerun", selection_mode="multi-row", key="virada_tabela_turmas",
+        )
+        turma_ids = [int(t) for t in df_turmas.iloc[tabela_turmas.selection.rows]["turma_id"]]
+    if not turma_ids:
+        st.info("Selecione ao menos uma turma.")
+        return
+
+    # --- 2. ALUNOS ---
+    st.subheader("2. Alunos")
+    alunos = consultas.alunos_das_turmas(db, turma_ids)
+    modo = st.radio(
+        "Rematricular:",
+        ["Todos os alunos ativos das turmas", "Somente os alunos selecionados", "Ninguém"],
+        horizontal=True, key="virada_modo_alunos",
+    )
+    if modo == "Todos os alunos ativos das turmas":
+        aluno_ids = [a["id"] for a in alunos]
+    elif modo == "Ninguém":
+        aluno_ids = []
+    else:
+        tabela_alunos = st.dataframe(
+            [{"Nome do Aluno": a["nome"], "Turmas": ", ".join(a["turmas"])} for a in alunos],
+            width="stretch", hide_index=True, on_select="rerun", selection_mode="multi-row", key="virada_tabela_alunos",
+        )
+        aluno_ids = [alunos[i]["id"] for i in tabela_alunos.selection.rows]
+    st.write(f"**{len(aluno_ids)}** de {len(alunos)} aluno(s) ativo(s) continuam.")
+
+    inativar = st.checkbox("Inativar os alunos destas turmas que não forem rematriculados", key="virada_inativar")
+    data_matricula = st.date_input("Data das novas matrículas:", value=datetime.date.today(), format="DD/MM/YYYY", key="virada_data")
+
+    # --- 3. PRÉVIA E CONFIRMAÇÃO ---
+    st.subheader("3. Prévia")
+    parametros = (ano_origem, tuple(turma_ids), tuple(aluno_ids), inativar, data_matricula)
+    if st.button("👁️ Calcular Prévia", key="virada_previa"):
+        try:
+            previa = consultas.virada_ano_letivo(db, ano_origem, turma_ids, aluno_ids, inativar, data_matricula, simular=True)
+            st.session_state.virada_previa_calculada = (parametros, previa)
+        except consultas.ViradaRecusada as e:
+            st.warning(f"⚠️ {e}")
+
+    calculada = st.session_state.get("virada_previa_calculada")
+    if calculada is None or calculada[0] != parametros:
+        st.caption("Calcule a prévia para ver o que será gravado (é preciso recalculá-la ao mudar as escolhas acima).")
+        return
+    previa = calculada[1]
+    col_v1, col_v2, col_v3, col_v4 = st.columns(4)
+    col_v1.metric(f"Turmas a abrir em {ano_destino}", len(previa["turmas_copiadas"]))
+    col_v2.metric("Turmas já abertas", len(previa["turmas_ja_abertas"]))
+    col_v3.metric("Rematrículas", previa["rematriculas"])
+    col_v4.metric("Alunos a inativar", previa["inativacoes"])
+    if previa["turmas_copiadas"]:
+        with st.expander("Turmas que serão abertas"):
+            st.write("\n".join(f"- {t}" for t in previa["turmas_copiadas"]))
+    if previa["sem_vaga"]:
+        st.warning(f"⚠️ {len(previa['sem_vaga'])} aluno(s) ficarão sem vaga: a turma de {ano_destino} lotou (quem se matriculou antes em {ano_origem} tem prioridade). Eles não são inativados.")
+        with st.expander("Alunos sem vaga"):
+            st.write("\n".join(f"- {a}" for a in previa["sem_vaga"]))
+
+    # BOTÃO COM CONFIRMAÇÃO
+    with st.popover("🔁 Executar Virada"):
+        st.write(f"Gravar a virada de **{ano_origem}** para **{ano_destino}** conforme a prévia?")
+        if st.button("Sim, Executar a Virada", key="conf_virada", type="primary"):
+            try:
+                feita = consultas.virada_ano_letivo(db, ano_origem, turma_ids, aluno_ids, inativar, data_matricula)
+            except consultas.ViradaRecusada as e:
+                st.warning(f"⚠️ {e}")
+            else:
+                del st.session_state.virada_previa_calculada
+                st.session_state.mensagem_sucesso = (
+                    f"Virada para {ano_destino} concluída: {len(feita['turmas_copiadas'])} turma(s) aberta(s), "
+                    f"{feita['rematriculas']} rematrícula(s) e {feita['inativacoes']} aluno(s) inativado(s)."
+                    + (f" {len(feita['sem_vaga'])} aluno(s) ficaram sem vaga: {', '.join(feita['sem_vaga'])}." if feita["sem_vaga"] else "")
+                )
+                st.rerun()
+
+
+# --- MENU DE SEÇÕES (as de Admin ficam ocultas para os demais utilizadores) ---
+SECOES = {
+    "🔄 Estado": secao_status,
+    "❌ Desmatricular": secao_desmatricular,
+    "✏️ Editar Aluno": secao_editar_aluno,
+    "✏️ Editar Projetos": secao_editar_projetos,
+    "🗑️ Eliminar Registos": secao_excluir,
+}
+if st.session_state.get("is_admin", False):
+    SECOES["👥 Gerir Utilizadores (Admin)"] = secao_usuarios
+    SECOES["📤 Exportar Dados (Admin)"] = secao_exportar
+    SECOES["🩺 Desempenho (Admin)"] = secao_desempenho
+    SECOES["📅 Fechar Ano Letivo (Admin)"] = secao_fechar_ano
+    SECOES["🔁 Virada do Ano (Admin)"] = secao_virada_ano
+
+
+@st.fragment
+def mostrar_secao(nome_secao):
+    # Cliques dentro da seção reexecutam só este fragmento, com a sua própria sessão do banco
+    iniciar_medicao(__file__, nome_secao)
+    db = SessionLocal()
+    try:
+        SECOES[nome_secao](db)
+    finally:
+        db.close()
+
 
-finally:
-    db.close()
\ No newline at end of file
+secao_escolhida = st.segmented_control("Seção:", options=list(SECOES.keys()), default="🔄 Estado", key="secao_avancado", label_visibility="collapsed")
+if secao_escolhida not in SECOES:
+    secao_escolhida = "🔄 Estado"
+st.markdown("---")
+mostrar_secao(secao_escolhida)
@@ -1,7 +1,8 @@
 import streamlit as st
-import pandas as pd
+import datetime
 import plotly.express as px
-from database import SessionLocal, Aluno, Projeto, Turma, Matricula
+import consultas
+from database import SessionLocal, iniciar_medicao
 
 st.set_page_config(page_title="Dashboard", page_icon="📊", layout="wide")
 
@@ -11,29 +12,104 @@ if "autenticado" not in st.session_state or not st.session_state.autenticado:
     st.stop()
 # --------------------------
 
+iniciar_medicao(__file__)
+
 st.title("📊 Painel de Indicadores (Dashboard)")
 st.write("Visão geral quantitativa dos atendimentos e projetos da Associação Ágape.")
 st.markdown("---")
 
+MESES = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+
+# ==========================================
+# SEÇÃO 4: PERFIL SOCIOECONÔMICO
+# ==========================================
+@st.fragment
+def perfil_socioeconomico(ano_filtro):
+    # Trocar o indicador ou o cruzamento reexecuta só esta seção, com a sua própria sessão do banco
+    iniciar_medicao(__file__, "Perfil socioeconômico")
+    st.subheader("Perfil Socioeconômico dos Alunos")
+    col_dim, col_cruz = st.columns(2)
+    dimensao = col_dim.selectbox("Indicador:", options=list(consultas.DIMENSOES_PERFIL.keys()), format_func=lambda d: consultas.DIMENSOES_PERFIL[d], key="perfil_dimensao")
+    opcoes_cruzamento = {None: "Nenhum", "projeto": "Projeto"}
+    if ano_filtro is None:
+        opcoes_cruzamento["ano_letivo"] = "Ano Letivo"
+    cruzar_por = col_cruz.radio("Cruzar por:", options=list(opcoes_cruzamento.keys()), format_func=lambda c: opcoes_cruzamento[c], horizontal=True, key="perfil_cruzamento")
+
+    if ano_filtro is None and cruzar_por is None:
+        st.caption("Considerando todos os alunos ativos.")
+    elif ano_filtro is None:
+        st.caption("Considerando os alunos matriculados em cada grupo (um aluno em dois projetos conta nos dois).")
+    else:
+        st.caption(f"Considerando os alunos matriculados em {ano_filtro}.")
+
+    db = SessionLocal()
+    try:
+        df_perfil = consultas.perfil_socioeconomico(db, dimensao, ano_filtro, cruzar_por)
+    finally:
+        db.close()
+
+    if df_perfil.empty:
+        st.info("Nenhum aluno encontrado para este filtro.")
+        return
+
+    titulo = consultas.DIMENSOES_PERFIL[dimensao]
+    ordem = {"categoria": list(dict.fromkeys(df_perfil["categoria"]))}
+    if cruzar_por is None:
+        fig4 = px.bar(df_perfil, x="categoria", y="alunos", color_discrete_sequence=["#F26522"], text="alunos", category_orders=ordem)
+        fig4.update_traces(textposition='outside')
+        fig4.update_layout(xaxis_title="", yaxis_title="Nº de Alunos", margin=dict(t=20, b=20, l=0, r=0))
+        st.plotly_chart(fig4, width='content')
+        st.dataframe(df_perfil.rename(columns={"categoria": titulo, "alunos": "Alunos"}), width='content', hide_index=True)
+    else:
+        df_grafico = df_perfil.assign(grupo=df_perfil["grupo"].astype(str))
+        fig4 = px.bar(df_grafico, x="grupo", y="alunos", color="categoria", text="alunos", category_orders=ordem,
+                      color_discrete_sequence=px.colors.sequential.Oranges_r)
+        fig4.update_layout(xaxis_title="", yaxis_title="Nº de Alunos", legend_title=titulo, margin=dict(t=20, b=20, l=0, r=0))
+        st.plotly_chart(fig4, width='content')
+        tabela = consultas.tabela_cruzada(df_perfil)
+        tabela.index.name = opcoes_cruzamento[cruzar_por]
+        tabela.columns.name = titulo
+        st.dataframe(tabela, width='content')
+
+
 db = SessionLocal()
 
 try:
+    # --- FILTRO DE ANO LETIVO ---
+    anos_disponiveis = consultas.anos_letivos(db)
+    opcoes_ano = ["Todos os anos"] + anos_disponiveis
+    ano_atual = datetime.date.today().year
+    indice_padrao = opcoes_ano.index(ano_atual) if ano_atual in opcoes_ano else 0
+    ano_escolhido = st.selectbox("Ano Letivo:", options=opcoes_ano, index=indice_padrao)
+    ano_filtro = None if ano_escolhido == "Todos os anos" else ano_escolhido
+
     with st.spinner("Carregando indicadores..."):
         # --- BUSCA DOS DADOS MACRO ---
-        total_alunos_ativos = db.query(Aluno).filter(Aluno.status_ativo == True).count()
-        total_projetos = db.query(Projeto).count()
-        total_turmas = db.query(Turma).count()
-        total_matriculas = db.query(Matricula).count()
+        # Anos fechados vêm da fotografia gravada no fechamento; os abertos, de uma
+        # única consulta agregada (GROUP BY) com a ocupação de cada turma
+        resumo = consultas.resumo_ano(db, ano_filtro)
+        total_alunos_ativos = resumo["alunos_ativos"]
+        total_projetos = consultas.contar_projetos(db)
+
+        df_turmas = resumo["df_turmas"]
+        df_projetos = consultas.ocupacao_por_projeto(df_turmas)
+        total_turmas = resumo["turmas"]
+        total_matriculas = resumo["matriculas"]
+        total_alunos_matriculados = resumo["alunos_matriculados"]
+
+        if resumo["fechado_em"] is not None:
+            st.caption(f"🔒 Ano letivo fechado em {resumo['fechado_em'].strftime('%d/%m/%Y')}: os números abaixo são os registrados no fechamento.")
 
         # ==========================================
         # SEÇÃO 1: CARDS NUMÉRICOS (MÉTRICAS)
         # ==========================================
-        col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4, col5 = st.columns(5)
         
         col1.metric("Alunos Ativos", f"{total_alunos_ativos} 🧑‍🎓")
         col2.metric("Projetos Cadastrados", f"{total_projetos} ⚽")
         col3.metric("Turmas Abertas", f"{total_turmas} 🏫")
         col4.metric("Matrículas Realizadas", f"{total_matriculas} ✅")
+        col5.metric("Alunos Matriculados", f"{total_alunos_matriculados} 🎒")
         
         st.markdown("<br>", unsafe_allow_html=True) # Respiro visual
 
@@ -41,19 +117,7 @@ try:
         # SEÇÃO 2: GRÁFICOS ANALÍTICOS
         # ==========================================
         # Gráfico 1: Matrículas por Projeto
-        projetos = db.query(Projeto).all()
-        turmas = db.query(Turma).all()
-        matriculas = db.query(Matricula).all()
-
-        dados_grafico = []
-        for p in projetos:
-            # Pega os IDs das turmas que pertencem a este projeto
-            turmas_do_projeto = [t.id for t in turmas if t.projeto_id == p.id]
-            # Conta quantas matrículas existem nessas turmas
-            contagem = sum(1 for m in matriculas if m.turma_id in turmas_do_projeto)
-            dados_grafico.append({"Projeto": p.nome, "Matrículas": contagem})
-
-        df_projetos = pd.DataFrame(dados_grafico)
+        df_projetos = df_projetos.rename(columns={"projeto": "Projeto", "matriculados": "Matrículas"})
 
         col_graf1, col_graf2 = st.columns(2)
 
@@ -81,5 +145,59 @@ try:
             else:
                 st.info("Ainda não há matrículas suficientes para gerar este gráfico.")
 
+        # ==========================================
+        # SEÇÃO 3: DRILL-DOWN (ANO -> PROJETO -> TURMA)
+        # ==========================================
+        st.markdown("---")
+        if ano_filtro is None:
+            st.subheader("Evolução por Ano Letivo")
+            df_anos = consultas.ocupacao_por_ano(df_turmas)
+            if df_anos.empty:
+                st.info("Nenhuma turma cadastrada.")
+            else:
+                st.dataframe(
+                    df_anos.rename(columns={
+                        "ano_letivo": "Ano Letivo", "turmas": "Turmas", "vagas_totais": "Vagas Totais",
+                        "matriculados": "Matriculados", "vagas_livres": "Vagas Livres", "ocupacao_pct": "Ocupação (%)"
+                    }),
+                    width='content', hide_index=True
+                )
+                st.caption("Selecione um ano no filtro acima para detalhar por projeto, turma e mês.")
+        else:
+            st.subheader(f"Detalhamento do Ano Letivo {ano_filtro}")
+            if df_turmas.empty:
+                st.info("Nenhuma turma cadastrada para este ano letivo.")
+            else:
+                opcoes_proj = {0: "Todos os projetos"}
+                opcoes_proj.update(dict(zip(df_projetos["projeto_id"], df_projetos["Projeto"])))
+                projeto_id_selec = st.selectbox("Projeto:", options=list(opcoes_proj.keys()), format_func=lambda x: opcoes_proj[x])
+
+                df_detalhe = df_turmas if projeto_id_selec == 0 else df_turmas[df_turmas["projeto_id"] == projeto_id_selec]
+                df_detalhe = df_detalhe.assign(
+                    status=["🔴 Lotada" if v <= 0 else "🟢 Vagas Abertas" for v in df_detalhe["vagas_livres"]]
+                )
+                st.dataframe(
+                    df_detalhe[["projeto", "turma", "vagas_totais", "matriculados", "vagas_livres", "status"]].rename(columns={
+                        "projeto": "Projeto", "turma": "Turma", "vagas_totais": "Vagas Totais",
+                        "matriculados": "Matriculados", "vagas_livres": "Vagas Disponíveis", "status": "Status"
+                    }),
+                    width='content', hide_index=True
+                )
+
+                # Drill-down por data da matrícula
+                st.subheader("Matrículas por Mês")
+                df_meses = consultas.matriculas_por_mes(db, ano_filtro, None if projeto_id_selec == 0 else projeto_id_selec)
+                if df_meses.empty:
+                    st.info("Nenhuma matrícula registrada para este filtro.")
+                else:
+                    df_meses["Mês"] = [MESES[m - 1] for m in df_meses["mes"]]
+                    fig3 = px.bar(df_meses, x="Mês", y="matriculas", color_discrete_sequence=["#F26522"], text="matriculas")
+                    fig3.update_traces(textposition='outside')
+                    fig3.update_layout(xaxis_title="", yaxis_title="Nº de Matrículas", margin=dict(t=20, b=20, l=0, r=0))
+                    st.plotly_chart(fig3, width='content')
+
 finally:
-    db.close()
\ No newline at end of file
+    db.close()
+
+st.markdown("---")
+perfil_socioeconomico(ano_filtro)
\ No newline at end of file
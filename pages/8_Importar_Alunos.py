@@ -0,0 +1,84 @@
+import streamlit as st
+import pandas as pd
+import importacao
+from database import SessionLocal, iniciar_medicao
+
+st.set_page_config(page_title="Importação de Alunos", page_icon="📥", layout="wide")
+
+# --- PROTEÇÃO DE ACESSO ---
+if "autenticado" not in st.session_state or not st.session_state.autenticado:
+    st.warning("⚠️ Você precisa fazer login para acessar esta página.")
+    st.stop() # Interrompe a leitura do código aqui e bloqueia a tela
+# --------------------------
+
+iniciar_medicao(__file__)
+
+st.title("📥 Importação de Alunos em Lote")
+st.write("Envie uma planilha (CSV ou Excel) com vários alunos de uma vez. Cada linha é validada com as mesmas regras do formulário de cadastro.")
+
+config = importacao.carregar_campos()
+
+with st.expander("📄 Como montar a planilha"):
+    st.markdown(f"""
+- Use uma coluna por campo do cadastro. O cabeçalho pode ser o nome interno (ex.: `nome_completo`) ou o rótulo do formulário (ex.: `Nome Completo`).
+- Datas em `DD/MM/AAAA` ou `AAAA-MM-DD`.
+- Campos com várias opções (ex.: vulnerabilidades): separe as opções com `{importacao.SEPARADOR_MULTISELECT}`.
+- Perguntas Sim/Não com detalhe: preencha `Sim` ou `Não` e, quando for `Sim`, a coluna `<campo>_detalhe`.
+""")
+    st.download_button("📥 Baixar modelo (CSV)", data=importacao.modelo_planilha(config), file_name="modelo_importacao_alunos.csv", mime="text/csv")
+
+arquivo = st.file_uploader("Selecione o arquivo", type=["csv", "xlsx"])
+
+if arquivo is not None:
+    try:
+        df_arquivo = importacao.ler_arquivo(arquivo, arquivo.name)
+    except Exception as e:
+        st.error(f"Não foi possível ler o arquivo: {e}")
+        st.stop()
+
+    if df_arquivo.empty:
+        st.warning("O arquivo não possui linhas de dados.")
+        st.stop()
+
+    db = SessionLocal()
+
+    try:
+        with st.spinner("Validando os dados..."):
+            dados, erros = importacao.validar(df_arquivo, config)
+            linhas_com_erro = set(erros["Linha"])
+            sem_erro = dados[~(dados.index + 2).isin(linhas_com_erro)]
+            duplicados, erros_duplicados = importacao.marcar_existentes(db, sem_erro)
+            erros = pd.concat([erros, erros_duplicados], ignore_index=True).sort_values("Linha", kind="stable")
+            validos = sem_erro[~duplicados]
+
+        # ==========================================
+        # RESUMO DA VALIDAÇÃO
+        # ==========================================
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Linhas no Arquivo", len(dados))
+        col2.metric("Prontas para Importar", len(validos))
+        col3.metric("Com Problemas", len(dados) - len(validos))
+
+        if not erros.empty:
+            st.subheader("⚠️ Relatório de Erros por Linha")
+            st.caption("A linha 1 é o cabeçalho. Corrija as linhas abaixo e envie o arquivo novamente, ou importe apenas as linhas válidas.")
+            st.dataframe(erros, width='content', hide_index=True)
+            st.download_button(
+                "📥 Baixar relatório de erros (CSV)",
+                data=erros.to_csv(index=False).encode("utf-8-sig"),
+                file_name="erros_importacao.csv",
+                mime="text/csv"
+            )
+
+        if not validos.empty:
+            with st.popover(f"✅ Importar {len(validos)} aluno(s)"):
+                st.write(f"Confirma o cadastro de **{len(validos)}** aluno(s)? As linhas com problema serão ignoradas.")
+                if st.button("Sim, Importar", type="primary", key="conf_importar"):
+                    try:
+                        with st.spinner("Gravando no banco de dados..."):
+                            total = importacao.importar(db, validos)
+                        st.success(f"✅ {total} aluno(s) importados com sucesso!")
+                    except Exception as e:
+                        st.error(f"Erro ao salvar no banco de dados: {e}")
+    finally:
+        db.close()
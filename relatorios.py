@@ -0,0 +1,392 @@
+import os
+import re
+import zipfile
+import threading
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from sqlalchemy import func, case
+import consultas
+import cache_relatorios
+from cache_consultas import versoes_atuais
+from documentos_pdf import PDF, renderizar_lista_chamada
+from database import SessionLocal, Aluno, AlunoVulnerabilidade, Projeto, Turma, Matricula, ler_config, versao_do_ano, VERSAO_TODOS_OS_ANOS
+
+# Relatórios rodam fora da thread da sessão do Streamlit: o botão só agenda a
+# geração e a página acompanha o progresso até o arquivo ficar pronto.
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="relatorio")
+
+
+class Progresso:
+    # Contador compartilhado entre a thread do relatório e a página
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.etapa = "Na fila..."
+        self.feitos = 0
+        self.total = 1
+        self.paginas = 0
+        self.do_cache = False
+
+    def atualizar(self, etapa=None, feitos=None, total=None, paginas=None):
+        with self._lock:
+            if etapa is not None:
+                self.etapa = etapa
+            if feitos is not None:
+                self.feitos = feitos
+            if total is not None:
+                self.total = max(total, 1)
+            if paginas is not None:
+                self.paginas = paginas
+
+    @property
+    def fracao(self):
+        with self._lock:
+            return min(self.feitos / self.total, 1.0)
+
+
+class TarefaRelatorio:
+    def __init__(self, ano, futuro, progresso, nome_arquivo, mime):
+        self.ano = ano
+        self.futuro = futuro
+        self.progresso = progresso
+        self.nome_arquivo = nome_arquivo
+        self.mime = mime
+
+
+def iniciar_relatorio_anual(ano):
+    progresso = Progresso()
+    futuro = _executor.submit(_executar_relatorio_anual, ano, progresso)
+    return TarefaRelatorio(ano, futuro, progresso, f"Relatorio_Agape_{ano}.pdf", "application/pdf")
+
+
+def iniciar_listas_chamada(ano):
+    progresso = Progresso()
+    futuro = _executor.submit(_executar_listas_chamada, ano, progresso)
+    return TarefaRelatorio(ano, futuro, progresso, f"Listas_de_Chamada_{ano}.zip", "application/zip")
+
+
+# --- CACHE DOS ARQUIVOS GERADOS ---
+# Mudanças no layout dos documentos devem incrementar este número (invalida o cache)
+VERSAO_LAYOUT = 3
+
+
+def impressao_digital(db, ano_letivo, tipo="anual"):
+    # Resume o estado dos dados que entram nos documentos do ano: contagens e maiores ids das
+    # turmas e matrículas do ano mais a versão do ano letivo (incrementada a cada gravação que o
+    # afeta, ver database.versao_do_ano). Gravações em outros anos não invalidam o arquivo.
+    versoes = versoes_atuais(db)
+    turmas = db.query(func.count(Turma.id), func.max(Turma.id)).filter(Turma.ano_letivo == ano_letivo).one()
+    matriculas = (
+        db.query(func.count(Matricula.id), func.max(Matricula.id))
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .filter(Turma.ano_letivo == ano_letivo)
+        .one()
+    )
+    marcadores = (versoes.get(versao_do_ano(ano_letivo), 0), versoes.get(VERSAO_TODOS_OS_ANOS, 0))
+    digital = (VERSAO_LAYOUT, marcadores, tuple(turmas), tuple(matriculas))
+    if tipo == "anual":
+        # O relatório anual traz a ficha de todos os alunos ativos, matriculados no ano ou não
+        alunos = db.query(func.count(Aluno.id), func.max(Aluno.id), func.sum(case((Aluno.status_ativo == True, 1), else_=0))).one()
+        digital += (versoes.get("alunos"), tuple(alunos))
+    return digital
+
+
+def _gerar_com_cache(tipo, ano, progresso, gerar):
+    # gerar(db, caminho) grava o documento em caminho e só é chamado quando não há arquivo
+    # pronto para o mesmo estado dos dados. Devolve o caminho do arquivo no cache.
+    # Cada thread abre a sua própria sessão com o banco.
+    db = SessionLocal()
+    try:
+        progresso.atualizar(etapa="Verificando se há um arquivo pronto...")
+        chave = cache_relatorios.montar_chave(tipo, ano, impressao_digital(db, ano, tipo))
+        caminho = cache_relatorios.obter(chave)
+        if caminho is not None:
+            progresso.do_cache = True
+            progresso.atualizar(etapa="Arquivo reaproveitado (os dados não mudaram)", feitos=progresso.total)
+            return caminho
+        temporario = cache_relatorios.novo_arquivo()
+        try:
+            gerar(db, temporario)
+        except Exception:
+            os.remove(temporario)
+            raise
+    finally:
+        db.close()
+    return cache_relatorios.guardar(chave, temporario)
+
+
+def _executar_relatorio_anual(ano, progresso):
+    def gerar(db, caminho):
+        conteudo = gerar_relatorio_anual(db, ano, progresso)
+        with open(caminho, "wb") as f:
+            f.write(conteudo)
+    return _gerar_com_cache("anual", ano, progresso, gerar)
+
+
+# ==========================================
+# LISTAS DE CHAMADA POR TURMA (ZIP)
+# ==========================================
+# Cada turma vira um PDF próprio, desenhado num pool de processos (o fpdf é Python
+# puro e não roda em paralelo em threads). O pool é criado na primeira geração e
+# reaproveitado nas seguintes; "spawn" evita copiar as threads do servidor.
+_processos = None
+_processos_lock = threading.Lock()
+
+
+def _pool_processos():
+    global _processos
+    with _processos_lock:
+        if _processos is None:
+            _processos = ProcessPoolExecutor(
+                max_workers=int(ler_config("RELATORIOS_PROCESSOS", min(os.cpu_count() or 2, 4))),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _processos
+
+
+def dados_listas_chamada(db, ano_letivo):
+    # Dados já prontos para o PDF (dicionários simples, que podem ir para outro processo)
+    turmas = (
+        db.query(
+            Turma.id, Turma.nome_turma, Turma.horario, Turma.vagas_totais, Turma.ano_letivo, Turma.nome_professor,
+            Projeto.nome, Projeto.local,
+        )
+        .join(Projeto, Projeto.id == Turma.projeto_id)
+        .filter(Turma.ano_letivo == ano_letivo)
+        .order_by(Projeto.nome, Turma.nome_turma)
+        .all()
+    )
+    alunos_por_turma = defaultdict(list)
+    linhas = (
+        db.query(Matricula.turma_id, Aluno.nome_completo, Aluno.nome_resp1, Aluno.contato_resp1)
+        .join(Aluno, Aluno.id == Matricula.aluno_id)
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .filter(Turma.ano_letivo == ano_letivo)
+        .order_by(Aluno.nome_completo)
+    )
+    for turma_id, nome, responsavel, contato in linhas:
+        alunos_por_turma[turma_id].append((nome, responsavel, contato))
+
+    return [
+        {
+            "id": t_id, "nome_turma": nome_turma, "horario": horario, "vagas_totais": vagas, "ano_letivo": ano,
+            "nome_professor": professor, "projeto": projeto, "local": local,
+            "alunos": alunos_por_turma.get(t_id, []),
+        }
+        for t_id, nome_turma, horario, vagas, ano, professor, projeto, local in turmas
+    ]
+
+
+def _nome_arquivo_turma(turma):
+    nome = f"{turma['projeto']} - {turma['nome_turma']} ({turma['ano_letivo']})"
+    nome = re.sub(r'[\\/:*?"<>|]+', "-", nome).strip()
+    return f"{nome} [{turma['id']}].pdf"
+
+
+def gerar_listas_chamada(turmas, ano_letivo, destino, progresso=None):
+    # destino: caminho (ou arquivo aberto) do ZIP. Cada PDF é gravado nele assim que fica pronto
+    # e descartado em seguida: a memória não cresce com o número de turmas do ano.
+    progresso = progresso or Progresso()
+    progresso.atualizar(etapa="Desenhando as listas de chamada", total=len(turmas))
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        if not turmas:
+            arquivo_zip.writestr("LEIA-ME.txt", f"Nenhuma turma cadastrada para o ano letivo {ano_letivo}.")
+        else:
+            # As maiores turmas entram primeiro: o tempo total fica perto do da maior delas
+            pool = _pool_processos()
+            futuros = {
+                pool.submit(renderizar_lista_chamada, turma): turma
+                for turma in sorted(turmas, key=lambda t: len(t["alunos"]), reverse=True)
+            }
+            # Cada PDF vai para o ZIP assim que fica pronto; sair do dicionário libera o futuro (e os bytes)
+            for feitos, futuro in enumerate(as_completed(futuros), start=1):
+                turma = futuros.pop(futuro)
+                arquivo_zip.writestr(_nome_arquivo_turma(turma), futuro.result())
+                progresso.atualizar(etapa=f"Listas de chamada prontas: {feitos} de {len(turmas)}", feitos=feitos)
+
+    progresso.atualizar(etapa="Finalizando o arquivo...", feitos=len(turmas))
+
+
+def _executar_listas_chamada(ano, progresso):
+    def gerar(db, caminho):
+        progresso.atualizar(etapa="Compilando dados...")
+        turmas = dados_listas_chamada(db, ano)
+        # A conexão volta ao pool antes do trabalho pesado
+        db.close()
+        gerar_listas_chamada(turmas, ano, caminho, progresso)
+    return _gerar_com_cache("listas", ano, progresso, gerar)
+
+
+# ==========================================
+# RELATÓRIO ANUAL COMPLETO (PDF)
+# ==========================================
+
+def gerar_relatorio_anual(db, ano_selecionado, progresso=None):
+    progresso = progresso or Progresso()
+    progresso.atualizar(etapa="Compilando dados...")
+
+    # --- BUSCA DOS DADOS ---
+    turmas_do_ano = db.query(Turma).filter(Turma.ano_letivo == ano_selecionado).order_by(Turma.id).all()
+    projetos_todos = db.query(Projeto).order_by(Projeto.id).all()
+    # Estatísticas: fotografia do fechamento se o ano já foi fechado, senão calculadas agora
+    resumo = consultas.resumo_ano(db, ano_selecionado)
+
+    # Lista de chamada: só as colunas usadas, já com o aluno (JOIN) e sem abrir o JSON
+    linhas_chamada = (
+        db.query(Matricula.turma_id, Matricula.aluno_id, Aluno.nome_completo, Aluno.nome_resp1, Aluno.contato_resp1)
+        .join(Aluno, Aluno.id == Matricula.aluno_id)
+        .join(Turma, Turma.id == Matricula.turma_id)
+        .filter(Turma.ano_letivo == ano_selecionado)
+        .order_by(Matricula.id)
+        .all()
+    )
+
+    # Fichas: campos promovidos vêm das colunas; os demais são extraídos do JSON pelo banco
+    alunos_ativos = (
+        db.query(
+            Aluno.id, Aluno.nome_completo, Aluno.data_nascimento, Aluno.cpf, Aluno.bairro, Aluno.medicacao_continua,
+            consultas.campo_json(db, "endereco"), consultas.campo_json(db, "numero"),
+            consultas.campo_json(db, "nome_escola"), consultas.campo_json(db, "periodo"),
+        )
+        .filter(Aluno.status_ativo == True)
+        .order_by(Aluno.id)
+        .all()
+    )
+
+    # --- ÍNDICES (montados numa única passada por coleção) ---
+    chamada_por_turma = defaultdict(list)
+    for linha in linhas_chamada:
+        chamada_por_turma[linha.turma_id].append(linha)
+    turmas_por_projeto = defaultdict(list)
+    for t in turmas_do_ano:
+        turmas_por_projeto[t.projeto_id].append(t)
+    vulnerabilidades_por_aluno = defaultdict(list)
+    if alunos_ativos:
+        linhas_vuln = (
+            db.query(AlunoVulnerabilidade.aluno_id, AlunoVulnerabilidade.vulnerabilidade)
+            .join(Aluno, Aluno.id == AlunoVulnerabilidade.aluno_id)
+            .filter(Aluno.status_ativo == True)
+            .order_by(AlunoVulnerabilidade.aluno_id, AlunoVulnerabilidade.vulnerabilidade)
+        )
+        for aluno_id, vulnerabilidade in linhas_vuln:
+            vulnerabilidades_por_aluno[aluno_id].append(vulnerabilidade)
+
+    total_itens = 1 + len(turmas_do_ano) + len(alunos_ativos)
+    feitos = 0
+
+    # --- INICIALIZA O PDF ---
+    pdf = PDF()
+    pdf.add_page()
+
+    # ==========================================
+    # SEÇÃO 1: ESTATÍSTICAS GERAIS
+    # ==========================================
+    progresso.atualizar(etapa="Estatísticas gerais", total=total_itens, paginas=pdf.page_no())
+    pdf.set_font("helvetica", "B", 16)
+    pdf.cell(0, 10, f"Estatísticas Gerais - Ano Letivo {ano_selecionado}", new_x="LMARGIN", new_y="NEXT", align="C")
+    pdf.ln(10)
+
+    if resumo["fechado_em"] is not None:
+        pdf.set_font("helvetica", "I", 10)
+        pdf.cell(0, 8, f"Ano letivo fechado em {resumo['fechado_em'].strftime('%d/%m/%Y')}: números registrados no fechamento.", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("helvetica", "", 12)
+    pdf.cell(0, 8, f"Total de Alunos Cadastrados na Base (Ativos): {resumo['alunos_ativos']}", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 8, f"Total de Alunos Diferentes Matriculados neste Ano: {resumo['alunos_matriculados']}", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 8, f"Total de Turmas Abertas neste Ano: {resumo['turmas']}", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 8, f"Total de Matrículas (Vagas ocupadas): {resumo['matriculas']} de {resumo['vagas_totais']} vagas", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(5)
+
+    # Ocupação por projeto
+    df_projetos = consultas.ocupacao_por_projeto(resumo["df_turmas"])
+    if not df_projetos.empty:
+        pdf.set_font("helvetica", "B", 12)
+        pdf.cell(0, 8, "Ocupação por Projeto:", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("helvetica", "", 11)
+        for p in df_projetos.itertuples():
+            pdf.cell(0, 7, f"  - {p.projeto}: {p.matriculados} de {p.vagas_totais} vagas ({p.ocupacao_pct:.1f}%) em {p.turmas} turma(s)", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(10)
+    feitos += 1
+
+    # ==========================================
+    # SEÇÃO 2: PROJETOS E LISTAS DE CHAMADA
+    # ==========================================
+    if not turmas_do_ano:
+        pdf.add_page()
+        pdf.set_font("helvetica", "B", 14)
+        pdf.cell(0, 10, "Nenhuma turma cadastrada para este ano letivo.", new_x="LMARGIN", new_y="NEXT")
+    else:
+        for projeto in projetos_todos:
+            for turma in turmas_por_projeto.get(projeto.id, []):
+                pdf.add_page()
+                pdf.set_font("helvetica", "B", 16)
+                pdf.cell(0, 10, f"Projeto: {projeto.nome}", new_x="LMARGIN", new_y="NEXT")
+                pdf.set_font("helvetica", "", 12)
+
+                pdf.multi_cell(0, 8, txt=f"Descrição: {projeto.descricao}", new_x="LMARGIN", new_y="NEXT")
+                pdf.cell(0, 8, f"Local: {projeto.local}", new_x="LMARGIN", new_y="NEXT")
+                pdf.ln(5)
+
+                pdf.set_font("helvetica", "B", 14)
+                pdf.cell(0, 10, f"Turma: {turma.nome_turma} | Horário: {turma.horario}", new_x="LMARGIN", new_y="NEXT")
+                pdf.set_font("helvetica", "", 12)
+                pdf.cell(0, 8, f"Professor(a): {turma.nome_professor}", new_x="LMARGIN", new_y="NEXT")
+                pdf.ln(5)
+
+                pdf.set_font("helvetica", "B", 12)
+                pdf.cell(0, 10, "Lista de Chamada (Alunos Matriculados):", new_x="LMARGIN", new_y="NEXT")
+                pdf.set_font("helvetica", "", 11)
+
+                chamada_desta_turma = chamada_por_turma.get(turma.id, [])
+                if not chamada_desta_turma:
+                    pdf.cell(0, 8, "Nenhum aluno matriculado nesta turma.", new_x="LMARGIN", new_y="NEXT")
+                else:
+                    for idx, linha_aluno in enumerate(chamada_desta_turma):
+                        contato = linha_aluno.contato_resp1 or "Sem contato"
+                        resp = linha_aluno.nome_resp1 or "Sem responsável"
+
+                        linha = f"{idx + 1}. {linha_aluno.nome_completo} | Resp: {resp} | Contato: {contato}"
+                        pdf.cell(0, 8, linha, new_x="LMARGIN", new_y="NEXT")
+
+                feitos += 1
+                progresso.atualizar(etapa=f"Listas de chamada: {projeto.nome} - {turma.nome_turma}", feitos=feitos, paginas=pdf.page_no())
+
+    # ==========================================
+    # SEÇÃO 3: DADOS DE TODOS OS ALUNOS
+    # ==========================================
+    if alunos_ativos:
+        pdf.add_page()
+        pdf.set_font("helvetica", "B", 16)
+        pdf.cell(0, 10, "Fichas Cadastrais - Todos os Alunos Ativos", new_x="LMARGIN", new_y="NEXT", align="C")
+        pdf.ln(10)
+
+        for aluno in alunos_ativos:
+            # Garantir que o cursor volte para a margem esquerda por segurança extra
+            pdf.set_x(pdf.l_margin)
+
+            pdf.set_font("helvetica", "B", 12)
+            pdf.cell(0, 8, f"Nome: {aluno.nome_completo}", new_x="LMARGIN", new_y="NEXT")
+
+            pdf.set_font("helvetica", "", 10)
+            pdf.cell(0, 6, f"Data Nasc.: {aluno.data_nascimento.strftime('%d/%m/%Y')} | CPF: {aluno.cpf if aluno.cpf else 'N/A'}", new_x="LMARGIN", new_y="NEXT")
+
+            (_, _, _, _, bairro, medicacao, end, numero, nome_escola, periodo) = aluno
+
+            endereco = f"{end or ''}, {numero or ''} - {bairro or ''}"
+            escola = f"{nome_escola or ''} ({periodo or ''})"
+            vulnerabilidades = ", ".join(vulnerabilidades_por_aluno.get(aluno.id, []))
+            saude = f"Medicação Contínua: {medicacao or 'Não'}"
+
+            # Usando new_x e new_y nativos no multi_cell para evitar o erro de layout
+            pdf.multi_cell(0, 6, txt=f"Endereço: {endereco}", new_x="LMARGIN", new_y="NEXT")
+            pdf.multi_cell(0, 6, txt=f"Escola: {escola}", new_x="LMARGIN", new_y="NEXT")
+            pdf.multi_cell(0, 6, txt=f"Vulnerabilidades Mapeadas: {vulnerabilidades}", new_x="LMARGIN", new_y="NEXT")
+            pdf.multi_cell(0, 6, txt=f"Saúde: {saude}", new_x="LMARGIN", new_y="NEXT")
+            pdf.ln(5)
+
+            feitos += 1
+            if feitos % 25 == 0:
+                progresso.atualizar(etapa="Fichas cadastrais dos alunos", feitos=feitos, paginas=pdf.page_no())
+
+    # --- GERAÇÃO FINAL DO ARQUIVO ---
+    progresso.atualizar(etapa="Finalizando o arquivo...", feitos=total_itens, paginas=pdf.page_no())
+    return bytes(pdf.output())
@@ -0,0 +1,147 @@
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal, Usuario, ler_config
+
+# ==========================================
+# SENHAS (BCRYPT)
+# ==========================================
+# O bcrypt é lento de propósito e ocupa a CPU enquanto calcula. O pool abaixo é só um
+# limite de concorrência: no máximo BCRYPT_THREADS hashes rodam ao mesmo tempo (o bcrypt
+# libera o GIL) e os demais esperam na fila, para que uma leva de logins simultâneos não
+# tome todos os núcleos do servidor das outras sessões. O login continua esperando o
+# resultado (.result()); o trabalho não sai do caminho da requisição.
+
+# Custo (log2 do número de rodadas). Cada +1 dobra o tempo de cada hash/verificação.
+BCRYPT_ROUNDS = int(ler_config("BCRYPT_ROUNDS", 12))
+BCRYPT_THREADS = int(ler_config("BCRYPT_THREADS", 2))
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_THREADS, thread_name_prefix="bcrypt")
+
+ADMIN_PADRAO = {"nome": "Administrador", "email": "admin@agape.com", "senha": "123"}
+
+
+def _hash(senha, rounds):
+    return bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _confere(senha, senha_hash):
+    try:
+        return bcrypt.checkpw(senha.encode('utf-8'), senha_hash.encode('utf-8'))
+    except ValueError:
+        # Hash salvo corrompido ou em outro formato
+        return False
+
+
+def gerar_hash(senha, rounds=None):
+    return _executor.submit(_hash, senha, rounds or BCRYPT_ROUNDS).result()
+
+
+def verificar_senha(senha, senha_hash):
+    return _executor.submit(_confere, senha, senha_hash).result()
+
+
+def custo_do_hash(senha_hash):
+    # Formato: $2b$12$<salt+hash>
+    try:
+        return int(senha_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def precisa_rehash(senha_hash):
+    return custo_do_hash(senha_hash) != BCRYPT_ROUNDS
+
+
+# Hash de referência para gastar o mesmo tempo quando o e-mail não existe
+# (a resposta não revela quais e-mails estão cadastrados)
+_HASH_FICTICIO = None
+
+
+def _hash_ficticio():
+    global _HASH_FICTICIO
+    if _HASH_FICTICIO is None or custo_do_hash(_HASH_FICTICIO) != BCRYPT_ROUNDS:
+        _HASH_FICTICIO = gerar_hash("senha-inexistente")
+    return _HASH_FICTICIO
+
+
+def autenticar(db, email, senha):
+    # Devolve o usuário quando a senha confere; se o custo configurado mudou, o hash
+    # é refeito com o custo novo aproveitando a senha em texto que acabou de chegar
+    usuario = db.query(Usuario).filter(Usuario.email == email).first()
+    if usuario is None:
+        verificar_senha(senha, _hash_ficticio())
+        return None
+
+    if not verificar_senha(senha, usuario.senha):
+        return None
+
+    if precisa_rehash(usuario.senha):
+        try:
+            usuario.senha = gerar_hash(senha)
+            db.commit()
+        except Exception:
+            # A troca do hash é só uma melhoria: o login continua valendo
+            db.rollback()
+    return usuario
+
+
+def garantir_admin_inicial():
+    # Cria o primeiro usuário (admin) quando a tabela está vazia. Roda uma vez por processo.
+    db = SessionLocal()
+    try:
+        if db.query(Usuario.id).first() is None:
+            db.add(Usuario(
+                nome=ADMIN_PADRAO["nome"], email=ADMIN_PADRAO["email"],
+                senha=gerar_hash(ADMIN_PADRAO["senha"]), is_admin=True,
+            ))
+            db.commit()
+            return True
+        return False
+    except IntegrityError:
+        # Outro processo criou o admin ao mesmo tempo (e-mail é único)
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+# ==========================================
+# GESTÃO DOS USUÁRIOS DA EQUIPE
+# ==========================================
+
+class UsuarioRecusado(Exception):
+    pass
+
+
+def listar_usuarios(db):
+    return db.query(Usuario.id, Usuario.nome, Usuario.email, Usuario.is_admin).order_by(Usuario.nome).all()
+
+
+def criar_usuario(db, nome, email, senha, is_admin=False):
+    if db.query(Usuario.id).filter(Usuario.email == email).first():
+        raise UsuarioRecusado("Este e-mail já existe no sistema.")
+    try:
+        db.add(Usuario(nome=nome, email=email, senha=gerar_hash(senha), is_admin=is_admin))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise UsuarioRecusado("Este e-mail já existe no sistema.")
+
+
+def redefinir_senha(db, usuario_id, nova_senha):
+    try:
+        db.query(Usuario).filter(Usuario.id == usuario_id).update({Usuario.senha: gerar_hash(nova_senha)}, synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def remover_usuario(db, usuario_id):
+    try:
+        db.query(Usuario).filter(Usuario.id == usuario_id).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
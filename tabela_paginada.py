@@ -0,0 +1,48 @@
+import math
+import streamlit as st
+
+# --- TABELA PAGINADA NO SERVIDOR (KEYSET) ---
+# O session_state guarda só o pedido da página atual (cursor), o seu número e as chaves
+# da primeira e da última linha exibidas. Cada clique pede ao banco apenas a página
+# vizinha (ver consultas._pagina_keyset); nada além dela vai para o navegador.
+
+TAMANHO_PADRAO = 50
+
+
+def _ir(chave, pedido, numero):
+    estado = st.session_state[chave]
+    estado["pedido"] = pedido
+    estado["numero"] = numero
+
+
+def tabela_paginada(chave, buscar, total, filtros=(), tamanho=TAMANHO_PADRAO):
+    # buscar(apos=..., antes=..., fim=...) devolve uma consulta.PaginaKeyset.
+    # Mudar os filtros (ou a ordenação) volta para a primeira página.
+    chave = f"{chave}_paginacao"
+    estado = st.session_state.get(chave)
+    if estado is None or estado["filtros"] != filtros:
+        estado = st.session_state[chave] = {"filtros": filtros, "pedido": {}, "numero": 1}
+
+    total_paginas = max(math.ceil(total / tamanho), 1)
+    pagina = buscar(**estado["pedido"])
+    if not pagina["linhas"] and estado["numero"] > 1:
+        # A página sumiu (registros excluídos por outra pessoa): recomeça do início
+        _ir(chave, {}, 1)
+        pagina = buscar()
+
+    if not pagina["linhas"]:
+        st.info("Nenhum registro encontrado para este filtro.")
+        return
+    st.dataframe(pagina["linhas"], width="stretch", hide_index=True)
+
+    numero = min(estado["numero"], total_paginas)
+    col_ini, col_ant, col_info, col_prox, col_fim = st.columns([1, 1, 3, 1, 1])
+    col_ini.button("⏮️", key=f"{chave}_inicio", help="Primeira página", disabled=not pagina["ha_anterior"],
+                   on_click=_ir, args=(chave, {}, 1), width="stretch")
+    col_ant.button("◀️", key=f"{chave}_anterior", help="Página anterior", disabled=not pagina["ha_anterior"],
+                   on_click=_ir, args=(chave, {"antes": pagina["primeira"]}, max(numero - 1, 1)), width="stretch")
+    col_info.caption(f"Página {numero} de {total_paginas} · {total} registro(s)")
+    col_prox.button("▶️", key=f"{chave}_proxima", help="Próxima página", disabled=not pagina["ha_proxima"],
+                    on_click=_ir, args=(chave, {"apos": pagina["ultima"]}, min(numero + 1, total_paginas)), width="stretch")
+    col_fim.button("⏭️", key=f"{chave}_fim", help="Última página", disabled=not pagina["ha_proxima"],
+                   on_click=_ir, args=(chave, {"fim": True}, total_paginas), width="stretch")
@@ -0,0 +1,24 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+# O database.py cria o engine ao ser importado: os testes apontam para um SQLite
+# temporário antes disso, nunca para o banco configurado no secrets.toml.
+PASTA_TEMPORARIA = tempfile.mkdtemp(prefix="agape_testes_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(PASTA_TEMPORARIA, "testes.db")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import engine  # noqa: E402
+from migracoes import aplicar_migracoes  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def banco():
+    aplicar_migracoes()
+    yield engine
+    engine.dispose()
+    shutil.rmtree(PASTA_TEMPORARIA, ignore_errors=True)
@@ -0,0 +1,43 @@
+import io
+import datetime
+
+import pandas as pd
+import pytest
+
+import importacao
+
+
+@pytest.fixture
+def config(monkeypatch, request):
+    # carregar_campos lê o config_campos.json da pasta do projeto
+    monkeypatch.chdir(request.config.rootpath)
+    return importacao.carregar_campos()
+
+
+def _datas(df, config):
+    dados, _ = importacao.validar(df, config)
+    return list(dados["data_nascimento"])
+
+
+def test_data_do_excel_com_dia_ate_12_nao_inverte_dia_e_mes(config):
+    planilha = io.BytesIO()
+    pd.DataFrame({
+        "nome_completo": ["Aluno Um", "Aluno Dois"],
+        "data_nascimento": [datetime.datetime(2015, 3, 4), datetime.datetime(2015, 3, 20)],
+    }).to_excel(planilha, index=False)
+    planilha.seek(0)
+
+    df = importacao.ler_arquivo(planilha, "alunos.xlsx")
+
+    assert _datas(df, config) == [datetime.date(2015, 3, 4), datetime.date(2015, 3, 20)]
+
+
+def test_csv_aceita_data_iso_e_data_brasileira(config):
+    conteudo = "nome_completo;data_nascimento\nAluno Um;2015-03-04\nAluno Dois;04/03/2015\nAluno Três;2015-13-01\n"
+
+    df = importacao.ler_arquivo(conteudo.encode("utf-8"), "alunos.csv")
+    dados, erros = importacao.validar(df, config)
+
+    assert list(dados["data_nascimento"])[:2] == [datetime.date(2015, 3, 4), datetime.date(2015, 3, 4)]
+    assert dados["data_nascimento"].iloc[2] is None
+    assert ((erros["Linha"] == 4) & erros["Erro"].str.startswith("Data inválida")).any()
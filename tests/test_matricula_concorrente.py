@@ -0,0 +1,86 @@
+import datetime
+import json
+import threading
+
+import pytest
+
+import consultas
+from database import SessionLocal, Aluno, Projeto, Turma, Matricula
+
+THREADS = 12
+VAGAS = 5
+
+
+@pytest.fixture
+def turma_disputada():
+    db = SessionLocal()
+    try:
+        projeto = Projeto(nome=f"Concorrência {datetime.datetime.now():%H%M%S%f}", descricao="", local="")
+        db.add(projeto)
+        db.flush()
+        turma = Turma(projeto_id=projeto.id, nome_turma="Turma única", horario="-", vagas_totais=VAGAS,
+                      ano_letivo=datetime.date.today().year, nome_professor="-")
+        alunos = [
+            Aluno(nome_completo=f"Aluno Concorrente {i}", data_nascimento=datetime.date(2015, 1, 1),
+                  dados_cadastrais_json=json.dumps({"nome_completo": f"Aluno Concorrente {i}"}))
+            for i in range(THREADS)
+        ]
+        db.add_all([turma] + alunos)
+        db.commit()
+        return turma.id, [a.id for a in alunos]
+    finally:
+        db.close()
+
+
+def _disputar(tentativas):
+    # Todas as threads partem juntas; cada uma guarda o que aconteceu com a sua tentativa
+    barreira = threading.Barrier(len(tentativas))
+    resultados = [None] * len(tentativas)
+
+    def trabalhador(indice, aluno_id, turma_id):
+        barreira.wait()
+        db = SessionLocal()
+        try:
+            consultas.matricular(db, aluno_id, turma_id)
+            resultados[indice] = "aceita"
+        except Exception as e:
+            resultados[indice] = e
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=trabalhador, args=(i, *t)) for i, t in enumerate(tentativas)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return resultados
+
+
+def _matriculas_da_turma(turma_id):
+    db = SessionLocal()
+    try:
+        return [a for (a,) in db.query(Matricula.aluno_id).filter(Matricula.turma_id == turma_id)]
+    finally:
+        db.close()
+
+
+def test_threads_disputando_as_ultimas_vagas(turma_disputada):
+    turma_id, alunos_ids = turma_disputada
+
+    resultados = _disputar([(a, turma_id) for a in alunos_ids])
+
+    recusas = [r for r in resultados if r != "aceita"]
+    assert resultados.count("aceita") == VAGAS
+    assert len(recusas) == THREADS - VAGAS
+    assert all(isinstance(r, consultas.MatriculaRecusada) for r in recusas), recusas
+    assert len(_matriculas_da_turma(turma_id)) == VAGAS
+
+
+def test_mesmo_aluno_em_paralelo_matricula_uma_vez(turma_disputada):
+    turma_id, alunos_ids = turma_disputada
+
+    resultados = _disputar([(alunos_ids[0], turma_id)] * 4)
+
+    assert resultados.count("aceita") == 1
+    assert all(isinstance(r, consultas.MatriculaRecusada) for r in resultados if r != "aceita")
+    assert _matriculas_da_turma(turma_id) == [alunos_ids[0]]
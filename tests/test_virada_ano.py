@@ -0,0 +1,45 @@
+import datetime
+import json
+
+import consultas
+from database import SessionLocal, Aluno, Projeto, Turma, Matricula
+
+ORIGEM, DESTINO = 2090, 2091
+
+
+def _turma(projeto, nome, ano, vagas):
+    return Turma(projeto_id=projeto.id, nome_turma=nome, horario="-", vagas_totais=vagas, ano_letivo=ano, nome_professor="-")
+
+
+def test_virada_respeita_vagas_e_um_projeto_por_ano():
+    db = SessionLocal()
+    try:
+        projeto = Projeto(nome="Virada", descricao="", local="")
+        db.add(projeto)
+        db.flush()
+        # Duas turmas de mesmo nome na origem e a turma do destino já aberta, com 1 de 3 vagas ocupada
+        turma_a, turma_b, destino = _turma(projeto, "A", ORIGEM, 3), _turma(projeto, "A", ORIGEM, 3), _turma(projeto, "A", DESTINO, 3)
+        alunos = [
+            Aluno(nome_completo=f"Aluno Virada {i}", data_nascimento=datetime.date(2015, 1, 1),
+                  dados_cadastrais_json=json.dumps({"nome_completo": f"Aluno Virada {i}"}))
+            for i in range(6)
+        ]
+        db.add_all([turma_a, turma_b, destino] + alunos)
+        db.flush()
+        for aluno, turma in zip(alunos, [turma_a, turma_a, turma_a, turma_b, turma_b, destino]):
+            db.add(Matricula(aluno_id=aluno.id, turma_id=turma.id, data_matricula=datetime.date(ORIGEM, 2, 1)))
+        db.commit()
+
+        resultado = consultas.virada_ano_letivo(
+            db, ORIGEM, [turma_a.id, turma_b.id], [a.id for a in alunos], inativar_demais=True
+        )
+
+        assert resultado["turmas_copiadas"] == []
+        assert resultado["turmas_ja_abertas"] == ["Virada - A"]
+        assert resultado["rematriculas"] == 2
+        assert resultado["sem_vaga"] == [f"Aluno Virada {i} (Virada - A)" for i in (2, 3, 4)]
+        assert resultado["inativacoes"] == 0
+        assert db.query(Turma).filter(Turma.projeto_id == projeto.id, Turma.ano_letivo == DESTINO).count() == 1
+        assert db.query(Matricula).filter(Matricula.turma_id == destino.id).count() == destino.vagas_totais
+    finally:
+        db.close()